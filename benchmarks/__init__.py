@@ -0,0 +1,10 @@
+"""Performance benchmarks for pygnurl.
+
+Each module in this package is a benchmark suite that can be run with
+``python -m benchmarks.<suite>``. Results are compared against the
+stored baseline in ``benchmarks/baseline.json``; run a suite with
+``--update`` to record a new baseline.
+
+These benchmarks load Readline the same way pygnurl does, so the
+``PYGNURL_LIB`` environment variable should be set if required.
+"""
@@ -0,0 +1,297 @@
+"""Shared helpers for pygnurl benchmarks."""
+from __future__ import print_function
+
+import argparse
+import compileall
+import errno
+import json
+import os
+import select
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+DEFAULT_BUDGET = 0.25
+
+# Metrics with these suffixes are throughputs; bigger is better. All
+# other metrics are costs.
+HIGHER_IS_BETTER = ('_per_sec',)
+
+# Executed in a fresh interpreter by measure_statement. This only uses
+# modules the interpreter has already imported during startup so it
+# does not skew the measurement.
+_CHILD = r'''
+import sys
+import time
+
+def _rss_kb():
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (IOError, OSError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    import os
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+def _count_ctypes(counts):
+    """Count foreign function calls and symbol lookups."""
+    import ctypes
+
+    def counted(funcptr):
+        class _FuncPtr(funcptr):
+            _flags_ = funcptr._flags_
+            _restype_ = funcptr._restype_
+
+            def __call__(self, *args):
+                counts['calls'] += 1
+                return funcptr.__call__(self, *args)
+        return _FuncPtr
+
+    init = ctypes.CDLL.__init__
+
+    def __init__(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self._FuncPtr = counted(self._FuncPtr)
+    ctypes.CDLL.__init__ = __init__
+    ctypes.pythonapi._FuncPtr = counted(ctypes.pythonapi._FuncPtr)
+
+    if hasattr(sys, 'addaudithook'):
+        counts['dlsym'] = 0
+
+        def hook(event, args):
+            if event.startswith('ctypes.dlsym'):
+                counts['dlsym'] += 1
+        sys.addaudithook(hook)
+
+config = eval(sys.argv[1])
+counts = {'calls': 0}
+if config['count']:
+    _count_ctypes(counts)
+exec(config['setup'])
+rss = _rss_kb()
+start = time.time()
+exec(config['stmt'])
+wall = time.time() - start
+result = {'wall_ms': wall * 1000, 'rss_kb': _rss_kb() - rss}
+if config['count']:
+    result.update(counts)
+sys.stdout.flush()
+sys.stdout.write('\n' + repr(result) + '\n')
+'''
+
+
+def child_env(**extra):
+    """Return an environment for a benchmark subprocess.
+
+    The repository root is placed first on the path so the package
+    under test is the one imported.
+    """
+    env = dict(os.environ)
+    paths = [ROOT] + [p for p in [env.get('PYTHONPATH')] if p]
+    env['PYTHONPATH'] = os.pathsep.join(paths)
+    env.update(extra)
+    return env
+
+
+def measure_statement(stmt, setup='', count=False, env=None):
+    """Run stmt in a fresh interpreter and return its cost.
+
+    The result has the wall time in milliseconds and the RSS growth in
+    kilobytes. If count is True, the interpreter is instrumented to
+    also count foreign function calls and, where audit hooks are
+    available, symbol lookups; don't use the times from these runs.
+    """
+    config = repr({'stmt': stmt, 'setup': setup, 'count': count})
+    output = subprocess.check_output(
+        [sys.executable, '-c', _CHILD, config],
+        env=env or child_env(), cwd=ROOT)
+    last_line = output.decode().strip().splitlines()[-1]
+    return eval(last_line)  # pylint: disable=eval-used
+
+
+def spawn_pty(code, env=None, options=()):
+    """Run code in a fresh interpreter attached to a new pty.
+
+    options are extra interpreter options, such as '-i'. Returns
+    (pid, fd) where fd is the master side of the pty. Use interact to
+    talk to the child and finish_pty to clean up.
+    """
+    import pty
+    pid, fd = pty.fork()
+    if pid == 0:  # pragma: no cover
+        try:
+            os.chdir(ROOT)
+            os.execve(sys.executable,
+                      [sys.executable] + list(options) + ['-c', code],
+                      env or child_env())
+        finally:
+            os._exit(127)  # pylint: disable=protected-access
+    return pid, fd
+
+
+def interact(fd, data, marker, timeout=30.0):
+    """Write data to a pty while reading its output until marker.
+
+    Output must be read while writing, otherwise a child that echoes
+    its input can fill the pty and stop reading. Returns the output
+    read, which contains marker and possibly output after it. Raises
+    RuntimeError if the child exits or marker hasn't appeared after
+    timeout seconds.
+    """
+    output = b''
+    deadline = time.time() + timeout
+    while marker not in output:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise RuntimeError('timed out waiting for {!r}, got {!r}'
+                               .format(marker, output[-200:]))
+        writers = [fd] if data else []
+        readable, writable, _ = select.select([fd], writers, [], remaining)
+        if writable:
+            written = os.write(fd, data[:1024])
+            data = data[written:]
+        if readable:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError as error:
+                if error.errno != errno.EIO:
+                    raise
+                chunk = b''
+            if not chunk:
+                raise RuntimeError('child exited, got {!r}'
+                                   .format(output[-200:]))
+            output += chunk
+    return output
+
+
+def finish_pty(pid, fd):
+    """Close the master side of a pty and reap its child."""
+    os.close(fd)
+    os.waitpid(pid, 0)
+
+
+def median(values):
+    """Return the median of a non-empty sequence."""
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def percentile(values, fraction):
+    """Return the given percentile (0 to 1) of a non-empty sequence.
+
+    Uses linear interpolation between the closest ranks.
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    weight = position - lower
+    return values[lower] * (1 - weight) + values[upper] * weight
+
+
+def summarize(samples):
+    """Combine a list of result dicts into one of per-metric medians."""
+    return dict((metric, median([sample[metric] for sample in samples]))
+                for metric in samples[0])
+
+
+def load_baseline(filename=BASELINE):
+    """Return the stored baseline, or an empty one if there is none."""
+    try:
+        with open(filename) as baseline_file:
+            return json.load(baseline_file)
+    except (IOError, OSError):
+        return {}
+
+
+def save_baseline(suite, results, filename=BASELINE):
+    """Record results as the baseline for suite."""
+    baseline = load_baseline(filename)
+    baseline[suite] = results
+    with open(filename, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def compare(results, baseline, budget=DEFAULT_BUDGET):
+    """Return the regressions in results relative to baseline.
+
+    A cost regresses when it grows by more than budget (a fraction of
+    the baseline value); a throughput regresses when it shrinks by
+    more than budget. Each regression is returned as a tuple of
+    (benchmark, metric, value, baseline_value).
+    """
+    regressions = []
+    for name in sorted(results):
+        for metric in sorted(results[name]):
+            try:
+                expected = baseline[name][metric]
+            except KeyError:
+                continue
+            value = results[name][metric]
+            if metric.endswith(HIGHER_IS_BETTER):
+                regressed = value < expected * (1 - budget)
+            else:
+                regressed = value > expected * (1 + budget)
+            if regressed:
+                regressions.append((name, metric, value, expected))
+    return regressions
+
+
+def report(suite, results, baseline, stream=None):
+    """Print results alongside the baseline values."""
+    stream = stream or sys.stdout
+    print('{}:'.format(suite), file=stream)
+    for name in sorted(results):
+        for metric in sorted(results[name]):
+            value = results[name][metric]
+            line = '  {:<28} {:<14} {:>12.3f}'.format(name, metric, value)
+            expected = baseline.get(name, {}).get(metric)
+            if expected is not None:
+                line += '  (baseline {:.3f})'.format(expected)
+            print(line, file=stream)
+
+
+def main(suite, run, argv=None):
+    """Command line entry point shared by all suites.
+
+    run is called with the parsed arguments and must return a dict
+    mapping benchmark names to dicts of metrics. Returns the process
+    exit status, which is non-zero if any metric regressed.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.{}'.format(suite))
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='baseline JSON file (default: %(default)s)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help='allowed regression as a fraction of the '
+                             'baseline (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of samples per benchmark '
+                             '(default: %(default)s)')
+    parser.add_argument('--update', action='store_true',
+                        help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    # Imports would compile any stale modules in every run if bytecode
+    # isn't being written (PYTHONDONTWRITEBYTECODE), which costs
+    # megabytes and milliseconds.
+    compileall.compile_dir(os.path.join(ROOT, 'pygnurl'), quiet=1)
+    results = run(args)
+    baseline = load_baseline(args.baseline).get(suite, {})
+    report(suite, results, baseline)
+    if args.update:
+        save_baseline(suite, results, args.baseline)
+        return 0
+    regressions = compare(results, baseline, args.budget)
+    for name, metric, value, expected in regressions:
+        print('REGRESSION: {} {} {:.3f} (baseline {:.3f}, budget {:.0%})'
+              .format(name, metric, value, expected, args.budget))
+    return 1 if regressions else 0
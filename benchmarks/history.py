@@ -0,0 +1,227 @@
+"""Cost of reading a large history.
+
+A history of ENTRIES lines is read in each of the ways programs do,
+reporting the milliseconds taken:
+
+* ``iterate``: ``list(history)`` straight after a line was read, when
+  every line must be read from Readline
+* ``iterate_again``: the same with nothing changed since
+* ``index``: ``history[i]`` for every index, as IPython does through
+  ``get_history_item``, straight after a line was read
+* ``add_and_index``: ``history.append`` then ``history[-1]``, repeated
+  ROUNDS times
+* ``replace``: ``history[i] = history[i]``, repeated ROUNDS times
+* ``add_duplicate``: ``history.append`` of a line already in the
+  history with ``erase_duplicates`` enabled, repeated ROUNDS times;
+  ``add_duplicate_indexed`` is the same with ``history.indexed`` set, so
+  each removal also updates the search index
+* ``save_line``: ``history.append`` then ``history.append_file`` of
+  the unsaved lines, as at exit after a session of one line;
+  ``save_line_full`` is the same with ``history.write_file``, which
+  writes the whole file
+* ``between_first``: the first ``history.between``, which indexes the
+  timestamps, for a span of ROUNDS lines
+* ``between``: the same once they are indexed
+* ``read_file``: ``history.read_file`` of the whole history into an
+  empty one; ``read_file_indexed`` is the same with ``history.indexed``
+  set, which indexes the lines as they are loaded
+* ``search_after_load``: the first ``history.search`` after
+  ``read_file_indexed``, which needn't index anything
+* ``load_newest``: ``history.load_file`` of the newest ROUNDS lines
+* ``load_unique``: ``history.load_file`` of the distinct lines, when
+  most of them are repeated
+* ``search_first``: the first ``history.search``, which indexes the
+  history
+
+Other than where noted, the history isn't indexed, as it isn't until
+the first search.
+* ``search_keystroke``: ``history.search`` for each of QUERIES as it
+  is typed a character at a time, per character, as a search command
+  does; these include misses and lines near the start of the history
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+from . import common
+
+ENTRIES = 100000
+ROUNDS = 1000
+# Time of the first line, one second apart, for between.
+START_TIME = 1500000000
+QUERIES = ('print(1234', 'print(9', 'missing', '(42)', 'int(5')
+
+
+def _iterate(history):
+    """Read every line after the history may have changed."""
+    history.invalidate()
+    return list(history)
+
+
+def _index(history):
+    """Read every line by index after the history may have changed."""
+    history.invalidate()
+    for index in range(len(history)):
+        history[index]  # pylint: disable=pointless-statement
+
+
+def _add_and_index(history):
+    """Add lines, reading the last after each."""
+    for _ in range(ROUNDS):
+        history.append(u'added')
+        history[-1]  # pylint: disable=pointless-statement
+
+
+def _replace(history):
+    """Replace lines with themselves."""
+    for index in range(ROUNDS):
+        history[index] = history[index]
+
+
+def _add_duplicates(history):
+    """Add lines already in the history, each replacing its copy."""
+    for index in range(ROUNDS):
+        history.append(u'print({})'.format(index * 97))
+
+
+def _save_line(history, path, full):
+    """Add a line and save the history, writing the whole file if
+    full is True and appending the new line otherwise.
+    """
+    history.append(u'saved')
+    if full:
+        history.write_file(path)
+    else:
+        history.append_file(history.unsaved_count, path)
+
+
+def _between(history, first):
+    """Find the lines added in a span of time, after the index has
+    been dropped if first is True.
+    """
+    if first:
+        history.invalidate()
+    history.between(START_TIME, START_TIME + ROUNDS)
+
+
+def _load(history, path, **filters):
+    """Load a history file into an empty history."""
+    history.clear()
+    if filters:
+        history.load_file(path, **filters)
+    else:
+        history.read_file(path)
+
+
+def _read_and_search(history, path):
+    """Load a history file into an empty indexed history and search
+    it, returning the milliseconds taken by each.
+    """
+    history.clear()
+    history.indexed = True
+    start = timeit.default_timer()
+    history.read_file(path)
+    loaded = timeit.default_timer()
+    history.search(u'print(1')
+    searched = timeit.default_timer()
+    history.indexed = False
+    return (loaded - start) * 1000, (searched - loaded) * 1000
+
+
+def _search_first(history):
+    """Search after the index has been dropped."""
+    history.invalidate()
+    history.search(u'print(1')
+
+
+def _search_keystroke(history):
+    """Search for each query as it is typed."""
+    for query in QUERIES:
+        for end in range(1, len(query) + 1):
+            history.search(query[:end], limit=1)
+
+
+def _cost_ms(func, repeat):
+    """Return the best time taken by func in milliseconds."""
+    return min(timeit.Timer(func).repeat(repeat, 1)) * 1000
+
+
+def run(args):
+    """Run every history benchmark and return the results."""
+    import pygnurl
+    history = pygnurl.readline.history
+    history.clear()
+    for index in range(ENTRIES):
+        history.append(u'print({})'.format(index))
+
+    benchmarks = {
+        'iterate': lambda: _iterate(history),
+        'iterate_again': lambda: list(history),
+        'index': lambda: _index(history),
+        'add_and_index': lambda: _add_and_index(history),
+        'replace': lambda: _replace(history),
+        'search_first': lambda: _search_first(history),
+    }
+    try:
+        results = {}
+        for name in sorted(benchmarks):
+            results[name] = {'ms': _cost_ms(benchmarks[name],
+                                            args.repeat)}
+        history.indexed = False
+        # Enabling erase_duplicates removes the copies of u'added'.
+        history.erase_duplicates = True
+        results['add_duplicate'] = {
+            'ms': _cost_ms(lambda: _add_duplicates(history), args.repeat)}
+        history.indexed = True
+        results['add_duplicate_indexed'] = {
+            'ms': _cost_ms(lambda: _add_duplicates(history), args.repeat)}
+        history.indexed = False
+        history.erase_duplicates = False
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            history.write_file(path)
+            for name, full in (('save_line', False),
+                               ('save_line_full', True)):
+                results[name] = {'ms': _cost_ms(
+                    lambda: _save_line(history, path, full), args.repeat)}
+        finally:
+            os.remove(path)
+        keystrokes = sum(len(query) for query in QUERIES)
+        results['search_keystroke'] = {
+            'ms': _cost_ms(lambda: _search_keystroke(history),
+                           args.repeat) / keystrokes}
+        history.indexed = False
+        for index in range(len(history)):
+            history.set_time(index, START_TIME + index)
+        for name, first in (('between_first', True), ('between', False)):
+            results[name] = {'ms': _cost_ms(
+                lambda: _between(history, first), args.repeat)}
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            with open(path, 'w') as history_file:
+                for index in range(ENTRIES):
+                    history_file.write('print({})\n'.format(index % 100))
+            for name, filters in (
+                    ('read_file', {}),
+                    ('load_newest', {'max_lines': ROUNDS}),
+                    ('load_unique', {'erase_duplicates': True})):
+                results[name] = {'ms': _cost_ms(
+                    lambda: _load(history, path, **filters), args.repeat)}
+            samples = [_read_and_search(history, path)
+                       for _ in range(args.repeat)]
+            results['read_file_indexed'] = {
+                'ms': min(sample[0] for sample in samples)}
+            results['search_after_load'] = {
+                'ms': min(sample[1] for sample in samples)}
+        finally:
+            os.remove(path)
+        return results
+    finally:
+        history.clear()
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('history', run))
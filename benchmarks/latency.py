@@ -0,0 +1,166 @@
+"""End-to-end latency as seen from a terminal.
+
+Each target runs in a fresh interpreter on a pty while scripted
+keystrokes are typed into it, measuring:
+
+* ``first_prompt``: time from starting the interpreter to its first
+  prompt
+* ``echo``: time from typing a key to seeing it echoed
+* ``tab``: time from pressing Tab to seeing the completion
+* ``paste``: characters per second of a bracketed paste of many short
+  commands, until the command after it has run
+
+Latencies are reported as percentiles in milliseconds. The targets
+are the interactive interpreter (with rlcompleter completion) and
+``pygnurl/examples/mycmd.py``. The interpreter is also run with
+CPython's own ``readline`` module, when it exists, as a baseline;
+mycmd imports pygnurl directly so it is only run with pygnurl.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import common
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Keys typed on each line when measuring echo, then discarded with
+# Ctrl-U.
+KEYS_PER_LINE = 40
+LINES_PER_SESSION = 5
+TABS_PER_SESSION = 20
+PASTE_LINES = 200
+PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+# Each target is (interpreter options, code, prompt, completion, paste
+# line, final command, final output). completion is (text, output
+# after Tab).
+TARGETS = {
+    'interpreter': (
+        ['-q', '-i'], '', b'>>> ',
+        (b'isinst', b'ance('), b'pass\n',
+        b'print(6 * 7 * 1000 + 1)\r', b'42001'),
+    'mycmd': (
+        [], 'import runpy\n'
+            'runpy.run_module("pygnurl.examples.mycmd", '
+            'run_name="__main__")\n', b'(Cmd) ',
+        (b'cat READ', b'ME.rst'), b'help exit\n',
+        b'help cat\r', b'usage: cat'),
+}
+
+# Targets run with each readline module.
+BACKENDS = {
+    'pygnurl': ('interpreter', 'mycmd'),
+    'cpython': ('interpreter',),
+}
+
+
+def _has_cpython_readline(env):
+    """Return True if this interpreter has its own readline module."""
+    with open(os.devnull, 'w') as null:
+        return not subprocess.call(
+            [sys.executable, '-c', _code('cpython', 'import readline')],
+            stdout=null, stderr=null, env=env, cwd=common.ROOT)
+
+
+def _code(backend, code):
+    """Return the code run by a child using backend."""
+    if backend == 'cpython':
+        # Keep the repository, and so the readline shim in it, off the
+        # path; -c puts the current directory first.
+        return 'import sys\ndel sys.path[0]\n' + code
+    return code
+
+
+def _env(backend, home):
+    """Return the environment for a child using backend."""
+    # The interactive hook must not touch the real user's history,
+    # and Readline's display should not depend on the terminal the
+    # benchmark was started from.
+    env = common.child_env(HOME=home, TERM='xterm', COLUMNS='80',
+                           LINES='24', PYTHON_BASIC_REPL='1')
+    env.pop('PYTHONSTARTUP', None)
+    if backend == 'pygnurl':
+        # The shim must shadow the built-in readline module.
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.join(common.ROOT, 'pygnurl', 'modules'),
+             env['PYTHONPATH']])
+    else:
+        env['PYTHONPATH'] = os.pathsep.join(
+            path for path in env['PYTHONPATH'].split(os.pathsep)
+            if path != common.ROOT)
+    return env
+
+
+def _timed(fd, data, marker):
+    """Return the seconds taken for marker to appear after data."""
+    start = _clock()
+    common.interact(fd, data, marker)
+    return _clock() - start
+
+
+def _session(target, backend, env, samples):
+    """Run one session of target, adding to the lists in samples."""
+    options, code, prompt, completion, paste_line, command, output = \
+        TARGETS[target]
+    start = _clock()
+    pid, fd = common.spawn_pty(_code(backend, code), env, options)
+    try:
+        common.interact(fd, b'', prompt)
+        samples['first_prompt'].append(_clock() - start)
+
+        for _ in range(LINES_PER_SESSION):
+            for _ in range(KEYS_PER_LINE):
+                samples['echo'].append(_timed(fd, b'a', b'a'))
+            common.interact(fd, b'\x15\r', prompt)
+
+        text, completed = completion
+        for _ in range(TABS_PER_SESSION):
+            common.interact(fd, text, text[-3:])
+            samples['tab'].append(_timed(fd, b'\t', completed))
+            common.interact(fd, b'\x15\r', prompt)
+
+        paste = (b'\x1b[200~' + paste_line * PASTE_LINES +
+                 b'\x1b[201~\r' + command)
+        samples['paste'].append(len(paste) / _timed(fd, paste, output))
+    finally:
+        common.finish_pty(pid, fd)
+
+
+def _measure(target, backend, env, sessions):
+    """Return the metrics for target over a number of sessions."""
+    samples = {'first_prompt': [], 'echo': [], 'tab': [], 'paste': []}
+    for _ in range(sessions):
+        _session(target, backend, env, samples)
+    result = {'paste_chars_per_sec': common.median(samples['paste'])}
+    for name in ('first_prompt', 'echo', 'tab'):
+        for label, fraction in PERCENTILES:
+            metric = '{}_{}_ms'.format(name, label)
+            result[metric] = common.percentile(samples[name],
+                                               fraction) * 1000
+    return result
+
+
+def run(args):
+    """Run every latency benchmark and return the results."""
+    home = tempfile.mkdtemp()
+    try:
+        results = {}
+        for backend in sorted(BACKENDS):
+            env = _env(backend, home)
+            if backend == 'cpython' and not _has_cpython_readline(env):
+                continue
+            for target in BACKENDS[backend]:
+                name = '{}_{}'.format(target, backend)
+                results[name] = _measure(target, backend, env,
+                                         args.repeat)
+        return results
+    finally:
+        shutil.rmtree(home)
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('latency', run))
@@ -0,0 +1,59 @@
+"""Fixed cost of each line read through input().
+
+A fresh interpreter reads many short lines through pygnurl from a pty,
+measuring lines per second from the first keystroke until the child
+has returned every line. The lines are a single character, so the time
+is dominated by the work done once per line rather than per key:
+
+* ``lines``: no hooks set, as in most programs
+* ``lines_with_hooks``: startup and pre-input hooks set
+"""
+import sys
+import time
+
+from . import common
+
+# Executed in the child; reads lines until one is empty.
+_CHILD = r'''
+import sys
+import pygnurl
+if {hooks!r}:
+    pygnurl.readline.startup_hook = lambda: None
+    pygnurl.readline.pre_input_hook = lambda: None
+while input('PROMPT>'):
+    pass
+sys.stdout.write('DONE\n')
+'''
+
+LINES = 2000
+
+BENCHMARKS = {
+    'lines': False,
+    'lines_with_hooks': True,
+}
+
+
+def _lines_per_sec(hooks):
+    """Return the rate at which the child reads LINES typed at once."""
+    pid, fd = common.spawn_pty(_CHILD.format(hooks=hooks))
+    try:
+        common.interact(fd, b'', b'PROMPT>')
+        start = time.time()
+        common.interact(fd, b'l\r' * LINES + b'\r', b'DONE')
+        return LINES / (time.time() - start)
+    finally:
+        common.finish_pty(pid, fd)
+
+
+def run(args):
+    """Run every per-line benchmark and return the results."""
+    results = {}
+    for name in sorted(BENCHMARKS):
+        samples = [_lines_per_sec(BENCHMARKS[name])
+                   for _ in range(args.repeat)]
+        results[name] = {'lines_per_sec': common.median(samples)}
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('per_line', run))
@@ -0,0 +1,66 @@
+"""Throughput of the read loop behind input().
+
+A fresh interpreter reads lines through pygnurl from a pty while the
+benchmark types into it as fast as the pty accepts, measuring
+characters per second from the first keystroke until the child has
+returned every line:
+
+* ``long_line``: a single line of several thousand characters, like a
+  paste
+* ``short_lines``: many short lines, like piped or pasted commands
+* ``key_repeat``: a held-down editing key (alternating cursor
+  movements), which Readline processes one key at a time
+* ``paste``: many lines pasted with bracketed paste markers, as a
+  terminal sends them
+* ``paste_unbracketed``: the same lines without the markers, as a
+  terminal without bracketed paste support sends them
+"""
+import sys
+import time
+
+from . import common
+
+# Executed in the child; reads lines until one is empty. Readline's own
+# bracketed paste would insert every pasted line into one.
+_CHILD = r'''
+import sys
+import pygnurl
+pygnurl.readline.bracketed_paste = True
+while input('PROMPT>'):
+    pass
+sys.stdout.write('DONE\n')
+'''
+
+BENCHMARKS = {
+    'long_line': b'x' * 4000 + b'\r\r',
+    'short_lines': (b'y' * 19 + b'\r') * 200 + b'\r',
+    'key_repeat': b'z' * 10 + b'\x02\x06' * 2000 + b'\r\r',
+    'paste': b'\x1b[200~' + (b'p' * 79 + b'\n') * 500 + b'\x1b[201~\r',
+    'paste_unbracketed': (b'p' * 79 + b'\r') * 500 + b'\r',
+}
+
+
+def _chars_per_sec(data):
+    """Return the rate at which the child reads data, typed at once."""
+    pid, fd = common.spawn_pty(_CHILD)
+    try:
+        common.interact(fd, b'', b'PROMPT>')
+        start = time.time()
+        common.interact(fd, data, b'DONE')
+        return len(data) / (time.time() - start)
+    finally:
+        common.finish_pty(pid, fd)
+
+
+def run(args):
+    """Run every read loop benchmark and return the results."""
+    results = {}
+    for name in sorted(BENCHMARKS):
+        samples = [_chars_per_sec(BENCHMARKS[name])
+                   for _ in range(args.repeat)]
+        results[name] = {'chars_per_sec': common.median(samples)}
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('read_loop', run))
@@ -0,0 +1,67 @@
+"""Per-wakeup cost of protecting Readline from SIGINT.
+
+Compares swapping the SIGINT handler to SIG_IGN and back around each
+call into Readline, which is how the read loop used to work, against
+deferring SIGINT with DeferredInterrupt. The read loop enters a
+DeferredInterrupt once per line and calls defer and resume once per
+wakeup. The unprotected benchmark is an empty call, for reference.
+"""
+import contextlib
+import signal
+import sys
+import timeit
+
+from . import common
+
+
+@contextlib.contextmanager
+def _ignore_sigint():
+    """The protection the read loop used before DeferredInterrupt."""
+    old_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, old_handler)
+
+
+def _per_wakeup(func, repeat, number=20000):
+    """Return the best cost of calling func in nanoseconds."""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def run(args):
+    """Run every SIGINT benchmark and return the results."""
+    from pygnurl.interface import DeferredInterrupt
+
+    def unprotected():
+        pass
+
+    def ignore_sigint():
+        with _ignore_sigint():
+            pass
+
+    interrupt = DeferredInterrupt()
+
+    def deferred():
+        interrupt.defer()
+        try:
+            pass
+        finally:
+            interrupt.resume()
+
+    benchmarks = {
+        'unprotected': unprotected,
+        'ignore_sigint': ignore_sigint,
+        'deferred': deferred,
+    }
+    results = {}
+    with interrupt:
+        for name in sorted(benchmarks):
+            results[name] = {'ns': _per_wakeup(benchmarks[name],
+                                               args.repeat * 3)}
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('sigint', run))
@@ -0,0 +1,60 @@
+"""Import-time and time-to-first-prompt benchmarks.
+
+Each benchmark runs in a fresh interpreter and measures the wall time,
+RSS growth and ctypes calls of:
+
+* ``import pygnurl``
+* ``import readline`` through ``pygnurl/modules/readline.py``
+* everything the interactive interpreter does before its first prompt
+  when ``PYTHONSTARTUP`` points at ``pygnurl/examples/startup.py``
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from . import common
+
+STARTUP = os.path.join(common.ROOT, 'pygnurl', 'examples', 'startup.py')
+
+BENCHMARKS = {
+    'import_pygnurl': ('', 'import pygnurl'),
+    'import_readline': ('', 'import readline'),
+    # This mirrors what the interpreter does before the first prompt:
+    # run the startup file then sys.__interactivehook__ if it exists.
+    'first_prompt': (
+        '', 'import runpy\n'
+            'runpy.run_path({!r}, run_name="__main__")\n'
+            'getattr(sys, "__interactivehook__", lambda: None)()\n'
+            .format(STARTUP)),
+}
+
+
+def run(args):
+    """Run every startup benchmark and return the results."""
+    home = tempfile.mkdtemp()
+    try:
+        # The shim must shadow any built-in readline module, and the
+        # interactive hook must not touch the real user's files.
+        env = common.child_env(HOME=home)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.join(common.ROOT, 'pygnurl', 'modules'),
+             env['PYTHONPATH']])
+        results = {}
+        for name in sorted(BENCHMARKS):
+            setup, stmt = BENCHMARKS[name]
+            samples = [common.measure_statement(stmt, setup, env=env)
+                       for _ in range(args.repeat)]
+            result = common.summarize(samples)
+            counts = common.measure_statement(stmt, setup, count=True,
+                                              env=env)
+            del counts['wall_ms'], counts['rss_kb']
+            result.update(counts)
+            results[name] = result
+        return results
+    finally:
+        shutil.rmtree(home)
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('startup', run))
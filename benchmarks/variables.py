@@ -0,0 +1,75 @@
+"""Per-access cost of Readline variables.
+
+Compares looking a variable up with in_dll on every access, which is
+how Bindings.get used to work, against the pre-resolved variables used
+by the Readline, Completion and History properties. The long_line
+benchmarks read a multi-kilobyte, non-ASCII line, where skipping the
+decode matters most; both still copy the line.
+"""
+from ctypes import c_char_p, c_int
+import sys
+import timeit
+
+from . import common
+
+LONG_LINE = u'\u00e9' * 2048
+
+
+def _in_dll_int(dll, name):
+    """Read an int variable the old way."""
+    return c_int.in_dll(dll, name).value
+
+
+def _in_dll_string(dll, name):
+    """Read a string variable the old way."""
+    value = c_char_p.in_dll(dll, name).value
+    return value.decode() if value is not None else None
+
+
+def _per_access(func, repeat, number=20000):
+    """Return the best cost of calling func in nanoseconds."""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def run(args):
+    """Run every variable benchmark and return the results."""
+    import pygnurl
+    readline = pygnurl.readline
+    dll = readline.lib.dll
+    readline.line_buffer = 'x' * 80
+
+    benchmarks = {
+        'point_in_dll': lambda: _in_dll_int(dll, 'rl_point'),
+        'point_variable': lambda: readline.point,
+        'line_buffer_in_dll': lambda: _in_dll_string(dll, 'rl_line_buffer'),
+        'line_buffer_variable': lambda: readline.line_buffer,
+        'prompt_in_dll': lambda: _in_dll_string(dll, 'rl_prompt'),
+        'prompt_variable': lambda: readline.prompt,
+    }
+    results = {}
+    for name in sorted(benchmarks):
+        results[name] = {'ns': _per_access(benchmarks[name],
+                                           args.repeat * 3)}
+
+    # Swap in the long line directly; the line_buffer setter measures
+    # the line in characters rather than bytes.
+    long_line = LONG_LINE.encode('utf-8')
+    lib = readline.lib
+    lib.rl_delete_text(0, lib.get(c_int, 'rl_end'))
+    lib.set(c_int, 'rl_point', 0)
+    lib.rl_insert_text(long_line)
+    benchmarks = {
+        'long_line_in_dll': lambda: _in_dll_string(dll, 'rl_line_buffer'),
+        'long_line_variable': lambda: readline.line_buffer,
+    }
+    for name in sorted(benchmarks):
+        results[name] = {'ns': _per_access(benchmarks[name],
+                                           args.repeat * 3)}
+    lib.rl_delete_text(0, len(long_line))
+    lib.set(c_int, 'rl_point', 0)
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(common.main('variables', run))
@@ -16,12 +16,16 @@ import sys
 # will get no useful information unless I add in this workaround.
 # See https://bugs.python.org/issue17716.
 try:
+    from . import discovery
     from . import interface
     from . import errors
+    from . import output
 except ImportError:
     # pylint: disable=invalid-name
+    discovery = importlib.import_module('pygnurl.discovery')
     interface = importlib.import_module('pygnurl.interface')
     errors = importlib.import_module('pygnurl.errors')
+    output = importlib.import_module('pygnurl.output')
 
 readline = None  # pylint: disable=invalid-name
 
@@ -29,27 +33,54 @@ readline = None  # pylint: disable=invalid-name
 class ConsoleHandler(logging.StreamHandler):
     """Readline-aware StreamHandler.
 
-    Will add new lines and update display as required.
+    Records logged while Readline is reading a line are written above
+    the prompt by a pygnurl.output.PromptWriter, which redisplays the
+    prompt once per batch of records rather than once per record. The
+    writer is created for the first such record, from any thread, and
+    kept until the handler is closed.
     """
-    def format(self, record):
-        """If accepting input, add a new line to the record."""
-        msg = super(ConsoleHandler, self).format(record)
-        if self._is_reading():
-            msg = '\n' + msg
-        return msg
+    def __init__(self, stream=None):
+        super(ConsoleHandler, self).__init__(stream)
+        self.writer = None
 
     def emit(self, record):
-        """If accepting input, update the display after logging."""
-        super(ConsoleHandler, self).emit(record)
-        if self._is_reading():
-            readline.forced_update_display()
+        """Write the record, above the prompt if accepting input."""
+        if self.writer is None and not self._is_reading():
+            super(ConsoleHandler, self).emit(record)
+            return
+        try:
+            if self.writer is None:
+                self.writer = output.PromptWriter(readline, self.stream)
+            self.writer.stream = self.stream
+            # Python 2 handlers have no terminator.
+            terminator = getattr(self, 'terminator', '\n')
+            self.writer.write(self.format(record) + terminator)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def close(self):
+        """Close the writer, if any, and the handler."""
+        self.acquire()
+        try:
+            if self.writer is not None:
+                writer, self.writer = self.writer, None
+                writer.close()
+        except Exception:  # pylint: disable=broad-except
+            # Readline may already be gone when logging shuts down.
+            pass
+        finally:
+            self.release()
+        super(ConsoleHandler, self).close()
 
     @staticmethod
     def _is_reading():
         """Return True if Readline is currently reading a line."""
         # The logger may be written to before readline has been fully
-        # initialized and assigned to this variable.
-        return readline and not readline.done
+        # initialized and assigned to this variable. A deferred
+        # instance can't be reading, and logging shouldn't construct it.
+        if isinstance(readline, interface.LazyReadline):
+            return readline.initialized and readline.reading
+        return readline is not None and readline.reading
 
 
 def _init_logging():
@@ -81,8 +112,8 @@ _init_logging()
 def _load_library():
     """Load and return the Readline shared library.
 
-    The name is taken from the PYGNURL_LIB environment variable or a
-    platform-specific default if one exists.
+    The name is taken from the PYGNURL_LIB environment variable if it
+    is set; otherwise the library is found by discovery.find_library.
     """
     logger = logging.getLogger(__name__)
 
@@ -94,16 +125,9 @@ def _load_library():
         logger.info('using environment library %s', environ_lib)
         return ctypes.cdll.LoadLibrary(environ_lib)
 
-    default_lib = None
-    if sys.platform.startswith('linux'):
-        default_lib = 'libreadline.so.6'
-
-    if default_lib is not None:
-        logger.info('using default library %s', default_lib)
-        try:
-            return ctypes.cdll.LoadLibrary(default_lib)
-        except OSError:
-            logger.exception()
+    dll = discovery.find_library()
+    if dll is not None:
+        return dll
 
     msg = 'PYGNURL_LIB environment variable not set and no default found'
     raise errors.ConfigurationError(msg)
@@ -112,10 +136,28 @@ def _load_library():
 def _init_readline(dll):
     """Return a Readline instance for the current platform.
 
+    If the PYGNURL_LAZY environment variable is set, the instance is
+    only constructed when it is first used.
+
     :rtype: pygnurl.interface.Readline
     """
     if sys.platform == 'win32':
-        return interface.WindowsReadline(dll)
+        factory = interface.WindowsReadline
+    else:
+        factory = interface.Readline
+    if os.environ.get('PYGNURL_LAZY'):
+        return interface.LazyReadline(dll, factory)
+    return factory(dll)
+
+
+def add_init_callback(callback):
+    """Call callback(readline) once pygnurl.readline is constructed.
+
+    Unless pygnurl.readline is deferred (see _init_readline), this
+    calls callback immediately.
+    """
+    if isinstance(readline, interface.LazyReadline):
+        readline.add_init_callback(callback)
     else:
-        return interface.Readline(dll)
+        callback(readline)
 readline = _init_readline(_load_library())  # pylint: disable=invalid-name
@@ -0,0 +1,186 @@
+"""Reading lines from an asyncio event loop.
+
+See Readline.read_line_async. Readline's callback interface is driven
+from loop.add_reader on the input stream's descriptor, so no thread is
+needed and the event loop keeps running while a line is edited. Input
+hooks are run from the event loop too.
+"""
+import asyncio
+import logging
+
+from . import interface
+from . import strings
+
+
+def read_line(readline, prompt='', loop=None):
+    """Return a future for a line read by readline.
+
+    loop defaults to the current event loop.
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    reader = LineReader(readline, prompt, loop)
+    reader.start()
+    return reader.future
+
+
+class LineReader(object):
+    """Reads a single line for read_line."""
+    # The reader currently using Readline, if any. Readline only has
+    # one line handler, so only one line can be read at a time.
+    active = None
+
+    def __init__(self, readline, prompt, loop):
+        self.readline = readline
+        self.prompt = strings.encode(prompt)
+        self.loop = loop
+        self.future = loop.create_future()
+        self.logger = logging.getLogger(__name__)
+
+        self._interrupt = interface.DeferredInterrupt()
+        self._paste_mode = False
+        self._fileno = None
+        self._waiter = None
+        self._wakeup_fileno = None
+        # Input hook descriptors watched with add_reader, and the timer
+        # for the next hook due.
+        self._hook_filenos = set()
+        self._hook_timer = None
+
+    def start(self):
+        """Display the prompt and start watching for input."""
+        # pylint: disable=protected-access
+        readline = self.readline
+        if LineReader.active is not None:
+            raise RuntimeError('already reading a line')
+        if readline._pasted_lines:
+            line = readline._next_pasted_line(self.prompt)
+            self._finish(line)
+            return
+
+        LineReader.active = self
+        self._interrupt.__enter__()
+        try:
+            with interface.store_locale():
+                self._paste_mode = readline._begin_line(self.prompt)
+            self._fileno = readline._fileno
+            self.loop.add_reader(self._fileno, self._on_readable)
+            # Adding or removing an input hook wakes the waiter, which
+            # tells the loop to watch the hooks again.
+            self._waiter = readline._input_waiter()
+            self._wakeup_fileno = self._waiter.wakeup_fileno
+            self.loop.add_reader(self._wakeup_fileno, self._on_wakeup)
+            self._run_hooks()
+        except BaseException:
+            self._abort()
+            raise
+        self.future.add_done_callback(self._on_done)
+        if readline._typeahead:
+            # Left over from a paste; the descriptor may never become
+            # readable for it.
+            self.loop.call_soon(self._on_readable)
+
+    def _on_readable(self):
+        """Let Readline process the input that has arrived."""
+        # pylint: disable=protected-access
+        if self.future.done():
+            return
+        readline = self.readline
+        try:
+            with interface.store_locale():
+                readline._read_pending(self._interrupt)
+        except KeyboardInterrupt:
+            self._abort()
+            self.future.cancel()
+            return
+        except Exception as exc:  # pylint: disable=broad-except
+            self._abort()
+            self.future.set_exception(exc)
+            return
+        if readline._input_complete:
+            self._stop()
+            self._finish(readline._completed_input_string)
+        elif readline._typeahead:
+            # Input already read; the descriptor may not become
+            # readable again for it.
+            self.loop.call_soon(self._on_readable)
+
+    def _on_wakeup(self):
+        """Watch the input hooks again after one is added or removed."""
+        self._waiter.clear_wakeup()
+        self._run_hooks()
+
+    def _on_hook_readable(self, fileno):
+        """Run the input hooks waiting for fileno."""
+        # pylint: disable=protected-access
+        now = interface._monotonic()
+        for hook in self.readline._input_hooks:
+            if hook.fileno == fileno:
+                hook.due = now
+        self._run_hooks()
+
+    def _run_hooks(self):
+        """Run the input hooks that are due, then watch their
+        descriptors and schedule the next one due.
+        """
+        # pylint: disable=protected-access
+        if LineReader.active is not self:
+            return
+        readline = self.readline
+        if self._hook_timer is not None:
+            self._hook_timer.cancel()
+            self._hook_timer = None
+        timeout = readline._run_input_hooks()
+        filenos = set(hook.fileno for hook in readline._input_hooks
+                      if hook.fileno not in (None, self._fileno))
+        for fileno in self._hook_filenos - filenos:
+            self.loop.remove_reader(fileno)
+        for fileno in filenos - self._hook_filenos:
+            self.loop.add_reader(fileno, self._on_hook_readable, fileno)
+        self._hook_filenos = filenos
+        if timeout is not None:
+            self._hook_timer = self.loop.call_later(timeout, self._run_hooks)
+
+    def _finish(self, line):
+        """Complete the future with line, or EOFError if it is None."""
+        if line is None:
+            self.future.set_exception(EOFError())
+            return
+        # pylint: disable=protected-access
+        self.readline._add_history(line)
+        self.future.set_result(strings.decode(line))
+
+    def _on_done(self, future):
+        """Clean up if the future was cancelled while reading."""
+        if future.cancelled() and LineReader.active is self:
+            self.logger.debug('line cancelled')
+            self._abort()
+
+    def _abort(self):
+        """Abandon the line and restore the terminal."""
+        # pylint: disable=protected-access
+        if LineReader.active is not self:
+            return
+        self.readline._abort_line()
+        self._stop()
+
+    def _stop(self):
+        """Stop watching for input and undo start."""
+        # pylint: disable=protected-access
+        if self._fileno is not None:
+            self.loop.remove_reader(self._fileno)
+            self._fileno = None
+        if self._wakeup_fileno is not None:
+            self.loop.remove_reader(self._wakeup_fileno)
+            self._wakeup_fileno = None
+        self._waiter = None
+        for fileno in self._hook_filenos:
+            self.loop.remove_reader(fileno)
+        self._hook_filenos = set()
+        if self._hook_timer is not None:
+            self._hook_timer.cancel()
+            self._hook_timer = None
+        self.readline._end_line(self._paste_mode)
+        self._paste_mode = False
+        self._interrupt.__exit__(None, None, None)
+        LineReader.active = None
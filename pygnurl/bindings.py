@@ -5,6 +5,82 @@ from . import callback_mananger
 from . import strings
 from . import typedefs
 
+# Functions resolved on first use by Bindings, mapping each name to its
+# argument and return types.
+FUNCTIONS = {
+    # Callback interface
+    'rl_prep_terminal': ([c_int], None),
+    'rl_callback_handler_install': (
+        [c_char_p, typedefs.rl_vcpfunc_t], None),
+    'rl_callback_read_char': ([], None),
+    'rl_free_line_state': ([], None),
+    'rl_cleanup_after_signal': ([], None),
+    'rl_callback_handler_remove': ([], None),
+
+    # Bindings and display
+    'using_history': ([], None),
+    'rl_bind_key': ([c_char, c_void_p], c_int),
+    'rl_bind_key_in_map': ([c_char, c_void_p, c_void_p], c_int),
+    'rl_initialize': ([], c_int),
+    'rl_parse_and_bind': ([c_char_p], c_int),
+    'rl_insert_text': ([c_char_p], c_int),
+    'rl_read_init_file': ([c_char_p], c_int),
+    'rl_redisplay': ([], c_int),
+    'rl_forced_update_display': ([], c_int),
+    'rl_clear_visible_line': ([], c_int),
+    'rl_add_defun': ([c_char_p, c_void_p, c_int], c_int),
+    'rl_get_keymap': ([], c_void_p),
+    'rl_get_keymap_name': ([c_void_p], c_char_p),
+    'rl_set_prompt': ([c_char_p], c_int),
+    'rl_variable_bind': ([c_char_p, c_char_p], c_int),
+    'rl_variable_value': ([c_char_p], c_char_p),
+    'rl_get_keymap_by_name': ([c_char_p], c_void_p),
+    'rl_bind_keyseq_in_map': ([c_char_p, c_void_p, c_void_p], c_int),
+    'rl_newline': ([c_int, c_int], c_int),
+    'rl_resize_terminal': ([], None),
+    'rl_ding': ([], c_int),
+
+    # History
+    'history_list': ([], POINTER(POINTER(typedefs.HIST_ENTRY))),
+    'replace_history_entry': (
+        [c_int, c_char_p, c_void_p], POINTER(typedefs.HIST_ENTRY)),
+    'free_history_entry': ([POINTER(typedefs.HIST_ENTRY)], c_void_p),
+    'remove_history': ([c_int], POINTER(typedefs.HIST_ENTRY)),
+    'add_history': ([c_char_p], None),
+    'add_history_time': ([c_char_p], None),
+    'history_is_stifled': ([], c_int),
+    'history_get': ([c_int], POINTER(typedefs.HIST_ENTRY)),
+    'clear_history': ([], None),
+    'where_history': ([], c_int),
+    'history_set_pos': ([c_int], c_int),
+    'read_history': ([c_char_p], c_int),
+    'write_history': ([c_char_p], c_int),
+    'append_history': ([c_int, c_char_p], c_int),
+    'history_truncate_file': ([c_char_p, c_int], c_int),
+
+    # Completion
+    'rl_filename_completion_function': ([c_char_p, c_int], c_void_p),
+    'rl_completion_matches': (
+        [c_char_p, typedefs.rl_compentry_func_t], c_void_p),
+
+    # Undo and editing
+    'rl_begin_undo_group': ([], c_int),
+    'rl_end_undo_group': ([], c_int),
+    'rl_delete_text': ([c_int, c_int], c_int),
+
+    # C library; won't work on Windows, but shouldn't be accessed anyway.
+    'fileno': ([c_void_p], c_int),
+    'fflush': ([c_void_p], c_int),
+    'fdopen': ([c_int, c_char_p], c_void_p),
+    'fclose': ([c_void_p], c_int),
+}
+
+# Feature availability maps, keyed by library handle.
+_FEATURES = {}
+
+# Variable types converted to and from Python strings.
+_STRING_TYPES = (c_char, c_char_p)
+
 
 class Bindings(object):  # pylint: disable=too-many-instance-attributes
     """Low-level bindings to Readline shared library."""
@@ -14,22 +90,111 @@ class Bindings(object):  # pylint: disable=too-many-instance-attributes
         self.py_cbmanager = callback_mananger.CallbackManager(pythonapi)
 
         self._strings = {}
+        self._variables = {}
+        self._decoded = {}
+
+    def __getattr__(self, name):
+        """Resolve a function from the shared library on first use.
 
-        self._init_functions()
+        The configured function is cached on this object so later
+        lookups bypass this method entirely.
+        """
+        try:
+            argtypes, restype = FUNCTIONS[name]
+        except KeyError:
+            raise AttributeError(name)
+        func = self._get_c_func(name, argtypes, restype)
+        setattr(self, name, func)
+        return func
+
+    @property
+    def features(self):
+        """Return a dict mapping each function name in FUNCTIONS to
+        whether the shared library provides it.
+
+        This is computed once per library.
+        """
+        # pylint: disable=protected-access
+        key = self.dll._handle
+        try:
+            return _FEATURES[key]
+        except KeyError:
+            pass
+        features = {}
+        for name in FUNCTIONS:
+            try:
+                getattr(self.dll, name)
+            except AttributeError:
+                features[name] = False
+            else:
+                features[name] = True
+        _FEATURES[key] = features
+        return features
+
+    def variable(self, c_type, name):
+        """Return a ctypes object of the given type for a variable in
+        the shared library.
+
+        The variable is only looked up the first time; the same object
+        is returned on every later call with the same type.
+        """
+        try:
+            variable = self._variables[name]
+        except KeyError:
+            variable = c_type.in_dll(self.dll, name)
+            self._variables[name] = variable
+        # pylint: disable=unidiomatic-typecheck
+        if type(variable) is not c_type:
+            variable = c_type.from_address(addressof(variable))
+        return variable
 
     def get(self, c_type, name):
         """Get a value of the given type from the shared library."""
-        value = c_type.in_dll(self.dll, name).value
-        if c_type in [c_char, c_char_p] and value is not None:
+        if c_type is c_char_p:
+            return self.get_string(name)
+        value = self.variable(c_type, name).value
+        if value is not None and c_type is c_char:
             value = strings.decode(value)
         return value
 
+    def get_string(self, name):
+        """Get the decoded value of a char * variable.
+
+        Every read still copies the bytes the variable points to and
+        compares them with the last bytes read, so it costs time in
+        proportion to their length. Only the decode is skipped, reusing
+        the last decoded value while the bytes are unchanged.
+        """
+        try:
+            variable = self._variables[name]
+        except KeyError:
+            variable = self.variable(c_char_p, name)
+        # pylint: disable=unidiomatic-typecheck
+        if type(variable) is not c_char_p:
+            variable = self.variable(c_char_p, name)
+        # Readline edits its buffers in place, so neither the pointer
+        # nor the length says whether the contents changed, and undo
+        # list nodes are freed and reallocated at the same addresses.
+        # Copying is cheap compared to decoding, and comparing bytes is
+        # cheaper.
+        raw = variable.value
+        try:
+            cached_raw, decoded = self._decoded[name]
+        except KeyError:
+            pass
+        else:
+            if raw == cached_raw:
+                return decoded
+        decoded = strings.decode(raw)
+        self._decoded[name] = (raw, decoded)
+        return decoded
+
     def set(self, c_type, name, value):
         """Set a value of the given type in the shared library."""
-        if c_type in [c_char, c_char_p] and value is not None:
+        if value is not None and c_type in _STRING_TYPES:
             value = strings.encode(value)
             self._strings[name] = value
-        c_type.in_dll(self.dll, name).value = value
+        self.variable(c_type, name).value = value
 
     def malloc(self, size):
         """Allocate memory and return its address."""
@@ -57,94 +222,48 @@ class Bindings(object):  # pylint: disable=too-many-instance-attributes
         memmove(dup, string, size)
         return dup
 
-    def _init_functions(self):
-        """Add functions from the shared library to this object.
-
-        All functions will have their argument and return types set
-        appropriately.
-        """
-        self.rl_prep_terminal = self._get_c_func(
-            'rl_prep_terminal', [c_int], None)
-        self.rl_callback_handler_install = self._get_c_func(
-            'rl_callback_handler_install', [c_char_p, typedefs.rl_vcpfunc_t],
-            None)
-        self.rl_callback_read_char = self._get_c_func(
-            'rl_callback_read_char', [], None)
-        self.rl_free_line_state = self._get_c_func(
-            'rl_free_line_state', [], None)
-        self.rl_cleanup_after_signal = self._get_c_func(
-            'rl_cleanup_after_signal', [], None)
-        self.rl_callback_handler_remove = self._get_c_func(
-            'rl_callback_handler_remove', [], None)
-
-        self.using_history = self._get_c_func(
-            'using_history', [], None)
-        self.rl_bind_key = self._get_c_func(
-            'rl_bind_key', [c_char, c_void_p], c_int)
-        self.rl_bind_key_in_map = self._get_c_func(
-            'rl_bind_key_in_map', [c_char, c_void_p, c_void_p], c_int)
-        self.rl_initialize = self._get_c_func(
-            'rl_initialize', [], c_int)
-        self.rl_parse_and_bind = self._get_c_func(
-            'rl_parse_and_bind', [c_char_p], c_int)
-        self.rl_insert_text = self._get_c_func(
-            'rl_insert_text', [c_char_p], c_int)
-        self.rl_read_init_file = self._get_c_func(
-            'rl_read_init_file', [c_char_p], c_int)
-        self.rl_redisplay = self._get_c_func(
-            'rl_redisplay', [], c_int)
-        self.rl_forced_update_display = self._get_c_func(
-            'rl_forced_update_display', [], c_int)
-        self.rl_add_defun = self._get_c_func(
-            'rl_add_defun', [c_char_p, c_void_p, c_int], c_int)
-
-        self.history_list = self._get_c_func(
-            'history_list', [], POINTER(POINTER(typedefs.HIST_ENTRY)))
-        self.replace_history_entry = self._get_c_func(
-            'replace_history_entry', [c_int, c_char_p, c_void_p],
-            POINTER(typedefs.HIST_ENTRY))
-        self.free_history_entry = self._get_c_func(
-            'free_history_entry', [POINTER(typedefs.HIST_ENTRY)], c_void_p)
-        self.remove_history = self._get_c_func(
-            'remove_history', [c_int], POINTER(typedefs.HIST_ENTRY))
-        self.add_history = self._get_c_func(
-            'add_history', [c_char_p], None)
-        self.clear_history = self._get_c_func(
-            'clear_history', [], None)
-        self.where_history = self._get_c_func(
-            'where_history', [], c_int)
-        self.history_set_pos = self._get_c_func(
-            'history_set_pos', [c_int], c_int)
-        self.read_history = self._get_c_func(
-            'read_history', [c_char_p], c_int)
-        self.write_history = self._get_c_func(
-            'write_history', [c_char_p], c_int)
-        self.history_truncate_file = self._get_c_func(
-            'history_truncate_file', [c_char_p, c_int], c_int)
-
-        self.rl_filename_completion_function = self._get_c_func(
-            'rl_filename_completion_function', [c_char_p, c_int], c_void_p)
-        self.rl_completion_matches = self._get_c_func(
-            'rl_completion_matches', [c_char_p, typedefs.rl_compentry_func_t],
-            c_void_p)
-
-        self.rl_begin_undo_group = self._get_c_func(
-            'rl_begin_undo_group', [], c_int)
-        self.rl_end_undo_group = self._get_c_func(
-            'rl_end_undo_group', [], c_int)
-        self.rl_delete_text = self._get_c_func(
-            'rl_delete_text', [c_int, c_int], c_int)
-
-        # Won't work on Windows, but shouldn't be accessed anyway.
-        try:
-            self.fileno = self._get_c_func(
-                'fileno', [c_void_p], c_int)
-        except AttributeError:
-            pass
-
     def _get_c_func(self, name, argtypes, restype):
         """Get a configured function from the shared library."""
         func = getattr(self.dll, name)
         func.argtypes = argtypes
         func.restype = restype
         return func
+
+
+class Variable(object):  # pylint: disable=too-few-public-methods
+    """Descriptor for a variable in the shared library.
+
+    The owning object must store its Bindings instance as lib. Values
+    are converted as for Bindings.get and Bindings.set.
+    """
+    def __init__(self, c_type, name, doc=None, readonly=False):
+        self.c_type = c_type
+        self.name = name
+        self.readonly = readonly
+        self.__doc__ = doc
+        self._is_string = c_type is c_char
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.c_type is c_char_p:
+            return instance.lib.get_string(self.name)
+        # This is on the hot path for key handlers, so skip
+        # Bindings.get once the variable has been resolved.
+        try:
+            # pylint: disable=protected-access
+            variable = instance.lib._variables[self.name]
+        except KeyError:
+            variable = instance.lib.variable(self.c_type, self.name)
+        # pylint: disable=unidiomatic-typecheck
+        if type(variable) is not self.c_type:
+            variable = instance.lib.variable(self.c_type, self.name)
+        value = variable.value
+        if self._is_string:
+            value = strings.decode(value)
+        return value
+
+    def __set__(self, instance, value):
+        if self.readonly:
+            raise AttributeError("can't set attribute")
+        instance.lib.set(self.c_type, self.name, value)
@@ -0,0 +1,216 @@
+"""Readline shared library discovery.
+
+The library is searched for in the following order:
+
+#. The location cached by a previous search from this interpreter, as
+   long as the library file has not been modified since
+#. A GNU Readline library the process has already loaded
+#. A list of platform-specific candidate library names
+
+Successful searches are cached in ``library.json`` in the pygnurl cache
+directory (see cache_path).
+"""
+import ctypes
+import json
+import logging
+import os
+import sys
+
+# Library names to try, most recent first.
+CANDIDATES = {
+    'linux': ['libreadline.so.8', 'libreadline.so.7', 'libreadline.so.6',
+              'libreadline.so'],
+    'darwin': ['libreadline.8.dylib', 'libreadline.7.dylib',
+               'libreadline.6.dylib', 'libreadline.dylib'],
+}
+
+# Only GNU Readline sets this to 1; libedit's compatibility layer, for
+# example, does not.
+MARKER = 'rl_gnu_readline_p'
+
+CACHE_FILENAME = 'library.json'
+
+
+class DlInfo(ctypes.Structure):  # pylint: disable=too-few-public-methods
+    """The structure filled in by dladdr.
+
+    typedef struct {
+      const char *dli_fname;
+      void       *dli_fbase;
+      const char *dli_sname;
+      void       *dli_saddr;
+    } Dl_info;
+    """
+    _fields_ = [('dli_fname', ctypes.c_char_p),
+                ('dli_fbase', ctypes.c_void_p),
+                ('dli_sname', ctypes.c_char_p),
+                ('dli_saddr', ctypes.c_void_p)]
+
+
+def cache_path(name):
+    """Return the path of a file in the pygnurl cache directory.
+
+    The directory is taken from the PYGNURL_CACHE_DIR environment
+    variable, defaulting to pygnurl under the user cache directory.
+    Returns None if PYGNURL_CACHE_DIR is set but empty, which disables
+    caching.
+    """
+    try:
+        directory = os.environ['PYGNURL_CACHE_DIR']
+    except KeyError:
+        base = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        directory = os.path.join(base, 'pygnurl')
+    if not directory:
+        return None
+    return os.path.join(directory, name)
+
+
+def read_cache(filename):
+    """Return the JSON contents of a cache file, or {} if unreadable."""
+    if filename is None:
+        return {}
+    try:
+        with open(filename) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def write_cache(filename, contents):
+    """Replace the contents of a cache file, ignoring any errors."""
+    if filename is None:
+        return
+    logger = logging.getLogger(__name__)
+    temp_filename = '{}.{}'.format(filename, os.getpid())
+    try:
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(temp_filename, 'w') as cache_file:
+            json.dump(contents, cache_file)
+        os.rename(temp_filename, filename)
+    except (IOError, OSError):
+        logger.debug('could not write cache file %s', filename,
+                     exc_info=True)
+
+
+def find_library():
+    """Return the Readline shared library, or None if not found."""
+    logger = logging.getLogger(__name__)
+
+    filename = cache_path(CACHE_FILENAME)
+    cache = read_cache(filename)
+    key = _interpreter_key()
+    try:
+        path, mtime = cache[key]
+    except (KeyError, TypeError, ValueError):
+        pass
+    else:
+        if _mtime(path) == mtime:
+            logger.info('using cached library %s', path)
+            try:
+                return ctypes.cdll.LoadLibrary(path)
+            except OSError:
+                logger.debug('could not load cached library %s', path)
+
+    dll = _find_loaded_library() or _probe_candidates()
+    if dll is not None:
+        path = library_path(dll)
+        if path is not None:
+            cache[key] = [path, _mtime(path)]
+            write_cache(filename, cache)
+    return dll
+
+
+def library_path(dll):
+    """Return the filename a loaded Readline library was loaded from.
+
+    Returns None if the platform can't tell us.
+    """
+    try:
+        dladdr = ctypes.CDLL(None).dladdr
+    except (AttributeError, OSError, TypeError):
+        return None
+    dladdr.argtypes = [ctypes.c_void_p, ctypes.POINTER(DlInfo)]
+    dladdr.restype = ctypes.c_int
+    symbol = ctypes.c_int.in_dll(dll, MARKER)
+    info = DlInfo()
+    if not dladdr(ctypes.addressof(symbol), ctypes.byref(info)):
+        return None
+    path = info.dli_fname
+    if path is not None and not isinstance(path, str):
+        path = path.decode(sys.getfilesystemencoding())
+    return path
+
+
+def _is_gnu_readline(dll):
+    """Return True if dll is GNU Readline."""
+    try:
+        return ctypes.c_int.in_dll(dll, MARKER).value == 1
+    except ValueError:
+        return False
+
+
+def _find_loaded_library():
+    """Return a GNU Readline library already mapped by this process."""
+    logger = logging.getLogger(__name__)
+    try:
+        dll = ctypes.CDLL(None)
+    except (OSError, TypeError):
+        # Windows can't open the process itself.
+        pass
+    else:
+        if _is_gnu_readline(dll):
+            logger.info('using library linked into the process')
+            return dll
+
+    # The library may have been loaded privately, for example by the
+    # built-in readline module. Loading it again by path just returns
+    # the existing mapping.
+    try:
+        with open('/proc/self/maps') as maps:
+            paths = set(line.split(None, 5)[-1].strip() for line in maps
+                        if 'libreadline' in line)
+    except (IOError, OSError):
+        return None
+    for path in sorted(paths):
+        if not os.path.basename(path).startswith('libreadline'):
+            continue
+        try:
+            dll = ctypes.cdll.LoadLibrary(path)
+        except OSError:
+            continue
+        if _is_gnu_readline(dll):
+            logger.info('using already loaded library %s', path)
+            return dll
+    return None
+
+
+def _probe_candidates():
+    """Return the first candidate library that can be loaded."""
+    logger = logging.getLogger(__name__)
+    platform = 'linux' if sys.platform.startswith('linux') else sys.platform
+    for name in CANDIDATES.get(platform, []):
+        try:
+            dll = ctypes.cdll.LoadLibrary(name)
+        except OSError:
+            logger.debug('could not load candidate library %s', name)
+            continue
+        if _is_gnu_readline(dll):
+            logger.info('using default library %s', name)
+            return dll
+    return None
+
+
+def _interpreter_key():
+    """Return a key identifying the running interpreter."""
+    return '{}:{:x}'.format(sys.executable, sys.hexversion)
+
+
+def _mtime(path):
+    """Return the modification time of path, or None if missing."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -45,8 +45,9 @@ def show_signature(count, key):  # pylint: disable=unused-argument
     """
     import pygnurl  # pylint: disable=redefined-outer-name,reimported
 
-    line = pygnurl.readline.line_buffer
-    index = pygnurl.readline.point - 1
+    state = pygnurl.readline.snapshot()
+    line = state.line_buffer
+    index = state.point - 1
     if line[index] != '(':
         raise Exception('not at start of function call')
     line = line[:index]
@@ -60,7 +61,7 @@ def show_signature(count, key):  # pylint: disable=unused-argument
         raise Exception('could not find function name')
     func_or_class = eval(name, globals())  # pylint: disable=eval-used
     spec = _get_signature(func_or_class)
-    padding = ' ' * (index - len(name) + len(pygnurl.readline.prompt))
+    padding = ' ' * (index - len(name) + len(state.prompt))
     print('\n{}{}{}'.format(padding, name, spec))
     pygnurl.readline.forced_update_display()
 
@@ -0,0 +1,77 @@
+"""Reading history files a chunk at a time.
+
+read_entries reads a history file from the end, so the newest entries
+come first and a caller wanting only some of them can stop early. It
+splits the file into entries as Readline's read_history does: each
+line is an entry, except for empty lines and the timestamps written
+before entries when history_write_timestamps is set. Those start with
+history_comment_char followed by a digit. If the file starts with one
+while history_write_timestamps is set, the lines up to the next
+timestamp are a single entry.
+"""
+import os
+import re
+
+# Bytes read from the file at a time.
+CHUNK_SIZE = 1024 * 1024
+
+
+def _is_timestamp(line, comment_char):
+    """Return True if line is a timestamp rather than an entry."""
+    return (comment_char != b'\0' and line[:1] == comment_char and
+            line[1:2].isdigit())
+
+
+def timestamp_seconds(timestamp):
+    """Return the time of a timestamp line, as Readline reads it."""
+    digits = re.match(br'.(\d+)', timestamp).group(1)
+    return int(digits)
+
+
+def _reversed_lines(stream, chunk_size):
+    """Generate the lines of a binary file from the last, without their
+    line endings.
+    """
+    stream.seek(0, os.SEEK_END)
+    position = stream.tell()
+    # The start of a line, whose beginning is in an earlier chunk.
+    tail = b''
+    while position > 0:
+        size = min(chunk_size, position)
+        position -= size
+        stream.seek(position)
+        lines = (stream.read(size) + tail).split(b'\n')
+        tail = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+    yield tail
+
+
+def read_entries(path, comment_char=b'\0', multiline=False,
+                 chunk_size=CHUNK_SIZE):
+    """Generate (line, timestamp) for each entry in the history file at
+    path, as bytes, from the newest.
+
+    timestamp is the line before the entry, including comment_char, or
+    None. multiline is the value of history_write_timestamps; at most
+    chunk_size bytes are read at a time, plus the longest entry.
+    """
+    with open(path, 'rb') as stream:
+        multiline = multiline and _is_timestamp(stream.read(2),
+                                                comment_char)
+        # The lines of the entry being read, newest first.
+        pending = []
+        for line in _reversed_lines(stream, chunk_size):
+            if not line:
+                continue
+            if _is_timestamp(line, comment_char):
+                if pending:
+                    yield b'\n'.join(reversed(pending)), line
+                    pending = []
+                continue
+            if pending and not multiline:
+                yield pending[0], None
+                pending = []
+            pending.append(line)
+        if pending:
+            yield b'\n'.join(reversed(pending)), None
@@ -0,0 +1,154 @@
+"""Compiled Readline init file configurations.
+
+A configuration (the contents of an init file, or a set of lines for
+parse_and_bind) is compiled into the list of lines that actually need
+to be applied, each paired with a key identifying the setting it
+changes. Compiled configurations are cached by content hash and
+library version, both in memory and in ``inputrc.json`` in the pygnurl
+cache directory.
+"""
+import logging
+
+from . import discovery
+from . import strings
+
+CACHE_FILENAME = 'inputrc.json'
+
+# Number of compiled configurations kept in the cache file.
+CACHE_SIZE = 16
+
+# Canonical names for keymaps, see rl_get_keymap_by_name.
+KEYMAP_ALIASES = {
+    'emacs': 'emacs-standard',
+    'vi': 'vi-command',
+    'vi-move': 'vi-command',
+}
+
+# The keymap selected by each editing mode.
+EDITING_MODE_KEYMAPS = {
+    'emacs': 'emacs-standard',
+    'vi': 'vi-insert',
+}
+
+_compiled = {}
+
+
+def compile_config(config):
+    """Compile a configuration.
+
+    config is a string or an iterable of lines. Returns a list of
+    (key, line) tuples in the order they must be applied. Comments,
+    blank lines, and key bindings or variable settings overridden by a
+    later line are removed.
+
+    The key is a tuple identifying the setting a line changes, or None
+    if it can't be determined; see setting_key. Lines inside
+    conditional constructs always have a key of None and are never
+    removed.
+    """
+    if hasattr(config, 'splitlines'):
+        config = config.splitlines()
+    keymap = None
+    depth = 0
+    entries = []
+    for line in config:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        key = None
+        if line.startswith('$'):
+            directive = (line[1:].split() or [''])[0].lower()
+            if directive == 'if':
+                depth += 1
+            elif directive == 'endif' and depth:
+                depth -= 1
+        elif not depth:
+            key, keymap = setting_key(line, keymap)
+        entries.append((key, line))
+
+    # Keep only the last line for each setting.
+    last = {}
+    for index, (key, _) in enumerate(entries):
+        if key is not None:
+            last[key] = index
+    return [(key, line) for index, (key, line) in enumerate(entries)
+            if key is None or last[key] == index]
+
+
+def setting_key(line, keymap):
+    """Return (key, keymap) for a single unconditional line.
+
+    keymap is the name of the keymap in effect before the line, or
+    None for the keymap in effect before the configuration. The
+    returned keymap is the one in effect after the line.
+
+    Key bindings have a key of ('bind', keymap, keyseq) and variables
+    have a key of ('set', name). Lines that select a keymap always
+    have a key of None, since later lines depend on them.
+    """
+    if line[:3].lower() == 'set' and line[3:4].isspace():
+        words = line.split()
+        if len(words) < 2:
+            return None, keymap
+        name = words[1].lower()
+        value = words[2].lower() if len(words) > 2 else ''
+        if name == 'keymap':
+            return None, KEYMAP_ALIASES.get(value, value)
+        if name == 'editing-mode':
+            return None, EDITING_MODE_KEYMAPS.get(value, keymap)
+        return ('set', name), keymap
+
+    if line.startswith('"'):
+        # Quoted key sequence; find the closing quote.
+        index = 1
+        while index < len(line) and line[index] != '"':
+            if line[index] == '\\':
+                index += 1
+            index += 1
+        keyseq = line[:index + 1]
+    else:
+        keyseq = line.split(':', 1)[0]
+        if keyseq == line or not keyseq or keyseq[-1].isspace():
+            return None, keymap
+    return ('bind', keymap, keyseq), keymap
+
+
+def compile_cached(config, version):
+    """Return compile_config(config), using the cache if possible.
+
+    version is the library version, which is part of the cache key.
+    """
+    # Imported here as it costs several megabytes, and most programs
+    # never cache a configuration.
+    import hashlib
+    logger = logging.getLogger(__name__)
+    if not hasattr(config, 'splitlines'):
+        config = '\n'.join(config)
+    digest = hashlib.sha1(strings.encode(config)).hexdigest()
+    cache_key = '{}:{:x}'.format(digest, version)
+    try:
+        return _compiled[cache_key]
+    except KeyError:
+        pass
+
+    filename = discovery.cache_path(CACHE_FILENAME)
+    cache = discovery.read_cache(filename)
+    if not isinstance(cache, dict):
+        cache = {}
+    try:
+        compiled = [(tuple(key) if key is not None else None, line)
+                    for key, line in cache[cache_key]['lines']]
+    except (KeyError, TypeError, ValueError):
+        logger.debug('compiling configuration %s', cache_key)
+        compiled = compile_config(config)
+        order = max([entry['order'] for entry in cache.values()] + [0])
+        cache[cache_key] = {'lines': compiled, 'order': order + 1}
+        # Drop the least recently compiled configurations.
+        for old_key in sorted(cache, key=lambda k: cache[k]['order'],
+                              reverse=True)[CACHE_SIZE:]:
+            del cache[old_key]
+        discovery.write_cache(filename, cache)
+    else:
+        logger.debug('using cached configuration %s', cache_key)
+    _compiled[cache_key] = compiled
+    return compiled
@@ -1,41 +1,343 @@
 """High-level interface to Readline API."""
 from __future__ import unicode_literals
 
+import bisect
+import collections
 import contextlib
 from ctypes import *  # pylint: disable=wildcard-import,unused-wildcard-import
 import errno
+import fnmatch
 import functools
+import itertools
 import locale
 import logging
 import os
+import re
 import select
 import signal
+import sys
+import threading
 import time
 
+try:
+    import selectors
+except ImportError:
+    # Python 2; InputWaiter falls back to select.
+    selectors = None
+
 from . import bindings
+from . import callback_mananger
+from . import histfile
+from . import inputrc
+from . import search
 from . import strings
 from . import typedefs
 
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+# The LC_CTYPE locale named by the environment, see store_locale.
+_environment_locale = None
+
 
 @contextlib.contextmanager
 def store_locale():
-    """Save and restore the current locale."""
-    saved_locale = locale.setlocale(locale.LC_CTYPE, '')
-    locale.setlocale(locale.LC_CTYPE, '')
+    """Use the environment's LC_CTYPE locale, then restore the current
+    one.
+
+    The environment's locale is only looked up the first time. The
+    locale is left alone if it's already in use, as it usually is.
+    """
+    global _environment_locale  # pylint: disable=global-statement
+    saved_locale = locale.setlocale(locale.LC_CTYPE)
+    if _environment_locale is None:
+        _environment_locale = locale.setlocale(locale.LC_CTYPE, '')
+    elif saved_locale != _environment_locale:
+        locale.setlocale(locale.LC_CTYPE, _environment_locale)
     try:
         yield
     finally:
-        locale.setlocale(locale.LC_CTYPE, saved_locale)
+        if saved_locale != _environment_locale:
+            locale.setlocale(locale.LC_CTYPE, saved_locale)
+
+
+def _line_allocator():
+    """Return the function that allocates lines returned to Python.
+
+    Lines must be allocated with PyMem_RawMalloc (Python 3.4+) or
+    PyMem_Malloc (earlier versions).
+    """
+    # Checking the version saves looking the function up twice.
+    if sys.version_info >= (3, 4):
+        name = 'PyMem_RawMalloc'
+    else:
+        name = 'PyMem_Malloc'
+    # A prototype of our own, rather than changing the types of the
+    # function shared through pythonapi.
+    return PYFUNCTYPE(c_void_p, c_size_t)((name, pythonapi))
+
+
+class DeferredInterrupt(object):
+    """Context manager that can defer SIGINT instead of losing it.
+
+    While entered, SIGINT is handled by this object. Between defer and
+    resume, a SIGINT is only recorded; resume then passes it on to the
+    previous handler, which usually raises KeyboardInterrupt. Outside
+    of that window, SIGINT is passed on immediately.
+
+    Signal handlers can only be set from the main thread, and Python
+    only runs them there, so elsewhere this does nothing. If SIGINT is
+    ignored, it stays ignored.
+    """
+    def __init__(self):
+        self.deferring = False
+        self._pending = None
+        self._old_handler = None
+        self._installed = False
+
+    def __enter__(self):
+        try:
+            old_handler = signal.getsignal(signal.SIGINT)
+            if old_handler != signal.SIG_IGN:
+                signal.signal(signal.SIGINT, self._handler)
+                self._old_handler = old_handler
+                self._installed = True
+        except ValueError:
+            # Not the main thread.
+            pass
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._installed:
+            signal.signal(signal.SIGINT, self._old_handler)
+            self._installed = False
+
+    def defer(self):
+        """Start recording SIGINT rather than passing it on."""
+        self.deferring = True
+
+    def resume(self):
+        """Stop deferring SIGINT and pass on any that was recorded."""
+        self.deferring = False
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self._dispatch(*pending)
+
+    def _handler(self, signum, frame):
+        """Used as the SIGINT handler while entered."""
+        if self.deferring:
+            self._pending = (signum, frame)
+        else:
+            self._dispatch(signum, frame)
 
+    def _dispatch(self, signum, frame):
+        """Pass a signal on to the previous handler."""
+        if callable(self._old_handler):
+            self._old_handler(signum, frame)
+        else:
+            # SIG_DFL, or a handler not installed from Python.
+            raise KeyboardInterrupt
+
+
+# The most characters processed per wakeup of the read loop. SIGINT
+# is deferred while they are processed.
+MAX_READS_PER_WAKEUP = 1024
+
+# The most bytes read from the input stream at a time.
+READ_SIZE = 65536
+
+# Seconds between calls to PyOS_InputHook while waiting for input.
+OS_INPUT_HOOK_INTERVAL = 0.1
+
+# Terminal sequences for bracketed paste mode; the terminal surrounds
+# pasted text with PASTE_START and PASTE_END while it's enabled.
+BRACKETED_PASTE_ENABLE = b'\x1b[?2004h'
+BRACKETED_PASTE_DISABLE = b'\x1b[?2004l'
+PASTE_START = b'\x1b[200~'
+PASTE_END = b'\x1b[201~'
+
+# Seconds to wait for more of a paste before giving up on PASTE_END.
+PASTE_TIMEOUT = 1.0
+
+# The keymaps PASTE_START is bound in.
+PASTE_KEYMAPS = (b'emacs-standard', b'vi-insert', b'vi-command')
+
+
+class InputWaiter(object):
+    """Waits for file descriptors to become readable.
+
+    Descriptors are registered once with the best mechanism available
+    (poll, then selectors, then select), so each wait is a single
+    system call and descriptors above FD_SETSIZE work unless select is
+    the only option. Another thread can call wake to have a wait return
+    early, for instance after adding a descriptor to wait for.
+    """
+    def __init__(self, fileno):
+        self.fileno = fileno
+        self._filenos = []
+        self._selector = None
+        self._poll = None
+        # poll doesn't work on terminals on Mac OS X.
+        if hasattr(select, 'poll') and sys.platform != 'darwin':
+            self._poll = select.poll()
+        elif selectors is not None:
+            self._selector = selectors.DefaultSelector()
+        self.add(fileno)
+        # wake writes to the pipe, unless a byte is already waiting.
+        self._lock = threading.Lock()
+        self._woken = False
+        self._wakeup = os.pipe()
+        self.add(self._wakeup[0])
+
+    def add(self, fileno):
+        """Also wait for fileno."""
+        if fileno in self._filenos:
+            return
+        self._filenos.append(fileno)
+        if self._poll is not None:
+            self._poll.register(fileno, select.POLLIN)
+        elif self._selector is not None:
+            try:
+                self._selector.register(fileno, selectors.EVENT_READ)
+            except (IOError, OSError, ValueError):
+                # kqueue may reject some descriptors; select won't.
+                self._selector.close()
+                self._selector = None
+
+    def remove(self, fileno):
+        """Stop waiting for fileno."""
+        if fileno not in self._filenos:
+            return
+        self._filenos.remove(fileno)
+        if self._poll is not None:
+            self._poll.unregister(fileno)
+        elif self._selector is not None:
+            self._selector.unregister(fileno)
 
-@contextlib.contextmanager
-def ignore_sigint():
-    """Ignore SIGINT for the duration."""
-    old_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
-    try:
-        yield
-    finally:
-        signal.signal(signal.SIGINT, old_handler)
+    def wait(self, timeout=None):
+        """Return the descriptors that become readable in time.
+
+        Returns early, possibly with no descriptors, if wake is called.
+
+        :param timeout: time in seconds to wait, or None to block
+        """
+        if self._poll is not None:
+            if timeout is not None:
+                timeout *= 1000
+            ready = [fileno for fileno, _ in self._poll.poll(timeout)]
+        elif self._selector is not None:
+            ready = [key.fd for key, _ in self._selector.select(timeout)]
+        else:
+            ready = select.select(self._filenos, [], [], timeout)[0]
+        if self._wakeup[0] in ready:
+            ready.remove(self._wakeup[0])
+            self.clear_wakeup()
+        return ready
+
+    @property
+    def wakeup_fileno(self):
+        """The descriptor wake makes readable, for use by event loops.
+
+        Call clear_wakeup once it is readable.
+        """
+        return self._wakeup[0]
+
+    def clear_wakeup(self):
+        """Consume a wake once wakeup_fileno is readable."""
+        # The pipe is readable, so this doesn't block. Clearing _woken
+        # afterwards means a wake can't be lost: any wake seeing it set
+        # happens before the caller waits again.
+        os.read(self._wakeup[0], 64)
+        with self._lock:
+            self._woken = False
+
+    def wake(self):
+        """Make the current or next wait return."""
+        with self._lock:
+            if self._woken or self._wakeup is None:
+                return
+            self._woken = True
+            os.write(self._wakeup[1], b'\0')
+
+    def close(self):
+        """Release the registrations."""
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        self._poll = None
+        with self._lock:
+            if self._wakeup is not None:
+                for fileno in self._wakeup:
+                    os.close(fileno)
+                self._wakeup = None
+
+
+class InputHook(object):  # pylint: disable=too-few-public-methods
+    """An input hook registered with Readline.add_input_hook."""
+    __slots__ = ('callback', 'fileno', 'interval', 'due')
+
+    def __init__(self, callback, fileno, interval):
+        self.callback = callback
+        self.fileno = fileno
+        self.interval = interval
+        # When the hook should next be called, or None to wait for
+        # fileno.
+        self.due = None if interval is None else _monotonic() + interval
+
+
+class Typeahead(object):
+    """Input read but not yet given to Readline, taken a byte at a time.
+
+    Bytes are taken from a read offset rather than from the front of
+    the buffer, so taking one doesn't move the rest. The bytes already
+    taken are dropped when more input is added.
+    """
+    __slots__ = ('_data', '_offset')
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offset = 0
+
+    def __len__(self):
+        return len(self._data) - self._offset
+
+    def extend(self, data):
+        """Add data after the bytes not yet taken."""
+        if self._offset:
+            del self._data[:self._offset]
+            self._offset = 0
+        self._data.extend(data)
+
+    def pop(self):
+        """Take the next byte and return it as an int."""
+        byte = self._data[self._offset]
+        self._offset += 1
+        if self._offset == len(self._data):
+            self.clear()
+        return byte
+
+    def take(self):
+        """Take the bytes not yet taken and return them, as a
+        bytearray.
+        """
+        data = self._data[self._offset:]
+        self.clear()
+        return data
+
+    def clear(self):
+        """Discard everything."""
+        del self._data[:]
+        self._offset = 0
+
+
+EditorState = collections.namedtuple('EditorState', [
+    'line_buffer', 'point', 'end', 'mark', 'prompt', 'done',
+    'completion_type'])
+"""Editor state returned by Readline.snapshot.
+
+point, end and mark are offsets in the encoded line buffer.
+completion_type is an empty string outside completion.
+"""
 
 
 class Readline(object):
@@ -48,23 +350,73 @@ class Readline(object):
         self.history = History(self.lib)
         self.completion = Completion(self.lib)
 
-        self.startup_hook = None
-        """If not None, this function is called with no arguments just
-        before readline prints the first prompt.
-        """
-
-        self.pre_input_hook = None
-        """If not None, The function is called with no arguments after
-        the first prompt has been printed and just before readline
-        starts reading input characters.
-        """
-
         self.logger = logging.getLogger(__name__)
 
+        self._startup_hook = None
+        self._pre_input_hook = None
+        self._startup_hook_wrapper = typedefs.rl_hook_func_t(
+            self._on_startup_hook)
+        self._pre_input_hook_wrapper = typedefs.rl_hook_func_t(
+            self._on_pre_input_hook)
+        self._malloc = _line_allocator()
+
         self._completed_input_string = None
         self._input_complete = False
+        self._reading = False
+        self._rlhandler_wrapper = typedefs.rl_vcpfunc_t(self._rlhandler)
         self._functions = {}
         self._function_wrappers = {}
+        # Init file settings applied through pygnurl, see
+        # parse_and_bind_all.
+        self._applied = {}
+        self._parse_buffer = None
+        # Variables read by snapshot, resolved on first use.
+        self._state_variables = None
+        # history_offset and history_length, resolved on first use,
+        # and the lines recalled from the history while reading the
+        # current line, by offset, as they were when recalled.
+        self._history_variables = None
+        self._recalled = {}
+        # pylint: disable=no-member
+        self._os_input_hook = c_void_p.in_dll(pythonapi, 'PyOS_InputHook')
+        self._input_hooks = []
+        # The input stream's descriptor and its InputWaiter, created
+        # on first use after instream changes.
+        self._fileno = None
+        self._waiter = None
+        self._bracketed_paste = False
+        self._paste_wrapper = None
+        self._paste_variable = None
+        # Complete lines from the last paste still to be returned, and
+        # the incomplete line that follows them.
+        self._pasted_lines = collections.deque()
+        self._paste_tail = b''
+        # Input read but not yet processed, which Readline reads
+        # through _getc before anything else. _typeahead_available
+        # tells Readline about it.
+        self._typeahead = Typeahead()
+        self._getc_wrapper = typedefs.rl_getc_func_t(self._getc)
+        self._saved_getc = None
+        self._available_wrapper = typedefs.rl_hook_func_t(
+            self._typeahead_available)
+        self._saved_available = None
+        # Swapped for every line, so the variables are looked up on the
+        # first line and kept. The wrappers above keep the functions
+        # alive.
+        self._getc_variable = None
+        self._available_variable = None
+        self._getc_address = cast(self._getc_wrapper, c_void_p).value
+        self._available_address = cast(self._available_wrapper,
+                                       c_void_p).value
+        # Set while in headless mode, which replaces these functions
+        # with ones that do nothing.
+        self._headless = False
+        self._headless_functions = (
+            ('rl_prep_term_function',
+             typedefs.rl_vintfunc_t(lambda meta_flag: None)),
+            ('rl_deprep_term_function', typedefs.rl_voidfunc_t(lambda: None)),
+            ('rl_redisplay_function', typedefs.rl_voidfunc_t(lambda: None)),
+        )
 
         self._initreadline()
 
@@ -80,57 +432,126 @@ class Readline(object):
         self.logger.debug('readline version: 0x%x', version)
         return version
 
-    @property
-    def name(self):
-        """Unique name for the current application."""
-        return self.lib.get(c_char_p, 'rl_readline_name')
-
-    @name.setter
-    def name(self, name):
-        self.lib.set(c_char_p, 'rl_readline_name', name)
+    name = bindings.Variable(
+        c_char_p, 'rl_readline_name',
+        'Unique name for the current application.')
 
     @property
     def instream(self):
         """The stdio stream from which Readline reads input."""
-        return self.lib.get(c_void_p, 'rl_instream')
+        return self.lib.variable(c_void_p, 'rl_instream').value
 
     @instream.setter
-    def instream(self, instream):
-        self.lib.set(c_void_p, 'rl_instream', instream)
+    def instream(self, stream):
+        self.lib.set(c_void_p, 'rl_instream', stream)
+        self._set_private_stream('_rl_in_stream', stream)
+        self._fileno = None
+        if self._waiter is not None:
+            self._waiter.close()
+            self._waiter = None
 
     @property
     def outstream(self):
         """The stdio stream to which Readline performs output."""
-        return self.lib.get(c_void_p, 'rl_outstream')
+        return self.lib.variable(c_void_p, 'rl_outstream').value
 
     @outstream.setter
-    def outstream(self, outstream):
-        self.lib.set(c_void_p, 'rl_outstream', outstream)
+    def outstream(self, stream):
+        self.lib.set(c_void_p, 'rl_outstream', stream)
+        self._set_private_stream('_rl_out_stream', stream)
 
-    @property
-    def done(self):
-        """If True, Readline immediately returns the line."""
-        return self.lib.get(c_bool, 'rl_done')
+    def _set_private_stream(self, name, stream):
+        """Set Readline's private copy of a stream.
+
+        Readline only copies rl_instream and rl_outstream when a line
+        starts, so without this, output between lines (such as from
+        clear_visible_line) would go to the old stream, which may have
+        been closed.
+        """
+        try:
+            self.lib.set(c_void_p, name, stream)
+        except ValueError:
+            # Not exported by this build.
+            pass
 
-    @done.setter
-    def done(self, done):
-        self.lib.set(c_bool, 'rl_done', done)
+    done = bindings.Variable(
+        c_bool, 'rl_done',
+        'If True, Readline immediately returns the line.')
 
     @property
     def point(self):
-        """The offset of the cursor in line_buffer."""
-        return self.lib.get(c_int, 'rl_point')
+        """The offset of the cursor in line_buffer, in bytes."""
+        return self.lib.variable(c_int, 'rl_point').value
 
     @point.setter
     def point(self, point):
-        if point > len(self.line_buffer):
+        # Compare bytes with bytes; line_buffer is decoded.
+        if point > self.end:
             raise ValueError('point is not contained in line_buffer')
         self.lib.set(c_int, 'rl_point', point)
 
-    @property
-    def prompt(self):
-        """The prompt readline uses."""
-        return self.lib.get(c_char_p, 'rl_prompt')
+    end = bindings.Variable(
+        c_int, 'rl_end',
+        'The number of characters in line_buffer.', readonly=True)
+
+    mark = bindings.Variable(
+        c_int, 'rl_mark',
+        'The offset of the mark in line_buffer.')
+
+    prompt = bindings.Variable(
+        c_char_p, 'rl_prompt',
+        'The prompt readline uses.', readonly=True)
+
+    def snapshot(self):
+        """Return the current editor state as an EditorState."""
+        lib = self.lib
+        if self._state_variables is None:
+            self._state_variables = (
+                lib.variable(c_int, 'rl_point'),
+                lib.variable(c_int, 'rl_end'),
+                lib.variable(c_int, 'rl_mark'),
+                lib.variable(c_bool, 'rl_done'),
+                lib.variable(c_char, 'rl_completion_type'))
+        point, end, mark, done, completion_type = self._state_variables
+        completion_type = completion_type.value
+        return EditorState(
+            lib.get_string('rl_line_buffer') or '',
+            point.value,
+            end.value,
+            mark.value,
+            lib.get_string('rl_prompt') or '',
+            done.value,
+            strings.decode(completion_type).strip('\0'))
+
+    def apply(self, state):
+        """Write back the fields of state that differ from the editor.
+
+        state is an EditorState, usually a modified snapshot. The line
+        buffer, point, mark, done and prompt are written; end and
+        completion_type are determined by Readline and are ignored.
+        """
+        current = self.snapshot()
+        end = current.end
+        if state.line_buffer != current.line_buffer:
+            end = len(strings.encode(state.line_buffer))
+        for name in 'point', 'mark':
+            if not 0 <= getattr(state, name) <= end:
+                raise ValueError(
+                    '{} is not contained in line_buffer'.format(name))
+
+        if state.line_buffer != current.line_buffer:
+            with self.undo_group():
+                self.lib.rl_delete_text(0, current.end)
+                self.lib.set(c_int, 'rl_point', 0)
+                self.lib.rl_insert_text(strings.encode(state.line_buffer))
+        if state.point != current.point or end != current.end:
+            self.lib.set(c_int, 'rl_point', state.point)
+        if state.mark != current.mark or end != current.end:
+            self.lib.set(c_int, 'rl_mark', state.mark)
+        if state.done != current.done:
+            self.lib.set(c_bool, 'rl_done', state.done)
+        if state.prompt != current.prompt:
+            self.lib.rl_set_prompt(strings.encode(state.prompt))
 
     def _initreadline(self):
         """See readline.c: PyInit_readline."""
@@ -156,69 +577,292 @@ class Readline(object):
                 # We got an EOF; return an empty string
                 line = b''
             else:
-                if line:
-                    if not self.history or line != self.history[-1]:
-                        self.logger.debug('adding item to history: %s', line)
-                        self.history.append(strings.decode(line))
+                self._add_history(line)
                 line += b'\n'
             self.logger.debug('allocating copy of line: %s', line)
-            # line must be allocated with PyMem_Malloc
             size = len(line) + 1
-            pythonapi.PyMem_Malloc.restype = c_void_p
-            linecopy = pythonapi.PyMem_Malloc(size)
+            linecopy = self._malloc(size)
             memmove(linecopy, line, size)
             self.logger.debug('returning copy of line: %s', linecopy)
             return linecopy
 
+    def _add_history(self, line):
+        """Add a line that was read to the history, as readline.c does.
+
+        Empty lines and repeats of the last line are skipped.
+        """
+        if line and line != self.history.last_line():
+            self.logger.debug('adding item to history: %s', line)
+            self.history._add(line)  # pylint: disable=protected-access
+
     def _prep_terminal(self, stdin, stdout):
         """Prepare the terminal for input.
 
         This is only a separate function because I need to override
         this behaviour for Windows at the moment.
         """
+        if self._headless:
+            # Keep the streams set by headless.
+            return
         if (stdin, stdout) != (self.instream, self.outstream):
             self.instream = stdin
             self.outstream = stdout
             self.lib.rl_prep_terminal(1)
 
+    @property
+    def reading(self):
+        """True while Readline is reading a line of input."""
+        return self._reading
+
     def _readline_until_enter_or_signal(self, prompt):
         """See readline.c: readline_until_enter_or_signal."""
+        if self._pasted_lines:
+            return self._next_pasted_line(prompt)
+        paste_mode = self._begin_line(prompt)
+        try:
+            with DeferredInterrupt() as interrupt:
+                while not self._input_complete:
+                    self._wait_for_input()
+                    self._read_pending(interrupt)
+        except KeyboardInterrupt:
+            self._abort_line()
+            raise
+        finally:
+            self._end_line(paste_mode)
+        return self._completed_input_string
+
+    def _begin_line(self, prompt):
+        """Install the line handler and display the prompt.
+
+        Returns True if the terminal's bracketed paste mode was turned
+        on, which _end_line must be told.
+        """
         # Can't have any solution that allows readline to catch signals
         # because we have no way to catch the SIGINT it raises (or at
         # least I couldn't figure out how).
         self.lib.set(c_bool, 'rl_catch_signals', False)
-        rlhandler = typedefs.rl_vcpfunc_t(self._rlhandler)
-        self.lib.rl_callback_handler_install(prompt, rlhandler)
+        paste_mode = self._bracketed_paste and self._enable_paste_mode()
+        self._input_complete = False
+        self._completed_input_string = None
+        self._reading = True
+        if self._history_variables is None:
+            self._history_variables = (
+                self.lib.variable(c_int, 'history_offset'),
+                self.lib.variable(c_int, 'history_length'))
+        self._install_input_functions()
+        self.lib.rl_callback_handler_install(prompt, self._rlhandler_wrapper)
+        if self._fileno is None:
+            self._fileno = self._input_fileno()
+        if self._paste_tail:
+            self.lib.rl_insert_text(self._paste_tail)
+            self._paste_tail = b''
+            self.lib.rl_redisplay()
+        return paste_mode
+
+    def _abort_line(self):
+        """Abandon the line being read and restore the terminal."""
+        self.logger.debug('cleaning up after KeyboardInterrupt')
+        self._pasted_lines.clear()
+        self._paste_tail = b''
+        self.lib.rl_free_line_state()
+        self.lib.rl_cleanup_after_signal()
+        self.lib.rl_callback_handler_remove()
+
+    def _end_line(self, paste_mode):
+        """Finish reading a line started with _begin_line."""
+        self._reading = False
+        self._restore_input_functions()
+        if self._recalled:
+            # Readline keeps edits made to recalled lines.
+            # pylint: disable=protected-access
+            self.history._refresh(self._recalled)
+            self._recalled = {}
+        if paste_mode:
+            self._write_output(BRACKETED_PASTE_DISABLE)
+
+    def read_line(self, prompt=''):
+        """Read a line of input.
+
+        Returns the line without its trailing newline and adds it to
+        the history, like input(). Raises EOFError at the end of input.
+        """
+        with store_locale():
+            line = self._readline_until_enter_or_signal(
+                strings.encode(prompt))
+        if line is None:
+            raise EOFError
+        self._add_history(line)
+        return strings.decode(line)
+
+    @contextlib.contextmanager
+    def headless(self, input_fd, output_fd=None):
+        """Context manager for reading without a terminal.
+
+        Inside the context, read_line and input() read from input_fd
+        (a file descriptor or an object with a fileno method, such as a
+        pipe or file). The terminal isn't prepared and the line isn't
+        displayed; anything else Readline writes, such as completion
+        listings, goes to output_fd, or is discarded if it is None.
+        Key bindings, completion and history work as usual, so input
+        can be replayed through them at full speed.
+        """
+        instream, outstream = self._open_streams(input_fd, output_fd)
+        saved_streams = self.instream, self.outstream
+        saved_functions = [(name, self.lib.get(c_void_p, name))
+                           for name, _ in self._headless_functions]
+        self.logger.debug('entering headless mode')
+        self.instream, self.outstream = instream, outstream
+        for name, function in self._headless_functions:
+            self.lib.cbmanager.install(name, function)
+        self._headless = True
         try:
-            self._input_complete = False
-            while not self._input_complete:
-                while True:
-                    timeout = None
-                    # pylint: disable=no-member
-                    input_hook = c_void_p.in_dll(pythonapi, 'PyOS_InputHook')
-                    if input_hook:
-                        timeout = 0.1
-                    if self._select(timeout):
-                        break
-                    if input_hook:
-                        cast(input_hook, typedefs.PyOS_InputHook_t)()
-                # An unhandled KeyboardInterrupt in a ctypes callback
-                # function (this can call _rlhandler or _attempted_completion)
-                # is a bit of a disaster. To be safe, I'm disabling the
-                # handling of SIGINT for the duration of this function
-                # call. This should return relatively quickly (unless
-                # there are an absurd amount of completion options),
-                # and I'd rather miss a Ctrl-C than crash.
-                with ignore_sigint():
-                    self.logger.debug('reading single character')
-                    self.lib.rl_callback_read_char()
-        except KeyboardInterrupt:
-            self.logger.debug('cleaning up after KeyboardInterrupt')
-            self.lib.rl_free_line_state()
-            self.lib.rl_cleanup_after_signal()
-            self.lib.rl_callback_handler_remove()
+            yield self
+        finally:
+            self._headless = False
+            for name, value in saved_functions:
+                self.lib.set(c_void_p, name, value)
+            self.instream, self.outstream = saved_streams
+            self.lib.fclose(instream)
+            self.lib.fclose(outstream)
+            self.logger.debug('left headless mode')
+
+    def _open_streams(self, input_fd, output_fd):
+        """Return C streams on copies of input_fd and output_fd, which
+        is os.devnull if None, for headless.
+
+        OSError is raised if either can't be opened, after closing the
+        copies and any stream already opened.
+        """
+        if hasattr(input_fd, 'fileno'):
+            input_fd = input_fd.fileno()
+        if hasattr(output_fd, 'fileno'):
+            output_fd = output_fd.fileno()
+        input_fd = os.dup(input_fd)
+        instream = None
+        try:
+            if output_fd is None:
+                output_fd = os.open(os.devnull, os.O_WRONLY)
+            else:
+                output_fd = os.dup(output_fd)
+            try:
+                instream = self.lib.fdopen(input_fd, b'r')
+                if not instream:
+                    raise OSError('could not open a stream for input')
+                outstream = self.lib.fdopen(output_fd, b'w')
+                if not outstream:
+                    raise OSError('could not open a stream for output')
+            except Exception:
+                os.close(output_fd)
+                raise
+        except Exception:
+            # Closing the stream closes its descriptor.
+            if instream:
+                self.lib.fclose(instream)
+            else:
+                os.close(input_fd)
             raise
-        return self._completed_input_string
+        return instream, outstream
+
+    def read_line_async(self, prompt=''):
+        """Read a line without blocking the asyncio event loop.
+
+        Returns a future for the line, without its trailing newline,
+        which raises EOFError at the end of input. Input is read when
+        the event loop reports instream readable, so instream must be
+        a descriptor the loop can watch. Input hooks are run by the
+        event loop while the line is read. Only one line can be read at
+        a time. Cancelling the future abandons the line and restores
+        the terminal.
+        """
+        # Imported here so that importing pygnurl doesn't import
+        # asyncio.
+        from . import aio
+        return aio.read_line(self, prompt)
+
+    def _wait_for_input(self):
+        """Wait for input, running input hooks while waiting.
+
+        While there is no input, PyOS_InputHook is called every 0.1
+        seconds as readline.c does, whatever input hooks are added.
+        """
+        os_hook_due = None
+        while not self._typeahead:
+            timeout = None
+            if self._input_hooks:
+                timeout = self._run_input_hooks()
+            if self._os_input_hook.value:
+                now = _monotonic()
+                if os_hook_due is None:
+                    os_hook_due = now + OS_INPUT_HOOK_INTERVAL
+                elif os_hook_due <= now:
+                    self._call_os_input_hook()
+                    now = _monotonic()
+                    os_hook_due = now + OS_INPUT_HOOK_INTERVAL
+                remaining = max(0, os_hook_due - now)
+                timeout = remaining if timeout is None else \
+                    min(timeout, remaining)
+            if self._select(timeout):
+                break
+
+    def _run_input_hooks(self):
+        """Run the input hooks that are due.
+
+        Returns the time in seconds until the next hook is due, or None
+        if all are waiting for their file descriptors.
+        """
+        now = _monotonic()
+        timeout = None
+        for hook in list(self._input_hooks):
+            if hook.due is not None and hook.due <= now:
+                hook.due = None
+                try:
+                    delay = hook.callback()
+                except Exception:  # pylint: disable=broad-except
+                    self.logger.exception('exception in input hook')
+                    delay = None
+                now = _monotonic()
+                if isinstance(delay, (int, float)) and \
+                        not isinstance(delay, bool):
+                    hook.due = now + delay
+                elif hook.interval is not None:
+                    hook.due = now + hook.interval
+            if hook.due is not None:
+                remaining = max(0, hook.due - now)
+                timeout = remaining if timeout is None else \
+                    min(timeout, remaining)
+        return timeout
+
+    def _read_pending(self, interrupt):
+        """Let Readline process the input that has already arrived."""
+        # An unhandled KeyboardInterrupt in a ctypes callback function
+        # (this can call _rlhandler or _attempted_completion) is a bit
+        # of a disaster, so SIGINT is deferred until Readline returns.
+        # The limit keeps Ctrl-C responsive during very large pastes.
+        self.logger.debug('reading pending characters')
+        offset, length = self._history_variables
+        if not self._typeahead:
+            # One read takes everything that has arrived, which
+            # Readline then reads from the typeahead.
+            data = self._read_available()
+            if data is None:
+                return
+            self._push_typeahead(data)
+        interrupt.defer()
+        try:
+            for _ in range(MAX_READS_PER_WAKEUP):
+                self.lib.rl_callback_read_char()
+                # Readline is only away from the end of the history
+                # while a line is recalled, which may then be edited.
+                position = offset.value
+                if (position != length.value and
+                        position not in self._recalled):
+                    # pylint: disable=protected-access
+                    self._recalled[position] = \
+                        self.history._line_at(position)
+                if self._input_complete or not self._pending():
+                    break
+        finally:
+            interrupt.resume()
 
     def _rlhandler(self, text):
         """See readline.c: rlhandler."""
@@ -238,15 +882,274 @@ class Readline(object):
         :param timeout: time in seconds to wait
         :return: True on input, False on timeout
         """
-        fileno = self.lib.fileno(self.instream)
-        self.logger.debug('calling select with fileno: %d', fileno)
-        # Call select, retrying on EINTR.
+        waiter = self._input_waiter()
+        # Wait, retrying on EINTR (Python 3.5 and later retry already).
         while True:
             try:
-                return any(select.select([fileno], [], [], timeout))
-            except select.error as error:
+                ready = waiter.wait(timeout)
+                break
+            except (IOError, OSError, select.error) as error:
                 if error.args[0] != errno.EINTR:
                     raise
+        input_ready = False
+        for fileno in ready:
+            if fileno == self._fileno:
+                input_ready = True
+            for hook in self._input_hooks:
+                if hook.fileno == fileno:
+                    hook.due = _monotonic()
+        return input_ready
+
+    def _input_waiter(self):
+        """Return the InputWaiter for the input stream and input hooks,
+        creating it if need be.
+        """
+        if self._waiter is None:
+            self.logger.debug('waiting for input on fileno: %d',
+                              self._fileno)
+            self._waiter = InputWaiter(self._fileno)
+            for hook in self._input_hooks:
+                if hook.fileno is not None:
+                    self._waiter.add(hook.fileno)
+        return self._waiter
+
+    def add_input_hook(self, fd=None, interval=None, callback=None):
+        """Run callback while waiting for input.
+
+        The callback is called with no arguments whenever fd (a file
+        descriptor or an object with a fileno method) is readable, and
+        every interval seconds. At least one of them must be given. If
+        the callback returns a number, it is next called after that
+        many seconds instead, or sooner if fd becomes readable.
+
+        The default callback runs PyOS_InputHook, so an event loop that
+        installs one can be driven by its own descriptor as well as
+        polled every OS_INPUT_HOOK_INTERVAL seconds.
+
+        Returns a handle for remove_input_hook.
+        """
+        if fd is None and interval is None:
+            raise ValueError('an input hook needs fd or interval')
+        if hasattr(fd, 'fileno'):
+            fd = fd.fileno()
+        if callback is None:
+            callback = self._call_os_input_hook
+        hook = InputHook(callback, fd, interval)
+        self._input_hooks.append(hook)
+        if self._waiter is not None:
+            if fd is not None:
+                self._waiter.add(fd)
+            # A wait in progress on another thread doesn't know about
+            # the hook yet.
+            self._waiter.wake()
+        return hook
+
+    def remove_input_hook(self, hook):
+        """Remove an input hook added with add_input_hook."""
+        self._input_hooks.remove(hook)
+        if self._waiter is None:
+            return
+        fileno = hook.fileno
+        if (fileno is not None and fileno != self._fileno and
+                all(other.fileno != fileno for other in self._input_hooks)):
+            self._waiter.remove(fileno)
+        self._waiter.wake()
+
+    def _call_os_input_hook(self):
+        """Call PyOS_InputHook, if set."""
+        input_hook = self._os_input_hook.value
+        if input_hook:
+            cast(input_hook, typedefs.PyOS_InputHook_t)()
+
+    def _input_fileno(self):
+        """Return the file descriptor of the input stream."""
+        return self.lib.fileno(self.instream)
+
+    def _write_output(self, data):
+        """Write bytes directly to the output stream's descriptor."""
+        fileno = self.lib.fileno(self.outstream)
+        while data:
+            data = data[os.write(fileno, data):]
+
+    @property
+    def bracketed_paste(self):
+        """If True, pasted text is inserted all at once.
+
+        The terminal is asked to mark pasted text, which is then read
+        in bulk and inserted with a single redisplay. Pasted lines are
+        still returned one at a time, as if they had been typed. Off
+        by default, leaving Readline's enable-bracketed-paste alone.
+        """
+        return self._bracketed_paste
+
+    @bracketed_paste.setter
+    def bracketed_paste(self, enabled):
+        enabled = bool(enabled)
+        if enabled == self._bracketed_paste:
+            return
+        if enabled:
+            if self._paste_wrapper is None:
+                self._paste_wrapper = typedefs.rl_command_func_t(
+                    self._on_paste)
+            function = self._paste_wrapper
+            if self.version >= 0x0700:
+                # Readline's own support would send the terminal
+                # sequences too, and would insert every pasted line
+                # into one.
+                self._paste_variable = self.lib.rl_variable_value(
+                    b'enable-bracketed-paste')
+                self.lib.rl_variable_bind(b'enable-bracketed-paste', b'off')
+        else:
+            # Restore Readline's own binding, or unbind the sequence
+            # for versions without one.
+            function = getattr(self.lib.dll, 'rl_bracketed_paste_begin',
+                               None)
+            if self._paste_variable is not None:
+                self.lib.rl_variable_bind(b'enable-bracketed-paste',
+                                          self._paste_variable)
+                self._paste_variable = None
+        for name in PASTE_KEYMAPS:
+            keymap = self.lib.rl_get_keymap_by_name(name)
+            self.lib.rl_bind_keyseq_in_map(PASTE_START, function, keymap)
+        # The binding may have replaced one from parse_and_bind_all.
+        self._applied.clear()
+        self._bracketed_paste = enabled
+
+    def _enable_paste_mode(self):
+        """Turn on bracketed paste in the terminal, if there is one.
+
+        Returns True if it was turned on.
+        """
+        if os.environ.get('TERM') == 'dumb':
+            return False
+        if not os.isatty(self.lib.fileno(self.outstream)):
+            return False
+        self._write_output(BRACKETED_PASTE_ENABLE)
+        return True
+
+    def _on_paste(self, count, key):  # pylint: disable=unused-argument
+        """Insert a bracketed paste; bound to PASTE_START."""
+        try:
+            data = self._read_paste()
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('exception reading paste')
+            return -1
+        lines = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        lines = lines.split(b'\n')
+        self.logger.debug('pasting %d bytes in %d lines', len(data),
+                          len(lines))
+        self.lib.rl_insert_text(lines[0])
+        if len(lines) > 1:
+            # Accept the first line now and the rest on later calls.
+            self._pasted_lines.extend(lines[1:-1])
+            self._paste_tail = lines[-1]
+            self.lib.rl_redisplay()
+            self.lib.rl_newline(1, ord('\n'))
+        return 0
+
+    def _read_paste(self):
+        """Read the rest of a bracketed paste and return its text.
+
+        Anything read after PASTE_END is given back to Readline.
+        """
+        # The rest of the paste may have been read already.
+        data = self._take_typeahead()
+        start = 0
+        while True:
+            index = data.find(PASTE_END, start)
+            if index >= 0:
+                break
+            if not self._wait_for_paste():
+                self.logger.warning('end of paste not received')
+                return bytes(data)
+            chunk = os.read(self._fileno, READ_SIZE)
+            if not chunk:
+                return bytes(data)
+            # The marker may straddle the previous chunk.
+            start = max(0, len(data) - len(PASTE_END) + 1)
+            data.extend(chunk)
+        self._push_typeahead(data[index + len(PASTE_END):])
+        return bytes(data[:index])
+
+    def _wait_for_paste(self):
+        """Wait up to PASTE_TIMEOUT for more of a paste.
+
+        Input hooks whose descriptors become readable run afterwards.
+        """
+        deadline = _monotonic() + PASTE_TIMEOUT
+        while not self._select(max(0, deadline - _monotonic())):
+            if _monotonic() >= deadline:
+                return False
+        return True
+
+    def _push_typeahead(self, data):
+        """Arrange for Readline to read data before any new input."""
+        self._typeahead.extend(data)
+
+    def _take_typeahead(self):
+        """Remove the typeahead and return it, as a bytearray."""
+        return self._typeahead.take()
+
+    def _install_input_functions(self):
+        """Have Readline read the typeahead while reading a line."""
+        if self._getc_variable is None:
+            self._getc_variable = self.lib.variable(c_void_p,
+                                                    'rl_getc_function')
+            if self.version >= 0x0603:
+                self._available_variable = self.lib.variable(
+                    c_void_p, 'rl_input_available_hook')
+        self._saved_getc = self._getc_variable.value
+        self._getc_variable.value = self._getc_address
+        if self._available_variable is not None:
+            # Readline inserts typed text in one go, rather than
+            # redisplaying every character, while more is ready.
+            self._saved_available = self._available_variable.value
+            self._available_variable.value = self._available_address
+
+    def _restore_input_functions(self):
+        """Undo _install_input_functions."""
+        self._getc_variable.value = self._saved_getc
+        if self._available_variable is not None:
+            self._available_variable.value = self._saved_available
+
+    def _getc(self, stream):
+        """Used as rl_getc_function while reading a line."""
+        if not self._typeahead:
+            return cast(self._saved_getc, typedefs.rl_getc_func_t)(stream)
+        return self._typeahead.pop()
+
+    def _typeahead_available(self):
+        """Used as rl_input_available_hook while reading a line."""
+        return int(bool(self._typeahead))
+
+    def _next_pasted_line(self, prompt):
+        """Echo and return the next line of the last paste."""
+        line = self._pasted_lines.popleft()
+        # Strip the markers around invisible characters in the prompt.
+        prompt = prompt.replace(b'\x01', b'').replace(b'\x02', b'')
+        self._write_output(prompt + line + b'\n')
+        return line
+
+    def _pending(self):
+        """Return the number of bytes read but not yet processed."""
+        return len(self._typeahead)
+
+    def _read_available(self):
+        """Read the input that has arrived.
+
+        This is only called once the descriptor is readable, so the
+        read doesn't block, without the cost of making the descriptor
+        non-blocking for it. Returns None if there is no input after
+        all, or b'' at end of file, which leaves Readline to read the
+        stream and find the end itself.
+        """
+        try:
+            return os.read(self._fileno, READ_SIZE)
+        except (IOError, OSError) as error:
+            if error.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                     errno.EINTR):
+                raise
+            return None
 
     def _setup_readline(self):
         """See readline.c: setup_readline."""
@@ -258,10 +1161,9 @@ class Readline(object):
                                         self.lib.dll.emacs_meta_keymap)
             self.lib.rl_bind_key_in_map(b'\033', self.lib.dll.rl_complete,
                                         self.lib.dll.emacs_meta_keymap)
-            on_startup_hook = typedefs.rl_hook_func_t(self._on_startup_hook)
-            self.lib.cbmanager.install('rl_startup_hook', on_startup_hook)
-            on_preinput_hook = typedefs.rl_hook_func_t(self._on_pre_input_hook)
-            self.lib.cbmanager.install('rl_pre_input_hook', on_preinput_hook)
+            # The hooks are only installed once set.
+            self.lib.cbmanager.uninstall('rl_startup_hook')
+            self.lib.cbmanager.uninstall('rl_pre_input_hook')
             # FUTURE: move to completion's init
             # pylint: disable=protected-access
             attempted_completion = typedefs.rl_completion_func_t(
@@ -270,6 +1172,41 @@ class Readline(object):
                                        attempted_completion)
             self.lib.rl_initialize()
 
+    @property
+    def startup_hook(self):
+        """If not None, this function is called with no arguments just
+        before readline prints the first prompt.
+        """
+        return self._startup_hook
+
+    @startup_hook.setter
+    def startup_hook(self, function):
+        self._startup_hook = function
+        # Only installed when set, so lines read without a hook don't
+        # call back into Python for nothing.
+        if function is not None:
+            self.lib.cbmanager.install('rl_startup_hook',
+                                       self._startup_hook_wrapper)
+        else:
+            self.lib.cbmanager.uninstall('rl_startup_hook')
+
+    @property
+    def pre_input_hook(self):
+        """If not None, The function is called with no arguments after
+        the first prompt has been printed and just before readline
+        starts reading input characters.
+        """
+        return self._pre_input_hook
+
+    @pre_input_hook.setter
+    def pre_input_hook(self, function):
+        self._pre_input_hook = function
+        if function is not None:
+            self.lib.cbmanager.install('rl_pre_input_hook',
+                                       self._pre_input_hook_wrapper)
+        else:
+            self.lib.cbmanager.uninstall('rl_pre_input_hook')
+
     def _on_startup_hook(self):
         """See readline.c: on_startup_hook."""
         self.logger.debug('calling startup hook')
@@ -292,11 +1229,72 @@ class Readline(object):
 
     def parse_and_bind(self, string):
         """Parse and execute single line of a readline init file."""
-        # rl_parse_and_bind modifies its input
-        string = strings.encode(string)
         self.logger.debug('string to parse: %s', string)
-        cstring = create_string_buffer(string)
-        self.lib.rl_parse_and_bind(cstring)
+        self._parse_line(string)
+        key, _ = inputrc.setting_key(string.strip(), None)
+        if key is None:
+            self._applied.clear()
+        else:
+            self._applied[self._applied_key(key, None)] = string.strip()
+
+    def parse_and_bind_all(self, config):
+        """Parse and execute the lines of a readline init file.
+
+        config is a string or an iterable of lines. Comments, settings
+        overridden later in config and settings already applied by an
+        earlier call are skipped. The parsed config is cached; see
+        pygnurl.inputrc. Returns the number of lines executed.
+        """
+        compiled = inputrc.compile_cached(config, self.version)
+        keymap = None
+        executed = 0
+        for key, line in compiled:
+            if key is not None:
+                if key[0] == 'bind' and key[1] is None and keymap is None:
+                    keymap = self._keymap_name()
+                key = self._applied_key(key, keymap)
+                if self._applied.get(key) == line:
+                    continue
+            self._parse_line(line)
+            executed += 1
+            if key is None:
+                # This may have selected a different keymap.
+                keymap = None
+                if not line.lower().startswith('set'):
+                    # Conditional constructs and include directives
+                    # could change anything.
+                    self._applied.clear()
+            else:
+                self._applied[key] = line
+        self.logger.debug('executed %d of %d lines', executed, len(compiled))
+        return executed
+
+    def _parse_line(self, string):
+        """Pass a line to rl_parse_and_bind."""
+        string = strings.encode(string)
+        size = len(string) + 1
+        # rl_parse_and_bind modifies its input, so it needs a copy; reuse
+        # one buffer rather than allocating one for each line.
+        if self._parse_buffer is None or sizeof(self._parse_buffer) < size:
+            self._parse_buffer = create_string_buffer(max(size, 256))
+        memmove(self._parse_buffer, string, size)
+        self.lib.rl_parse_and_bind(self._parse_buffer)
+
+    def _applied_key(self, key, keymap):
+        """Return a setting key with the initial keymap filled in.
+
+        keymap is the name of the current keymap, or None to look it up.
+        """
+        if key[0] == 'bind' and key[1] is None:
+            if keymap is None:
+                keymap = self._keymap_name()
+            key = ('bind', keymap, key[2])
+        return key
+
+    def _keymap_name(self):
+        """Return the name of the current keymap."""
+        name = self.lib.rl_get_keymap_name(self.lib.rl_get_keymap())
+        return strings.decode(name)
 
     @property
     def line_buffer(self):
@@ -306,7 +1304,7 @@ class Readline(object):
     @line_buffer.setter
     def line_buffer(self, string):
         with self.undo_group():
-            self.delete_text(0, len(self.line_buffer))
+            self.delete_text(0, self.end)
             self.insert_text(string)
 
     @contextlib.contextmanager
@@ -327,7 +1325,7 @@ class Readline(object):
         text = strings.encode(text)
         self.logger.debug('inserting text: %s', text)
         # rl_insert_text fails silently if this is not the case.
-        assert self.point <= len(self.line_buffer)
+        assert self.point <= self.end
         self.lib.rl_insert_text(text)
 
     def delete_text(self, start, end):
@@ -356,6 +1354,7 @@ class Readline(object):
             # FUTURE: emulate PyUnicode_FSConverter?
             filename = strings.encode(filename)
         self.logger.debug('reading init file: %s', filename)
+        self._applied.clear()
         error = self.lib.rl_read_init_file(filename)
         if error:
             raise IOError(error)
@@ -372,6 +1371,20 @@ class Readline(object):
         """
         self.lib.rl_forced_update_display()
 
+    def clear_visible_line(self):
+        """Clear the prompt and line from the screen, leaving the
+        cursor at the start of where they were displayed.
+
+        Anything written next appears in their place; call
+        forced_update_display afterwards to display them again. Before
+        Readline 7.0, this moves to a new line instead.
+        """
+        if self.lib.features['rl_clear_visible_line']:
+            self.lib.rl_clear_visible_line()
+            self.lib.fflush(self.outstream)
+        else:
+            self._write_output(b'\n')
+
     def add_function(self, name, function):
         """Add or overwrite a bindable named function. The function
         can be referenced by name in an initialization file or in
@@ -424,6 +1437,25 @@ class WindowsReadline(Readline):
         # pylint: disable=protected-access
         self.lib.dll._rl_get_screen_size(0, 1)
 
+    def _input_fileno(self):
+        # Not needed by _select or _pending.
+        return None
+
+    def _pending(self):
+        import msvcrt  # pylint: disable=import-error
+        return len(self._typeahead) or msvcrt.kbhit()
+
+    def _read_available(self):
+        # Readline reads the console itself, see _pending.
+        return b''
+
+    def add_input_hook(self, fd=None, interval=None, callback=None):
+        # _select can only wait for the console.
+        if fd is not None:
+            raise ValueError('input hook descriptors are not supported')
+        return super(WindowsReadline, self).add_input_hook(
+            fd, interval, callback)
+
     def _select(self, timeout=None):
         # The Windows version of select only deals with sockets, so we
         # have to do this the hard way.
@@ -471,24 +1503,179 @@ class WindowsReadline(Readline):
             return super(WindowsReadline, self).read_init_file(filename)
 
 
+class LazyReadline(object):
+    """Proxy that defers constructing a Readline instance until use.
+
+    The instance is constructed as factory(dll) on the first attribute
+    access, or when Python first asks for a line of input, whichever
+    happens first. Until then, importing pygnurl costs nothing beyond
+    loading the library.
+    """
+    __slots__ = ('_dll', '_factory', '_readline', '_init_callbacks',
+                 '_cbmanager', 'logger')
+
+    def __init__(self, dll, factory=Readline):
+        object.__setattr__(self, '_dll', dll)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_readline', None)
+        object.__setattr__(self, '_init_callbacks', [])
+        object.__setattr__(self, '_cbmanager',
+                           callback_mananger.CallbackManager(pythonapi))
+        object.__setattr__(self, 'logger', logging.getLogger(__name__))
+
+        self.logger.debug('installing lazy readline function pointer')
+        call_readline = typedefs.PyOS_ReadlineFunctionPointer_t(
+            self._call_readline)
+        self._cbmanager.install('PyOS_ReadlineFunctionPointer',
+                                call_readline)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    @property
+    def initialized(self):
+        """Return True if the Readline instance has been constructed."""
+        return self._readline is not None
+
+    @property
+    def version(self):
+        """Return the version number of the library.
+
+        This does not construct the Readline instance.
+        """
+        return c_int.in_dll(self._dll, 'rl_readline_version').value
+
+    def resolve(self):
+        """Return the Readline instance, constructing it if required."""
+        if self._readline is None:
+            self.logger.debug('constructing deferred readline instance')
+            object.__setattr__(self, '_readline', self._factory(self._dll))
+            callbacks = self._init_callbacks[:]
+            del self._init_callbacks[:]
+            for callback in callbacks:
+                callback(self._readline)
+        return self._readline
+
+    def add_init_callback(self, callback):
+        """Call callback(readline) once the instance is constructed.
+
+        If it has already been constructed, callback is called
+        immediately.
+        """
+        if self._readline is None:
+            self._init_callbacks.append(callback)
+        else:
+            callback(self._readline)
+
+    def _call_readline(self, stdin, stdout, prompt):
+        """Construct the instance and hand the call over to it.
+
+        The instance replaces this function pointer when constructed,
+        so this is only ever called once.
+        """
+        try:
+            readline = self.resolve()
+        except Exception:  # pylint: disable=broad-except
+            self.logger.exception('exception constructing readline')
+            return None
+        # pylint: disable=protected-access
+        return readline._call_readline(stdin, stdout, prompt)
+
+
+def _history_path(filename):
+    """Return the path of the history file Readline uses for filename,
+    given as bytes or None.
+    """
+    if filename is None:
+        return os.path.join(os.path.expanduser(b'~'), b'.history')
+    return filename
+
+
+def _entry_time(timestamp):
+    """Return the time of the timestamp at address timestamp, or None.
+
+    Its first character is history_comment_char, which may be a null,
+    so the rest is read past it.
+    """
+    if not timestamp:
+        return None
+    text = string_at(timestamp + 1)
+    try:
+        return int(text)
+    except ValueError:
+        digits = re.match(br'\d+', text)
+        return int(digits.group()) if digits else None
+
+
+def _file_identity(path):
+    """Return what changes about the file at path when it's written."""
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime
+
+
 class History(object):
-    """Python interface to Readline history functions."""
+    """Python interface to Readline history functions.
+
+    The lines are read from Readline once and kept, decoded, so
+    indexing, iterating and slicing don't call into the library for
+    each line. Lines added afterwards are read as they are needed.
+    Changes made through this object, or by Readline while reading a
+    line, are noticed; call invalidate after replacing or removing
+    entries through lib directly. Once indexed is set, which the first
+    search does, a search.HistoryIndex of the lines is kept up to date
+    in the same way as lines are added, removed and loaded, as are the
+    _LinePositions for erase_duplicates and the _TimeIndex for between.
+    """
     def __init__(self, lib):
         self.lib = lib
 
         self.logger = logging.getLogger(__name__)
 
+        # Decoded lines, valid while (history_length, history_base)
+        # equals _lines_key.
+        self._lines = None
+        self._lines_key = None
+        # history_length and history_base, resolved on first use.
+        self._length = None
+        self._base = None
+        # Index of _lines while _indexed is set.
+        self._indexed = False
+        self._index = None
+        # Whether adding a line removes the earlier copy, and the
+        # _LinePositions of _lines that finds it.
+        self._erase_duplicates = False
+        self._positions = None
+        # _TimeIndex of the entries' timestamps, built by the first
+        # between.
+        self._times = None
+        # history_base + history_length when a file was last read or
+        # saved to, see unsaved_count.
+        self._saved_end = None
+        # The file last read, written or appended to, and the number
+        # of entries in it, as (path, _file_identity, entries), so
+        # truncate_file can tell when there's nothing to remove.
+        self._file_state = None
+
     def __len__(self):
         return self.lib.get(c_int, 'history_length')
 
     def __getitem__(self, item):
-        if item < 0:
-            item += len(self)
-        if not 0 <= item < len(self):
+        lines = self._lines
+        if lines is None or not self._is_cached():
+            lines = self._cached_lines()
+        try:
+            return lines[item]
+        except IndexError:
             raise IndexError('history index out of range')
-        entries = self.lib.history_list()
-        entry = entries[item]
-        return strings.decode(entry[0].line)
+
+    def __iter__(self):
+        return iter(self._cached_lines())
+
+    def __reversed__(self):
+        return reversed(self._cached_lines())
 
     def __setitem__(self, key, value):
         if key < 0:
@@ -497,27 +1684,194 @@ class History(object):
             raise IndexError('history index out of range')
         line = strings.encode(value)
         self.logger.debug('replacing history item: %s', line)
+        if self._lines is not None:
+            self._cached_lines()
         p_hist_entry = self.lib.replace_history_entry(key, line, None)
         self.lib.free_history_entry(p_hist_entry)
+        if self._lines is not None:
+            self._replace_cached(key, strings.decode(line))
 
     def __delitem__(self, key):
         if key < 0:
             key += len(self)
         if not 0 <= key < len(self):
             raise IndexError('history index out of range')
+        if self._lines is not None:
+            self._cached_lines()
+        if key < len(self) - self.unsaved_count:
+            self._saved_end -= 1
         p_hist_entry = self.lib.remove_history(key)
         self.lib.free_history_entry(p_hist_entry)
+        if self._lines is not None:
+            self._remove_cached(key)
+            self._lines_key = (len(self), self.base)
+
+    def to_list(self):
+        """Return a list of every line in the history."""
+        return list(self._cached_lines())
+
+    def invalidate(self):
+        """Forget the lines read so far, so they are read again."""
+        self._lines = None
+        self._index = None
+        self._positions = None
+        self._times = None
+
+    @property
+    def indexed(self):
+        """Whether the index used by search is kept up to date as lines
+        are added, removed and loaded.
+
+        Enabling this builds the index straight away rather than in the
+        first search, which enables it otherwise.
+        """
+        return self._indexed
+
+    @indexed.setter
+    def indexed(self, enabled):
+        """Set whether the index used by search is kept up to date."""
+        self._indexed = bool(enabled)
+        if enabled:
+            self._update_index()
+        else:
+            self._index = None
+
+    def search(self, query, limit=None, prefix=False):
+        """Return the lines containing query, or starting with it if
+        prefix is True, as (index, line) pairs from the newest.
+
+        Each distinct line is returned once, at its newest index. At
+        most limit pairs are returned if it isn't None.
+        """
+        if not self._indexed:
+            self.indexed = True
+        else:
+            self._cached_lines()
+        return list(itertools.islice(
+            self._index.search(strings.decode(strings.encode(query)),
+                               prefix), limit))
+
+    def get_time(self, index):
+        """Return the time the line at index was added, in seconds
+        since the epoch, or None if it has no timestamp.
+        """
+        return _entry_time(self._timestamp_field(index).value)
+
+    def set_time(self, index, when):
+        """Set the time the line at index was added, in seconds since
+        the epoch, or remove its timestamp if when is None.
+        """
+        field = self._timestamp_field(index)
+        if index < 0:
+            index += len(self)
+        if self._lines is not None:
+            self._cached_lines()
+        old = field.value
+        if when is None:
+            field.value = None
+        else:
+            comment_char = strings.encode(
+                self.lib.get(c_char, 'history_comment_char'))
+            field.value = self.lib.strdup(
+                comment_char + str(int(when)).encode())
+        if old:
+            self.lib.free(old)
+        if self._times is not None:
+            self._times.set(index, _entry_time(field.value))
+
+    def between(self, start, end=None):
+        """Return the lines added from time start up to, but not
+        including, time end, as (index, line) pairs from the oldest.
+
+        Times are in seconds since the epoch, and end defaults to no
+        limit. Lines without a timestamp are left out.
+        """
+        lines = self._cached_lines()
+        if self._times is None:
+            self._times = _TimeIndex(self._read_times(0, len(lines)))
+        return [(index, lines[index])
+                for index in self._times.between(start, end)]
+
+    def recent(self, seconds):
+        """Return the lines added in the last seconds, as between
+        does."""
+        return self.between(time.time() - seconds)
+
+    @property
+    def write_timestamps(self):
+        """Whether write_file and append_file write each line's
+        timestamp before it.
+        """
+        return bool(self.lib.get(c_int, 'history_write_timestamps'))
+
+    @write_timestamps.setter
+    def write_timestamps(self, enabled):
+        """Set whether timestamps are written to history files.
+
+        Timestamps are marked in the file with history_comment_char,
+        which must be set first ('#' in Bash); ValueError is raised if
+        it isn't. The timestamps already in the history are marked with
+        it too.
+        """
+        if enabled:
+            comment_char = self.lib.get(c_char, 'history_comment_char')
+            if comment_char == '\0':
+                raise ValueError('history_comment_char must be set to '
+                                 'write timestamps')
+            self._mark_timestamps(strings.encode(comment_char))
+        self.lib.set(c_int, 'history_write_timestamps', int(bool(enabled)))
+
+    def last_line(self):
+        """Return the most recent line as bytes, or None if the history
+        is empty.
+        """
+        entry = self.lib.history_get(self.base + len(self) - 1)
+        if not entry:
+            return None
+        return entry[0].line
 
     def append(self, line):
         """Add a line to the history buffer."""
         line = strings.encode(line)
         self.logger.debug('adding history: %s', line)
-        self.lib.add_history(line)
+        self._add(line)
+
+    @property
+    def unsaved_count(self):
+        """Return the number of lines added since a history file was
+        last read, or written or appended to.
+
+        These are the last lines; every line is counted if no file has
+        been used.
+        """
+        length = len(self)
+        if self._saved_end is None:
+            return length
+        return max(0, min(length, self.base + length - self._saved_end))
+
+    @property
+    def erase_duplicates(self):
+        """Whether adding a line removes any earlier copy of it.
+
+        Enabling this removes the copies already in the history, keeping
+        the newest of each line, as read_file does while it is enabled.
+        """
+        return self._erase_duplicates
+
+    @erase_duplicates.setter
+    def erase_duplicates(self, enabled):
+        """Set whether adding a line removes any earlier copy of it."""
+        self._erase_duplicates = bool(enabled)
+        if enabled:
+            self._remove_duplicates()
 
     def clear(self):
         """Clear the current history."""
         self.logger.debug('clearing history')
         self.lib.clear_history()
+        self.invalidate()
+        if self._indexed:
+            self._update_index()
 
     @property
     def base(self):
@@ -544,12 +1898,97 @@ class History(object):
             # FUTURE: emulate PyUnicode_FSConverter?
             filename = strings.encode(filename)
         self.logger.debug('reading history file: %s', filename)
+        empty, base = not len(self), self.base
         error = self.lib.read_history(filename)
+        if self._erase_duplicates:
+            self._remove_duplicates()
+        if self._indexed:
+            self._update_index()
         if error:
+            self._file_state = None
             raise IOError(error)
+        self._saved_end = self.base + len(self)
+        # The file holds the history only if nothing else was in it,
+        # and the oldest lines weren't dropped for stifle_history.
+        if empty and self.base == base:
+            self._record_file(_history_path(filename), len(self))
+        else:
+            self._file_state = None
+
+    def load_file(self, filename=None, ignore=(), max_lines=None,
+                  max_age=None, erase_duplicates=None):
+        """Load the lines of a readline history file that pass the
+        filters, reading it from the end a chunk at a time.
+
+        Lines matching any of the fnmatch patterns in ignore are
+        skipped, as are lines older than max_age seconds, if the file
+        has timestamps. If erase_duplicates is true, which by default
+        it is if the erase_duplicates property is, only the newest copy
+        of each line is kept. Only the newest max_lines lines are
+        loaded, and the rest of the file isn't read. Returns the number
+        of lines loaded.
+
+        The default filename is ~/.history.
+        """
+        if filename is not None:
+            filename = strings.encode(filename)
+        if erase_duplicates is None:
+            erase_duplicates = self._erase_duplicates
+        ignored = None
+        if ignore:
+            ignored = re.compile('|'.join(
+                fnmatch.translate(pattern) for pattern in ignore)).match
+        if self.lib.history_is_stifled():
+            # Any more would be dropped as they were added.
+            stifled = self.lib.get(c_int, 'history_max_entries')
+            max_lines = stifled if max_lines is None else min(max_lines,
+                                                              stifled)
+        cutoff = None if max_age is None else time.time() - max_age
+        self.logger.debug('loading history file: %s', filename)
+        entries = histfile.read_entries(
+            _history_path(filename),
+            strings.encode(self.lib.get(c_char, 'history_comment_char')),
+            self.lib.get(c_int, 'history_write_timestamps'))
+        # The entries to add, newest first, and whether they are the
+        # whole file.
+        kept = []
+        complete = True
+        seen = set()
+        decode = strings.decode
+        with contextlib.closing(entries):
+            for line, timestamp in entries:
+                if max_lines is not None and len(kept) >= max_lines:
+                    complete = False
+                    break
+                if ((ignored is not None and ignored(decode(line))) or
+                        (cutoff is not None and timestamp is not None and
+                         histfile.timestamp_seconds(timestamp) < cutoff) or
+                        (erase_duplicates and line in seen)):
+                    complete = False
+                    continue
+                if erase_duplicates:
+                    seen.add(line)
+                kept.append((line, timestamp))
+        empty, base = not len(self), self.base
+        add_history = self.lib.add_history
+        add_history_time = self.lib.add_history_time
+        for line, timestamp in reversed(kept):
+            add_history(line)
+            if timestamp is not None:
+                add_history_time(timestamp)
+        if erase_duplicates and not empty:
+            self._remove_duplicates()
+        if self._indexed:
+            self._update_index()
+        self._saved_end = self.base + len(self)
+        if complete and empty and self.base == base:
+            self._record_file(_history_path(filename), len(self))
+        else:
+            self._file_state = None
+        return len(kept)
 
     def write_file(self, filename=None):
-        """Save a readline history file.
+        """Save a readline history file, replacing its contents.
 
         The default filename is ~/.history.
         """
@@ -559,7 +1998,37 @@ class History(object):
         self.logger.debug('writing history file: %s', filename)
         error = self.lib.write_history(filename)
         if error:
+            self._file_state = None
+            raise IOError(error)
+        self._saved_end = self.base + len(self)
+        self._record_file(_history_path(filename), len(self))
+
+    def append_file(self, lines, filename=None):
+        """Append the last lines lines to a readline history file,
+        which must exist.
+
+        append_file(unsaved_count) saves just the lines added since a
+        file was last read or written, rather than the whole history.
+        The default filename is ~/.history.
+        """
+        if filename is not None:
+            # FUTURE: emulate PyUnicode_FSConverter?
+            filename = strings.encode(filename)
+        length = len(self)
+        lines = max(0, min(lines, length))
+        path = _history_path(filename)
+        saved = self._file_lines(path)
+        self.logger.debug('appending to history file: %s', filename)
+        error = self.lib.append_history(lines, filename)
+        if error:
+            self._file_state = None
             raise IOError(error)
+        self._saved_end = (self.base + length -
+                           max(0, self.unsaved_count - lines))
+        if saved is not None:
+            self._record_file(path, saved + lines)
+        else:
+            self._file_state = None
 
     def truncate_file(self, lines, filename=None):
         """Truncate the history file.
@@ -569,11 +2038,384 @@ class History(object):
         if filename is not None:
             # FUTURE: emulate PyUnicode_FSConverter?
             filename = strings.encode(filename)
+        path = _history_path(filename)
+        saved = self._file_lines(path)
+        if saved is not None and saved <= lines:
+            # There's nothing to remove, so don't read the file.
+            return
         self.logger.debug('truncating history file: %s', filename)
+        self._file_state = None
         error = self.lib.history_truncate_file(filename, lines)
         if error:
             raise IOError(error)
 
+    def _record_file(self, path, entries):
+        """Record that the file at path holds entries entries."""
+        try:
+            self._file_state = (path, _file_identity(path), entries)
+        except OSError:
+            self._file_state = None
+
+    def _file_lines(self, path):
+        """Return the number of entries in the file at path if it is
+        unchanged since it was recorded, or None."""
+        state = self._file_state
+        if state is None or state[0] != path:
+            return None
+        try:
+            if _file_identity(path) != state[1]:
+                return None
+        except OSError:
+            return None
+        return state[2]
+
+    def _add(self, line):
+        """Add a line, as bytes, removing its earlier copy if
+        erase_duplicates is enabled.
+        """
+        if self._erase_duplicates:
+            lines = self._cached_lines()
+            if self._positions is None:
+                self._positions = _LinePositions(lines)
+            position = self._positions.find(strings.decode(line))
+            if position is not None:
+                del self[position]
+        self.lib.add_history(line)
+
+    def _remove_duplicates(self):
+        """Remove every line that is repeated later in the history."""
+        if self._lines is not None:
+            # Bring the kept lines up to date while every entry exists.
+            self._cached_lines()
+        length = len(self)
+        entries = cast(self.lib.history_list(), POINTER(c_void_p))
+        line_at = c_char_p.from_address
+        saved = length - self.unsaved_count
+        seen = set()
+        kept = []
+        removed = []
+        # From the newest, so the newest copy of each line is kept.
+        for position, entry in zip(range(length - 1, -1, -1),
+                                   reversed(entries[:length])):
+            line = line_at(entry).value
+            if line in seen:
+                self.lib.free_history_entry(
+                    cast(entry, POINTER(typedefs.HIST_ENTRY)))
+                if position < saved:
+                    self._saved_end -= 1
+                removed.append(position)
+            else:
+                seen.add(line)
+                kept.append(entry)
+        if not removed:
+            return
+        self.logger.debug('removing %d duplicate history lines',
+                          len(removed))
+        # Remove them all as remove_history does one at a time, which
+        # would move the rest down once per line: move the rest down,
+        # keeping the list terminated, and shorten it.
+        offset = self.lib.where_history()
+        kept.reverse()
+        kept.append(None)
+        moved = (c_void_p * len(kept))(*kept)
+        memmove(entries, moved, sizeof(moved))
+        length = len(kept) - 1
+        self.lib.set(c_int, 'history_length', length)
+        # Unlike remove_history, keep history_offset on the same line,
+        # or the next kept one if its line was removed. A stifled
+        # history only limits the length, so a shorter one needs
+        # nothing more; history_max_entries and history_base stand.
+        offset -= sum(1 for position in removed if position < offset)
+        self.lib.history_set_pos(min(offset, length))
+        if self._lines is not None:
+            # From the newest, so the positions still to remove hold.
+            for position in removed:
+                self._remove_cached(position)
+            self._lines_key = (length, self.base)
+
+    def _refresh(self, recalled):
+        """Read the lines recalled while reading a line again.
+
+        recalled maps their positions to their lines, as bytes, when
+        they were recalled.
+        """
+        if self._lines is None:
+            return
+        lines = self._cached_lines()
+        entries = self.lib.history_list()
+        for position, original in recalled.items():
+            if not 0 <= position < len(lines):
+                continue
+            line = entries[position][0].line
+            if line != original:
+                # Readline replaced the entry.
+                self._replace_cached(position, strings.decode(line))
+
+    def _line_at(self, position):
+        """Return the line at position, as bytes."""
+        return self.lib.history_list()[position][0].line
+
+    def _remove_cached(self, position):
+        """Remove a kept line, which must be up to date."""
+        del self._lines[position]
+        for index in (self._index, self._positions, self._times):
+            if index is not None:
+                index.remove(position)
+
+    def _update_index(self):
+        """Bring the kept lines and the search index up to date."""
+        lines = self._cached_lines()
+        if self._index is None:
+            self._index = search.HistoryIndex(lines)
+
+    def _replace_cached(self, position, line):
+        """Replace a kept line, which must be up to date."""
+        self._lines[position] = line
+        if self._index is not None:
+            self._index.replace(position, line)
+        if self._positions is not None:
+            self._positions.replace(position, line)
+
+    def _is_cached(self):
+        """Return True if the kept lines match the history."""
+        return (self._lines is not None and
+                self._lines_key == (self._length.value, self._base.value))
+
+    def _cached_lines(self):
+        """Return the decoded lines, reading any that are new."""
+        if self._length is None:
+            self._length = self.lib.variable(c_int, 'history_length')
+            self._base = self.lib.variable(c_int, 'history_base')
+        length, base = self._length.value, self._base.value
+        lines = self._lines
+        if lines is not None and self._lines_key != (length, base):
+            # Adding a line grows the history or, once it is stifled,
+            # drops the oldest line and increments the base. Any other
+            # change must have gone through this object or invalidate.
+            old_length, old_base = self._lines_key
+            dropped = base - old_base
+            added = base + length - (old_base + old_length)
+            if 0 <= dropped <= old_length and added >= 0:
+                del lines[:dropped]
+                new_lines = self._read_lines(length - added, length)
+                lines.extend(new_lines)
+                for index in (self._index, self._positions):
+                    if index is not None:
+                        index.drop(dropped)
+                        index.extend(new_lines)
+                if self._times is not None:
+                    self._times.drop(dropped)
+                    self._times.extend(
+                        self._read_times(length - added, length))
+            else:
+                lines = None
+        if lines is None:
+            lines = self._lines = self._read_lines(0, length)
+            self._index = None
+            self._positions = None
+            self._times = None
+            if self._indexed:
+                self._index = search.HistoryIndex(lines)
+        self._lines_key = (length, base)
+        return lines
+
+    def _read_lines(self, start, stop):
+        """Read and decode the lines from start up to stop."""
+        if start >= stop:
+            return []
+        # Slicing copies the entry pointers in one go, and line is the
+        # first member of each entry, so no structure is built per line.
+        entries = cast(self.lib.history_list(), POINTER(c_void_p))
+        line_at = c_char_p.from_address
+        decode = strings.decode
+        return [decode(line_at(entry).value)
+                for entry in entries[start:stop]]
+
+    def _read_times(self, start, stop):
+        """Read the times of the entries from start up to stop."""
+        if start >= stop:
+            return []
+        entries = cast(self.lib.history_list(), POINTER(c_void_p))
+        offset = typedefs.HIST_ENTRY.timestamp.offset
+        pointer_at = c_void_p.from_address
+        return [_entry_time(pointer_at(entry + offset).value)
+                for entry in entries[start:stop]]
+
+    def _mark_timestamps(self, comment_char):
+        """Replace the null starting each timestamp with comment_char,
+        without which Readline doesn't write them.
+        """
+        entries = cast(self.lib.history_list(), POINTER(c_void_p))
+        offset = typedefs.HIST_ENTRY.timestamp.offset
+        pointer_at = c_void_p.from_address
+        for entry in entries[:len(self)]:
+            timestamp = pointer_at(entry + offset).value
+            if timestamp and _entry_time(timestamp) is not None:
+                if string_at(timestamp, 1) == b'\0':
+                    memmove(timestamp, comment_char, 1)
+
+    def _timestamp_field(self, index):
+        """Return the timestamp pointer of the entry at index."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('history index out of range')
+        entry = self.lib.history_get(self.base + index)
+        return c_void_p.from_address(addressof(entry.contents) +
+                                     typedefs.HIST_ENTRY.timestamp.offset)
+
+
+class _LinePositions(object):
+    """Finds the newest position of a line without scanning them.
+
+    Each line is given an ID, which increases with its position, and
+    each distinct line maps to the ID of its newest copy. The position
+    of an ID is found by bisecting the IDs, which are kept in order.
+    """
+    def __init__(self, lines=()):
+        # IDs by position, and the line of each ID.
+        self._ids = []
+        self._lines = {}
+        self._newest = {}
+        self._next_id = 0
+        self.extend(lines)
+
+    def find(self, line):
+        """Return the newest position of line, or None."""
+        ident = self._newest.get(line)
+        if ident is None:
+            return None
+        return bisect.bisect_left(self._ids, ident)
+
+    def extend(self, lines):
+        """Add lines after the last."""
+        for line in lines:
+            ident = self._next_id
+            self._next_id += 1
+            self._ids.append(ident)
+            self._lines[ident] = line
+            self._newest[line] = ident
+
+    def replace(self, position, line):
+        """Replace the line at position."""
+        ident = self._ids[position]
+        self._forget(ident)
+        self._lines[ident] = line
+        if self._newest.get(line, -1) < ident:
+            self._newest[line] = ident
+
+    def remove(self, position):
+        """Remove the line at position."""
+        self._forget(self._ids.pop(position))
+
+    def drop(self, count):
+        """Remove the oldest count lines."""
+        for ident in self._ids[:count]:
+            self._forget(ident)
+        del self._ids[:count]
+
+    def _forget(self, ident):
+        """Forget the line of ident.
+
+        An older copy of the line isn't found after this, so it is only
+        removed by erase_duplicates if the line is added again.
+        """
+        line = self._lines.pop(ident)
+        if self._newest.get(line) == ident:
+            del self._newest[line]
+
+
+class _TimeIndex(object):
+    """Finds the positions of the lines added in a span of time without
+    scanning them.
+
+    Each line is given an ID, which increases with its position, and
+    the (time, ID) pairs of the lines with timestamps are kept sorted.
+    Lines are usually added in time order, so the pairs mostly go on
+    the end.
+    """
+    def __init__(self, times=()):
+        # IDs by position, and the time of each ID.
+        self._ids = []
+        self._times = {}
+        self._order = []
+        # Whether the IDs in _order are in order too, as they are when
+        # no line was added before a newer one.
+        self._in_order = True
+        self._next_id = 0
+        self.extend(times)
+
+    def between(self, start, end=None):
+        """Return the positions, in order, of the lines with times from
+        start up to, but not including, end.
+        """
+        order = self._order
+        first = bisect.bisect_left(order, (start, -1))
+        last = (len(order) if end is None
+                else bisect.bisect_left(order, (end, -1)))
+        ids = self._ids
+        return sorted(bisect.bisect_left(ids, ident)
+                      for _, ident in order[first:last])
+
+    def extend(self, times):
+        """Add the times of lines after the last."""
+        for when in times:
+            ident = self._next_id
+            self._next_id += 1
+            self._ids.append(ident)
+            self._times[ident] = when
+            self._insert(when, ident)
+
+    def set(self, position, when):
+        """Change the time of the line at position."""
+        ident = self._ids[position]
+        self._discard(ident)
+        self._times[ident] = when
+        self._insert(when, ident)
+
+    def remove(self, position):
+        """Remove the line at position."""
+        ident = self._ids.pop(position)
+        self._discard(ident)
+        del self._times[ident]
+
+    def drop(self, count):
+        """Remove the oldest count lines."""
+        if not count:
+            return
+        order = self._order
+        for ident in self._ids[:count]:
+            del self._times[ident]
+        del self._ids[:count]
+        first = self._ids[0] if self._ids else self._next_id
+        if self._in_order:
+            # The dropped lines are first.
+            del order[:bisect.bisect_left(
+                [ident for _, ident in order[:count]], first)]
+        else:
+            order[:] = [pair for pair in order if pair[1] >= first]
+
+    def _insert(self, when, ident):
+        """Add the pair for a line, if it has a time."""
+        if when is None:
+            return
+        order = self._order
+        pair = (when, ident)
+        if not order or order[-1] <= pair:
+            if order and order[-1][1] > ident:
+                self._in_order = False
+            order.append(pair)
+        else:
+            self._in_order = False
+            bisect.insort(order, pair)
+
+    def _discard(self, ident):
+        """Remove the pair for a line, if it has one."""
+        when = self._times[ident]
+        if when is not None:
+            order = self._order
+            del order[bisect.bisect_left(order, (when, ident))]
+
 
 class Completion(object):
     """Python interface to Readline completion functions."""
@@ -592,74 +2434,42 @@ class Completion(object):
 
         self._display_matches_hook = None
 
-    @property
-    def append_character(self):
-        """Character to append to a single completion match."""
-        return self.lib.get(c_char, 'rl_completion_append_character')
-
-    @append_character.setter
-    def append_character(self, char):
-        self.lib.set(c_char, 'rl_completion_append_character', char)
-
-    @property
-    def suppress_append(self):
-        """If True, do not append append_character."""
-        return self.lib.get(c_bool, 'rl_completion_suppress_append')
-
-    @suppress_append.setter
-    def suppress_append(self, suppress):
-        self.lib.set(c_bool, 'rl_completion_suppress_append', suppress)
-
-    @property
-    def word_break_characters(self):
-        """Characters that signify a break between words."""
-        return self.lib.get(c_char_p, 'rl_completer_word_break_characters')
+    append_character = bindings.Variable(
+        c_char, 'rl_completion_append_character',
+        'Character to append to a single completion match.')
 
-    @word_break_characters.setter
-    def word_break_characters(self, chars):
-        self.lib.set(c_char_p, 'rl_completer_word_break_characters', chars)
+    suppress_append = bindings.Variable(
+        c_bool, 'rl_completion_suppress_append',
+        'If True, do not append append_character.')
 
-    @property
-    def basic_word_break_characters(self):
-        """Basic characters that signify a break between words."""
-        return self.lib.get(c_char_p, 'rl_basic_word_break_characters')
+    word_break_characters = bindings.Variable(
+        c_char_p, 'rl_completer_word_break_characters',
+        'Characters that signify a break between words.')
 
-    @property
-    def type(self):
-        """Type of completion being attempted."""
-        return self.lib.get(c_char, 'rl_completion_type')
+    basic_word_break_characters = bindings.Variable(
+        c_char_p, 'rl_basic_word_break_characters',
+        'Basic characters that signify a break between words.', readonly=True)
 
-    @property
-    def quote_characters(self):
-        """Characters used to quote a substring of the line."""
-        return self.lib.get(c_char_p, 'rl_completer_quote_characters')
+    type = bindings.Variable(
+        c_char, 'rl_completion_type',
+        'Type of completion being attempted.', readonly=True)
 
-    @quote_characters.setter
-    def quote_characters(self, chars):
-        self.lib.set(c_char_p, 'rl_completer_quote_characters', chars)
+    quote_characters = bindings.Variable(
+        c_char_p, 'rl_completer_quote_characters',
+        'Characters used to quote a substring of the line.')
 
-    @property
-    def basic_quote_characters(self):
-        """Basic characters used to quote a substring of the line."""
-        return self.lib.get(c_char_p, 'rl_basic_quote_characters')
+    basic_quote_characters = bindings.Variable(
+        c_char_p, 'rl_basic_quote_characters',
+        'Basic characters used to quote a substring of the line.',
+        readonly=True)
 
-    @property
-    def filename_quote_characters(self):
-        """Characters requiring a filename to be quoted."""
-        return self.lib.get(c_char_p, 'rl_filename_quote_characters')
-
-    @filename_quote_characters.setter
-    def filename_quote_characters(self, chars):
-        self.lib.set(c_char_p, 'rl_filename_quote_characters', chars)
-
-    @property
-    def filename_completion_desired(self):
-        """If True, the completions are treated as filenames."""
-        return self.lib.get(c_bool, 'rl_filename_completion_desired')
+    filename_quote_characters = bindings.Variable(
+        c_char_p, 'rl_filename_quote_characters',
+        'Characters requiring a filename to be quoted.')
 
-    @filename_completion_desired.setter
-    def filename_completion_desired(self, desired):
-        self.lib.set(c_bool, 'rl_filename_completion_desired', desired)
+    filename_completion_desired = bindings.Variable(
+        c_bool, 'rl_filename_completion_desired',
+        'If True, the completions are treated as filenames.')
 
     def filename_completions(self, text):
         """Return the possible filename completions."""
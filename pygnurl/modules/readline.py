@@ -9,8 +9,12 @@ _history_length = -1  # pylint: disable=invalid-name
 _completer = None  # pylint: disable=invalid-name
 _begidx = _endidx = 0  # pylint: disable=invalid-name
 
-pygnurl.readline.completion.word_break_characters = \
-    " \t\n`~!@#$%^&*()-=+[{]}\\|;:'\",<>/?"
+
+def _init_completer_delims(readline):
+    """Set the completer delimiters used by CPython's readline."""
+    readline.completion.word_break_characters = \
+        " \t\n`~!@#$%^&*()-=+[{]}\\|;:'\",<>/?"
+pygnurl.add_init_callback(_init_completer_delims)
 
 
 def parse_and_bind(string):
@@ -51,6 +55,15 @@ def write_history_file(filename=None):
         pygnurl.readline.history.truncate_file(_history_length, filename)
 
 
+def append_history_file(nelements, filename=None):
+    """Append the last nelements items of history to a file.
+    The default filename is ~/.history. The file must already exist.
+    """
+    pygnurl.readline.history.append_file(nelements, filename)
+    if _history_length >= 0:
+        pygnurl.readline.history.truncate_file(_history_length, filename)
+
+
 def clear_history():
     """Clear the current readline history."""
     pygnurl.readline.history.clear()
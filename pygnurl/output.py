@@ -0,0 +1,131 @@
+"""Writing output above the prompt.
+
+Output written while Readline is reading a line has to hide the prompt,
+write the output and redisplay the prompt and line. Doing that for
+every write makes bursts of output (such as a flood of log records)
+very slow, so PromptWriter buffers the output and writes it in batches,
+at most frame_rate times per second.
+"""
+import os
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not needed on Windows, see PromptWriter.
+    pass
+
+# Batches written per second while Readline is reading a line.
+DEFAULT_FRAME_RATE = 30
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class PromptWriter(object):
+    """Thread-safe writer of text above Readline's prompt.
+
+    Text written while Readline is reading a line is buffered and
+    written by an input hook on the reading thread; a pipe wakes it
+    when the first text of a batch arrives. Other text is written to
+    the stream straight away.
+    """
+    def __init__(self, readline, stream=None,
+                 frame_rate=DEFAULT_FRAME_RATE):
+        self.readline = readline
+        self.stream = stream if stream is not None else sys.stderr
+        self.frame_rate = frame_rate
+
+        self._lock = threading.Lock()
+        self._pending = []
+        # Set while the reading thread has been asked to write
+        # _pending; cleared once it has.
+        self._scheduled = False
+        self._last_frame = None
+        if sys.platform == 'win32':
+            # Input hooks can't wait for a pipe on Windows.
+            self._wakeup = None
+            self._hook = readline.add_input_hook(
+                interval=1.0 / frame_rate, callback=self._on_hook)
+        else:
+            self._wakeup = os.pipe()
+            for fileno in self._wakeup:
+                flags = fcntl.fcntl(fileno, fcntl.F_GETFL)
+                fcntl.fcntl(fileno, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            self._hook = readline.add_input_hook(
+                fd=self._wakeup[0], callback=self._on_hook)
+
+    def write(self, text):
+        """Write text, above the prompt if a line is being read."""
+        with self._lock:
+            if not self.readline.reading:
+                self._write(''.join(self._pending) + text)
+                del self._pending[:]
+                self._scheduled = False
+                return
+            self._pending.append(text)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        if self._wakeup is not None:
+            try:
+                os.write(self._wakeup[1], b'\0')
+            except OSError:
+                # The pipe is full, so a wakeup is already pending.
+                pass
+
+    def flush(self):
+        """Write any buffered text now.
+
+        This must be called from the thread reading the line, if any.
+        """
+        with self._lock:
+            text = ''.join(self._pending)
+            del self._pending[:]
+            self._scheduled = False
+        if not text:
+            return
+        if not self.readline.reading:
+            self._write(text)
+            return
+        if not text.endswith('\n'):
+            text += '\n'
+        self.readline.clear_visible_line()
+        self._write(text)
+        self.readline.forced_update_display()
+        self._last_frame = _monotonic()
+
+    def close(self):
+        """Write any buffered text and stop waiting for more."""
+        self.flush()
+        self.readline.remove_input_hook(self._hook)
+        if self._wakeup is not None:
+            for fileno in self._wakeup:
+                os.close(fileno)
+            self._wakeup = None
+
+    def _write(self, text):
+        """Write text to the stream."""
+        if text:
+            self.stream.write(text)
+            self.stream.flush()
+
+    def _on_hook(self):
+        """Write the buffered text if the next frame is due.
+
+        Returns the time until it is due otherwise, so the hook is
+        called again then.
+        """
+        if self._wakeup is not None:
+            try:
+                while os.read(self._wakeup[0], 4096):
+                    pass
+            except OSError:
+                pass
+        if self._last_frame is not None:
+            delay = self._last_frame + 1.0 / self.frame_rate - _monotonic()
+            if delay > 0 and self._scheduled:
+                return delay
+        self.flush()
+        return None
@@ -0,0 +1,291 @@
+"""Indexed history search.
+
+HistoryIndex finds the lines containing a string without scanning the
+history. The lines are grouped into blocks of BLOCK lines, and each
+n-gram (run of up to NGRAM characters) maps to the blocks containing
+it, as do the first characters of each line marked with START. A
+search then need only check the lines in the blocks that contain the
+query's rarest n-grams, and for a prefix search, that also have lines
+starting with the query's first characters.
+
+SubstringSearch provides commands that use History.search to recall
+lines, which can be bound to keys like Readline's own searches::
+
+    pygnurl.search.add_functions(pygnurl.readline)
+    pygnurl.readline.parse_and_bind(
+        r'"\\C-r": history-substring-search-backward')
+"""
+import array
+import bisect
+
+from . import strings
+
+NGRAM = 3
+BLOCK = 64
+
+# Marks the key of a line's first characters.
+START = '\0'
+
+# The most postings a block is looked up in before its lines are
+# checked.
+_MAX_FILTERS = 4
+
+# Removed lines are left in the postings until there are more of them
+# than this and the number of lines still indexed.
+_MIN_COMPACT = 1024
+
+
+def _add_keys(keys, lines):
+    """Add the keys lines are indexed under to keys."""
+    text = '\n'.join(lines)
+    # Single characters, and n-grams as tuples of characters; zip
+    # does the work in C, which is several times faster than slicing
+    # out each n-gram. The shorter n-grams are for shorter queries.
+    keys.update(text)
+    for size in range(2, NGRAM + 1):
+        keys.update(zip(*[text[i:] for i in range(size)]))
+    for line in lines:
+        keys.add(START + line[:NGRAM - 1])
+
+
+def _query_keys(query, prefix):
+    """Return the keys a line matching query must be indexed under."""
+    if len(query) == 1:
+        keys = set(query)
+    else:
+        size = min(len(query), NGRAM)
+        keys = set(zip(*[query[i:] for i in range(size)]))
+    if prefix and len(query) >= NGRAM - 1:
+        keys.add(START + query[:NGRAM - 1])
+    return keys
+
+
+class HistoryIndex(object):
+    """Index of lines, identified by their position, for searching.
+
+    Each line is given an ID, which increases with its position, and
+    belongs to block ID // BLOCK. Each key (an n-gram or a line start)
+    has a posting: an array of the blocks with lines containing it, in
+    order. Removing a line only forgets its ID; the postings are
+    rebuilt once more lines have been removed than are left.
+    """
+    def __init__(self, lines=()):
+        # IDs by position, so always sorted.
+        self._ids = []
+        self._lines = {}
+        self._postings = {}
+        # Keys whose postings may be out of order or contain
+        # duplicates, after a line was replaced.
+        self._unsorted = set()
+        self._next_id = 0
+        self._removed = 0
+        self.extend(lines)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def extend(self, lines):
+        """Add lines after the last."""
+        lines = list(lines)
+        start = 0
+        while start < len(lines):
+            # Fill up the last block.
+            first = self._next_id
+            block = first // BLOCK
+            stop = start + (block + 1) * BLOCK - first
+            added = lines[start:stop]
+            self._ids.extend(range(first, first + len(added)))
+            self._lines.update(zip(range(first, first + len(added)), added))
+            self._next_id += len(added)
+            keys = set()
+            _add_keys(keys, added)
+            self._post(keys, block)
+            start = stop
+
+    def replace(self, position, line):
+        """Replace the line at position."""
+        ident = self._ids[position]
+        self._lines[ident] = line
+        keys = set()
+        _add_keys(keys, [line])
+        self._post(keys, ident // BLOCK)
+
+    def remove(self, position):
+        """Remove the line at position."""
+        del self._lines[self._ids.pop(position)]
+        self._removed += 1
+        self._compact()
+
+    def drop(self, count):
+        """Remove the oldest count lines."""
+        for ident in self._ids[:count]:
+            del self._lines[ident]
+        del self._ids[:count]
+        self._removed += count
+        self._compact()
+
+    def search(self, query, prefix=False):
+        """Generate (position, line) for each line containing query, or
+        starting with it if prefix is True, from the newest.
+
+        Lines equal to one already generated are skipped. The index
+        mustn't change until the generator is finished with.
+        """
+        lines = self._lines
+        ids = self._ids
+        if not query:
+            idents = reversed(ids)
+        else:
+            blocks = self._candidates(_query_keys(query, prefix))
+            idents = (ident
+                      for block in blocks
+                      for ident in range(
+                          min((block + 1) * BLOCK, self._next_id) - 1,
+                          block * BLOCK - 1, -1))
+        found = set()
+        for ident in idents:
+            line = lines.get(ident)
+            if line is None or line in found:
+                continue
+            if line.startswith(query) if prefix else query in line:
+                found.add(line)
+                yield bisect.bisect_left(ids, ident), line
+
+    def _post(self, keys, block):
+        """Add block to the postings of keys."""
+        postings = self._postings
+        for key in keys:
+            posting = postings.get(key)
+            if posting is None:
+                postings[key] = array.array('l', [block])
+            elif posting[-1] != block:
+                if posting[-1] > block:
+                    self._unsorted.add(key)
+                posting.append(block)
+
+    def _candidates(self, keys):
+        """Generate the blocks, newest first, that may have lines
+        containing all of keys.
+
+        The blocks are those in the shortest posting that are also in
+        the next shortest ones; checking those takes far less time than
+        checking the lines of a block.
+        """
+        postings = []
+        for key in keys:
+            posting = self._postings.get(key)
+            if posting is None:
+                return
+            if key in self._unsorted:
+                posting = array.array('l', sorted(set(posting)))
+                self._postings[key] = posting
+                self._unsorted.discard(key)
+            postings.append(posting)
+        postings.sort(key=len)
+        others = postings[1:_MAX_FILTERS + 1]
+        for block in reversed(postings[0]):
+            for posting in others:
+                index = bisect.bisect_left(posting, block)
+                if index == len(posting) or posting[index] != block:
+                    break
+            else:
+                yield block
+
+    def _compact(self):
+        """Rebuild the postings if they are mostly removed lines."""
+        if self._removed < max(_MIN_COMPACT, len(self._ids)):
+            return
+        lines = self._lines
+        self._postings = {}
+        self._unsorted = set()
+        self._removed = 0
+        ids = self._ids
+        start = 0
+        while start < len(ids):
+            block = ids[start] // BLOCK
+            stop = bisect.bisect_left(ids, (block + 1) * BLOCK, start)
+            keys = set()
+            _add_keys(keys, [lines[ident] for ident in ids[start:stop]])
+            self._post(keys, block)
+            start = stop
+
+
+class SubstringSearch(object):
+    """Commands recalling the history lines containing the text before
+    the point.
+
+    backward replaces the line with the newest line containing the text
+    before the point, and again with the next older one each time it is
+    repeated; forward goes back towards the newest. Going forward from
+    the newest restores the line as it was before the search. Typing
+    anything else starts a new search.
+    """
+    def __init__(self, readline):
+        self.readline = readline
+
+        self._query = None
+        self._original = None
+        self._matches = []
+        # Index into _matches of the line shown, or -1 for _original.
+        self._current = -1
+        self._shown = None
+
+    def backward(self, count, key):  # pylint: disable=unused-argument
+        """Recall the next older match; bindable."""
+        return self._move(count)
+
+    def forward(self, count, key):  # pylint: disable=unused-argument
+        """Recall the next newer match; bindable."""
+        return self._move(-count)
+
+    def _move(self, count):
+        """Move count matches back, or forward if count is negative.
+
+        Rings the bell if there are no more.
+        """
+        readline = self.readline
+        line = readline.line_buffer
+        if line != self._shown:
+            # The point is a byte offset.
+            self._query = strings.decode(
+                strings.encode(line)[:readline.point])
+            self._original = line
+            self._matches = []
+            self._current = -1
+        target = self._current + count
+        if target >= len(self._matches):
+            self._matches = readline.history.search(self._query,
+                                                    limit=target + 1)
+        if target < -1 or target >= len(self._matches):
+            readline.lib.rl_ding()
+            return 0
+        self._current = target
+        if target == -1:
+            self._show(self._original, len(strings.encode(self._query)))
+        else:
+            self._show(self._matches[target][1])
+        return 0
+
+    def _show(self, line, point=None):
+        """Replace the line buffer with line."""
+        readline = self.readline
+        readline.line_buffer = line
+        readline.point = readline.end if point is None else point
+        self._shown = readline.line_buffer
+
+
+def add_functions(readline):
+    """Add history-substring-search-backward and
+    history-substring-search-forward to readline.
+
+    The history's search index is built now and kept up to date, so
+    the first search doesn't have to build it. Returns the
+    SubstringSearch providing them.
+    """
+    readline.history.indexed = True
+    search = SubstringSearch(readline)
+    readline.add_function('history-substring-search-backward',
+                          search.backward)
+    readline.add_function('history-substring-search-forward',
+                          search.forward)
+    return search
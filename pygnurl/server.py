@@ -0,0 +1,375 @@
+"""Console server giving each connection its own pygnurl session.
+
+Readline keeps global state, so a process can only edit one line at a
+time. ConsoleServer listens on a Unix socket and hands each connection
+to a worker process forked in advance, which runs the session on a pty
+of its own with its own copy of pygnurl.readline. A worker serves a
+single session and then exits; the pool is topped up as soon as a
+worker is handed a connection, so connecting never waits for a fork
+or for Readline to be set up.
+
+Since workers are forked, a session sees the server process as it was
+when its worker was forked, not as it is now.
+
+Run ``python -m pygnurl.server PATH`` to serve an interactive
+interpreter, and ``python -m pygnurl.server --connect PATH`` (or any
+raw terminal client, such as socat) to use it. Only the user running
+the server may connect: the socket is created with mode 0600 and, where
+the platform reports it, the peer's user ID is checked. Unix only;
+passing connections to workers needs Python 3.3 or later.
+"""
+from __future__ import print_function
+
+import argparse
+import array
+import code
+import errno
+import io
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+import pygnurl
+
+try:
+    import fcntl
+    import struct
+    import termios
+    import tty
+except ImportError:
+    # Not available on Windows, which isn't supported.
+    pass
+
+DEFAULT_WORKERS = 2
+
+# Window size of each session's pty, as (rows, columns).
+WINDOW_SIZE = (24, 80)
+
+_BUFFER_SIZE = 65536
+
+
+def interact():
+    """Run an interactive interpreter; the default session target."""
+    code.interact(banner='', local={'__name__': '__console__'})
+
+
+class ConsoleServer(object):
+    """Serves sessions on a Unix socket from a pool of workers.
+
+    target is called with no arguments to run each session, with
+    standard input and output on the session's pty; the session ends
+    when it returns. workers is the number of idle workers kept ready.
+    Connections from other users are refused.
+    """
+    def __init__(self, path, target=interact, workers=DEFAULT_WORKERS):
+        self.path = path
+        self.target = target
+        self.workers = workers
+        self.logger = logging.getLogger(__name__)
+
+        self._listener = None
+        self._idle = []
+        # Process IDs of workers running a session.
+        self._busy = set()
+        self._closed = False
+
+    def start(self):
+        """Listen on path and fork the initial workers."""
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        # Whatever the umask; nobody can connect until listen.
+        os.chmod(self.path, 0o600)
+        listener.listen(socket.SOMAXCONN)
+        self._listener = listener
+        self.logger.debug('listening on %s', self.path)
+        self._fill_pool()
+
+    def serve_forever(self, poll_interval=0.5):
+        """Serve connections until close is called."""
+        if self._listener is None:
+            self.start()
+        while not self._closed:
+            try:
+                readable, _, _ = select.select([self._listener], [], [],
+                                               poll_interval)
+            except (OSError, select.error) as error:
+                if error.args[0] == errno.EINTR:
+                    continue
+                if self._closed:
+                    break
+                raise
+            self._reap()
+            if readable and not self._closed:
+                self.handle_connection()
+
+    def handle_connection(self):
+        """Accept a connection and hand it to an idle worker."""
+        conn, _ = self._listener.accept()
+        try:
+            uid = _peer_uid(conn)
+            if uid is not None and uid != os.geteuid():
+                self.logger.warning('refused connection from user %d', uid)
+                return
+            worker = self._send(conn)
+        finally:
+            conn.close()
+        self._busy.add(worker.pid)
+        self.logger.debug('session started in worker %d', worker.pid)
+        self._fill_pool()
+
+    def close(self):
+        """Stop listening and stop the idle workers.
+
+        Sessions already running are left to finish.
+        """
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        for worker in self._idle:
+            worker.close()
+            _wait(worker.pid)
+        del self._idle[:]
+
+    def _send(self, conn):
+        """Send conn to an idle worker, forking one if required, and
+        return the worker.
+        """
+        while self._idle:
+            worker = self._idle.pop(0)
+            try:
+                worker.send(conn)
+            except (IOError, OSError):
+                # It died while idle.
+                self.logger.warning('worker %d is gone', worker.pid)
+                worker.close()
+                continue
+            return worker
+        worker = self._fork()
+        worker.send(conn)
+        return worker
+
+    def _fill_pool(self):
+        """Fork workers until there are enough idle ones."""
+        while len(self._idle) < self.workers:
+            self._idle.append(self._fork())
+
+    def _fork(self):
+        """Fork a worker and return it."""
+        parent, child = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            status = 1
+            try:
+                parent.close()
+                self._listener.close()
+                # Other workers must see EOF when the server closes
+                # their control sockets.
+                for worker in self._idle:
+                    worker.control.close()
+                status = _worker_main(child, self.target)
+            except BaseException:  # pylint: disable=broad-except
+                traceback.print_exc()
+            finally:
+                os._exit(status)  # pylint: disable=protected-access
+        child.close()
+        self.logger.debug('forked worker %d', pid)
+        return _Worker(pid, parent)
+
+    def _reap(self):
+        """Collect workers whose sessions have ended."""
+        for pid in list(self._busy):
+            if _wait(pid, os.WNOHANG):
+                self.logger.debug('worker %d finished', pid)
+                self._busy.discard(pid)
+
+
+class _Worker(object):  # pylint: disable=too-few-public-methods
+    """The server's handle on a worker process."""
+    def __init__(self, pid, control):
+        self.pid = pid
+        self.control = control
+
+    def send(self, conn):
+        """Hand conn to the worker."""
+        fds = array.array('i', [conn.fileno()])
+        self.control.sendmsg(
+            [b'\0'], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        self.close()
+
+    def close(self):
+        """Close the control socket, stopping the worker if idle."""
+        self.control.close()
+
+
+def _peer_uid(conn):
+    """Return the user ID of the process connected to conn, or None if
+    the platform doesn't say.
+    """
+    option = getattr(socket, 'SO_PEERCRED', None)
+    if option is None:
+        return None
+    # struct ucred: pid, uid, gid.
+    size = struct.calcsize('3i')
+    _, uid, _ = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET,
+                                                    option, size))
+    return uid
+
+
+def _wait(pid, options=0):
+    """Reap pid, returning True if it has exited."""
+    try:
+        reaped, _ = os.waitpid(pid, options)
+    except OSError as error:
+        if error.errno != errno.ECHILD:
+            raise
+        return True
+    return reaped == pid
+
+
+def _worker_main(control, target):  # pragma: no cover
+    """Wait for a connection, then run a session for it.
+
+    Returns the exit status of the worker.
+    """
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    # Finish any deferred setup now rather than when the client is
+    # waiting for a prompt.
+    if hasattr(pygnurl.readline, 'resolve'):
+        pygnurl.readline.resolve()
+
+    fds = array.array('i')
+    msg, ancdata, _, _ = control.recvmsg(
+        1, socket.CMSG_LEN(fds.itemsize))
+    control.close()
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:fds.itemsize])
+    if not msg or not fds:
+        # The server closed while we were idle.
+        return 0
+    return _run_session(fds[0], target)
+
+
+def _run_session(conn_fd, target):  # pragma: no cover
+    """Run target on a new pty relayed to conn_fd."""
+    master, slave = os.openpty()
+    os.setsid()
+    # Make the pty the controlling terminal so Ctrl-C sends SIGINT.
+    fcntl.ioctl(slave, termios.TIOCSCTTY, 0)
+    fcntl.ioctl(slave, termios.TIOCSWINSZ,
+                struct.pack('HHHH', WINDOW_SIZE[0], WINDOW_SIZE[1], 0, 0))
+    for fileno in range(3):
+        os.dup2(slave, fileno)
+    os.close(slave)
+    # The server may have replaced these, for example to log output.
+    sys.stdin = io.open(0, 'r', closefd=False)
+    sys.stdout = io.open(1, 'w', buffering=1, closefd=False)
+    sys.stderr = io.open(2, 'w', buffering=1, closefd=False)
+    # Readline was set up with the server's terminal, if any.
+    pygnurl.readline.lib.rl_resize_terminal()
+
+    def relay_session():
+        _relay({conn_fd: master, master: conn_fd})
+        # If the client went away, this hangs up the session.
+        os.close(master)
+
+    relay = threading.Thread(target=relay_session)
+    relay.daemon = True
+    relay.start()
+    status = 0
+    try:
+        target()
+    except SystemExit as error:
+        status = error.code if isinstance(error.code, int) else 0
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Hang up, so the relay sees the end of the pty's output.
+        for fileno in range(3):
+            os.close(fileno)
+        relay.join()
+    return status
+
+
+def _relay(routes):
+    """Copy data from each descriptor in routes to the one it maps to,
+    until one of them reaches the end of its data.
+    """
+    sources = list(routes)
+    while True:
+        try:
+            readable, _, _ = select.select(sources, [], [])
+        except (OSError, select.error) as error:
+            if error.args[0] == errno.EINTR:
+                continue
+            raise
+        for source in readable:
+            try:
+                data = os.read(source, _BUFFER_SIZE)
+            except OSError as error:
+                # A pty's master reports EIO once the slave is closed.
+                if error.errno != errno.EIO:
+                    raise
+                data = b''
+            if not data:
+                return
+            while data:
+                data = data[os.write(routes[source], data):]
+
+
+def connect(path):
+    """Connect the terminal to the server listening on path."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    stdin, stdout = sys.stdin.fileno(), sys.stdout.fileno()
+    saved = termios.tcgetattr(stdin) if os.isatty(stdin) else None
+    try:
+        if saved is not None:
+            tty.setraw(stdin)
+        _relay({stdin: sock.fileno(), sock.fileno(): stdout})
+    finally:
+        if saved is not None:
+            termios.tcsetattr(stdin, termios.TCSAFLUSH, saved)
+        sock.close()
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(prog='python -m pygnurl.server')
+    parser.add_argument('path', help='Unix socket to listen on')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='idle workers to keep ready '
+                             '(default: %(default)s)')
+    parser.add_argument('--connect', action='store_true',
+                        help='connect to a server instead of running one')
+    args = parser.parse_args(argv)
+    if args.connect:
+        connect(args.path)
+        return 0
+    server = ConsoleServer(args.path, workers=args.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
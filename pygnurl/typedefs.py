@@ -36,6 +36,15 @@ rl_vcpfunc_t = CFUNCTYPE(None, c_void_p)
 # typedef int rl_command_func_t PARAMS((int, int));
 rl_command_func_t = CFUNCTYPE(c_int, c_int, c_int)
 
+# typedef int rl_getc_func_t PARAMS((FILE *));
+rl_getc_func_t = CFUNCTYPE(c_int, c_void_p)
+
+# typedef void rl_voidfunc_t PARAMS((void));
+rl_voidfunc_t = CFUNCTYPE(None)
+
+# typedef void rl_vintfunc_t PARAMS((int));
+rl_vintfunc_t = CFUNCTYPE(None, c_int)
+
 
 class HIST_ENTRY(Structure):  # pylint: disable=too-few-public-methods
     """The structure used to store a history entry.
@@ -1,5 +1,4 @@
 """Tests for the bindable functions example."""
-import ctypes
 import unittest
 
 import pygnurl
@@ -32,7 +31,9 @@ class TestFunctions(unittest.TestCase):
         def test1(): pass
 
         pygnurl.examples.functions.test1 = test1
-        pygnurl.readline.lib.set(ctypes.c_char_p, 'rl_prompt', '>>> ')
+        # Readline frees the old prompt, so it must not be set directly.
+        pygnurl.readline.apply(
+            pygnurl.readline.snapshot()._replace(prompt='>>> '))
 
         pygnurl.readline.line_buffer = 'a = test((test1(asdf'
         pygnurl.readline.point = 1
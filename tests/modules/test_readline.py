@@ -71,6 +71,19 @@ class TestReadline(unittest.TestCase):
         readline.set_history_length(1)
         readline.write_history_file(self.history_file_name)
 
+    def test_append_history_file(self):
+        readline.clear_history()
+        readline.add_history('test1')
+        readline.add_history('test2')
+        readline.append_history_file(1, self.history_file_name)
+        readline.clear_history()
+        readline.read_history_file(self.history_file_name)
+        self.assertEqual(readline.get_current_history_length(), 1)
+        self.assertEqual(readline.get_history_item(1), 'test2')
+
+        with self.assertRaises(IOError):
+            readline.append_history_file(1, '/dev/null/nothing')
+
     def test_clear_history(self):
         readline.clear_history()
 
@@ -0,0 +1,155 @@
+"""Tests for pygnurl.aio"""
+from ctypes import *  # pylint: disable=wildcard-import,unused-wildcard-import
+import io
+import os
+import sys
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+import pygnurl.interface
+import pygnurl.output
+
+LIB_PATH = os.environ['PYGNURL_LIB']
+
+# pylint: disable=missing-docstring,protected-access
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+@unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+class TestReadLineAsync(unittest.TestCase):
+    def setUp(self):
+        dll = cdll.LoadLibrary(LIB_PATH)
+        self.readline = pygnurl.interface.Readline(dll)
+        self.streams = self.readline.instream, self.readline.outstream
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.libc = CDLL(None)
+        self.libc.fdopen.argtypes = [c_int, c_char_p]
+        self.libc.fdopen.restype = c_void_p
+        self.libc.fclose.argtypes = [c_void_p]
+        read_fd, self.write_fd = os.pipe()
+        null_fd = os.open(os.devnull, os.O_WRONLY)
+        self.readline.instream = self.libc.fdopen(read_fd, b'r')
+        self.readline.outstream = self.libc.fdopen(null_fd, b'w')
+
+    def tearDown(self):
+        instream, outstream = self.readline.instream, self.readline.outstream
+        self.readline.instream, self.readline.outstream = self.streams
+        os.close(self.write_fd)
+        self.libc.fclose(instream)
+        self.libc.fclose(outstream)
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def _read_line(self):
+        future = self.readline.read_line_async('>>> ')
+        return self.loop.run_until_complete(
+            asyncio.wait_for(future, 5))
+
+    def test_read_line(self):
+        os.write(self.write_fd, b'abc\n')
+        self.assertEqual(self._read_line(), 'abc')
+        self.assertEqual(self.readline.history[-1], 'abc')
+
+    def test_delayed_input(self):
+        self.loop.call_later(0.05, os.write, self.write_fd, b'ab')
+        self.loop.call_later(0.1, os.write, self.write_fd, b'c\n')
+        self.assertEqual(self._read_line(), 'abc')
+
+    def test_eof(self):
+        os.close(self.write_fd)
+        self.write_fd = os.open(os.devnull, os.O_WRONLY)
+        with self.assertRaises(EOFError):
+            self._read_line()
+
+    def test_cancel(self):
+        os.write(self.write_fd, b'abandoned')
+        future = self.readline.read_line_async()
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        future.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        os.write(self.write_fd, b'\nnext\n')
+        self.assertEqual(self._read_line(), '')
+        self.assertEqual(self._read_line(), 'next')
+
+    def test_error(self):
+        os.write(self.write_fd, b'abc\n')
+        with mock.patch.object(self.readline, '_read_pending',
+                               side_effect=ValueError('test')):
+            with self.assertRaises(ValueError):
+                self._read_line()
+        self.assertEqual(self._read_line(), 'abc')
+
+    def test_interrupt(self):
+        os.write(self.write_fd, b'abc\n')
+        with mock.patch.object(self.readline, '_read_pending',
+                               side_effect=KeyboardInterrupt):
+            future = self.readline.read_line_async()
+            self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self._read_line(), 'abc')
+
+    def test_one_at_a_time(self):
+        future = self.readline.read_line_async()
+        try:
+            with self.assertRaises(RuntimeError):
+                self.readline.read_line_async()
+        finally:
+            future.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+
+    def test_input_hooks(self):
+        read_fd, write_fd = os.pipe()
+        interval = mock.Mock(return_value=None)
+        readable = mock.Mock(side_effect=lambda: os.read(read_fd, 10))
+        hooks = [self.readline.add_input_hook(interval=0.01,
+                                              callback=interval),
+                 self.readline.add_input_hook(fd=read_fd,
+                                              callback=readable)]
+        try:
+            self.loop.call_later(0.05, os.write, write_fd, b'x')
+            self.loop.call_later(0.1, os.write, self.write_fd, b'abc\n')
+            self.assertEqual(self._read_line(), 'abc')
+            self.assertGreater(interval.call_count, 1)
+            readable.assert_called_once_with()
+            self.assertFalse(self.loop.remove_reader(read_fd))
+        finally:
+            for hook in hooks:
+                self.readline.remove_input_hook(hook)
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_prompt_writer(self):
+        # The writer is created and written to while the line is read,
+        # and its output is shown before Enter is pressed.
+        stream = io.StringIO()
+        writers = []
+        shown = []
+
+        def log():
+            writers.append(pygnurl.output.PromptWriter(self.readline,
+                                                       stream))
+            writers[0].write(u'record\n')
+
+        def enter():
+            shown.append(stream.getvalue())
+            os.write(self.write_fd, b'abc\n')
+
+        self.loop.call_later(0.05, log)
+        self.loop.call_later(0.2, enter)
+        try:
+            self.assertEqual(self._read_line(), 'abc')
+        finally:
+            for writer in writers:
+                writer.close()
+        self.assertEqual(shown, [u'record\n'])
@@ -0,0 +1,81 @@
+"""Tests for the shared benchmark helpers."""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from benchmarks import common
+
+# pylint: disable=missing-docstring
+
+
+class TestCommon(unittest.TestCase):
+    def setUp(self):
+        handle, self.baseline_name = tempfile.mkstemp()
+        os.close(handle)
+        os.remove(self.baseline_name)
+
+    def tearDown(self):
+        if os.path.exists(self.baseline_name):
+            os.remove(self.baseline_name)
+
+    def test_median(self):
+        self.assertEqual(common.median([3, 1, 2]), 2)
+        self.assertEqual(common.median([4, 1, 2, 3]), 2.5)
+
+    def test_percentile(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(common.percentile(values, 0), 1)
+        self.assertEqual(common.percentile(values, 0.5), 3)
+        self.assertEqual(common.percentile(values, 1), 5)
+        self.assertAlmostEqual(common.percentile(values, 0.9), 4.6)
+        self.assertEqual(common.percentile([7], 0.99), 7)
+
+    def test_summarize(self):
+        samples = [{'wall_ms': 1, 'rss_kb': 10},
+                   {'wall_ms': 3, 'rss_kb': 30},
+                   {'wall_ms': 2, 'rss_kb': 20}]
+        self.assertEqual(common.summarize(samples),
+                         {'wall_ms': 2, 'rss_kb': 20})
+
+    def test_compare(self):
+        baseline = {'a': {'wall_ms': 10.0, 'lines_per_sec': 100.0,
+                          'calls': 0}}
+        results = {'a': {'wall_ms': 12.0, 'lines_per_sec': 80.0,
+                         'calls': 0},
+                   'b': {'wall_ms': 1000.0}}
+        self.assertEqual(common.compare(results, baseline, 0.25), [])
+
+        results = {'a': {'wall_ms': 13.0, 'lines_per_sec': 70.0,
+                         'calls': 1}}
+        regressions = common.compare(results, baseline, 0.25)
+        self.assertEqual(regressions, [('a', 'calls', 1, 0),
+                                       ('a', 'lines_per_sec', 70.0, 100.0),
+                                       ('a', 'wall_ms', 13.0, 10.0)])
+
+    def test_baseline(self):
+        self.assertEqual(common.load_baseline(self.baseline_name), {})
+        common.save_baseline('one', {'a': {'calls': 1}}, self.baseline_name)
+        common.save_baseline('two', {'b': {'calls': 2}}, self.baseline_name)
+        with open(self.baseline_name) as baseline_file:
+            self.assertEqual(json.load(baseline_file),
+                             {'one': {'a': {'calls': 1}},
+                              'two': {'b': {'calls': 2}}})
+
+    def test_measure_statement(self):
+        result = common.measure_statement('x = 1', count=True)
+        self.assertIn('wall_ms', result)
+        self.assertIn('rss_kb', result)
+        self.assertEqual(result['calls'], 0)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no pty on Windows')
+    def test_interact(self):
+        # Python 2's input() would evaluate the line.
+        pid, fd = common.spawn_pty(
+            "import sys; print('got ' + sys.stdin.readline())")
+        try:
+            output = common.interact(fd, b'hello\n', b'got hello')
+        finally:
+            common.finish_pty(pid, fd)
+        self.assertIn(b'got hello', output)
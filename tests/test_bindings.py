@@ -0,0 +1,105 @@
+"""Simple tests for pygnurl.bindings"""
+from ctypes import *  # pylint: disable=wildcard-import,unused-wildcard-import
+import os
+import unittest
+
+import pygnurl.bindings
+import pygnurl.strings
+
+LIB_PATH = os.environ['PYGNURL_LIB']
+
+# pylint: disable=missing-docstring,protected-access
+
+
+class TestBindings(unittest.TestCase):
+    def setUp(self):
+        self.dll = cdll.LoadLibrary(LIB_PATH)
+        self.lib = pygnurl.bindings.Bindings(self.dll)
+
+    def test_lazy_functions(self):
+        self.assertNotIn('rl_redisplay', vars(self.lib))
+        func = self.lib.rl_redisplay
+        self.assertIn('rl_redisplay', vars(self.lib))
+        self.assertIs(self.lib.rl_redisplay, func)
+        self.assertEqual(func.argtypes, [])
+        self.assertEqual(func.restype, c_int)
+
+    def test_unknown_function(self):
+        with self.assertRaises(AttributeError):
+            _ = self.lib.no_such_function
+
+    def test_missing_function(self):
+        functions = dict(pygnurl.bindings.FUNCTIONS)
+        pygnurl.bindings.FUNCTIONS['no_such_function'] = ([], None)
+        try:
+            with self.assertRaises(AttributeError):
+                _ = self.lib.no_such_function
+        finally:
+            pygnurl.bindings.FUNCTIONS.clear()
+            pygnurl.bindings.FUNCTIONS.update(functions)
+
+    def test_features(self):
+        features = self.lib.features
+        self.assertTrue(features['rl_initialize'])
+        self.assertEqual(set(features), set(pygnurl.bindings.FUNCTIONS))
+        other = pygnurl.bindings.Bindings(self.dll)
+        self.assertIs(other.features, features)
+
+    def test_variable(self):
+        point = self.lib.variable(c_int, 'rl_point')
+        self.assertIs(self.lib.variable(c_int, 'rl_point'), point)
+        self.assertEqual(addressof(point),
+                         addressof(c_int.in_dll(self.dll, 'rl_point')))
+
+    def test_get_set(self):
+        self.lib.set(c_char_p, 'rl_readline_name', 'test')
+        self.assertEqual(self.lib.get(c_char_p, 'rl_readline_name'), 'test')
+        self.lib.set(c_int, 'rl_point', 0)
+        self.assertEqual(self.lib.get(c_int, 'rl_point'), 0)
+
+    def test_get_string_decode_reused(self):
+        # Python 2 strings are bytes, which aren't decoded.
+        name = pygnurl.strings.decode(u'\u00e9'.encode('utf-8') * 100)
+        self.lib.set(c_char_p, 'rl_readline_name', name)
+        value = self.lib.get_string('rl_readline_name')
+        self.assertIs(self.lib.get_string('rl_readline_name'), value)
+
+    def test_get_string_changed_in_place(self):
+        buf = create_string_buffer(b'abc')
+        pointer = c_void_p.in_dll(self.dll, 'rl_readline_name')
+        pointer.value = addressof(buf)
+        self.assertEqual(self.lib.get_string('rl_readline_name'), 'abc')
+        buf[1] = b'x'
+        self.assertEqual(self.lib.get_string('rl_readline_name'), 'axc')
+        buf[1] = b'\0'
+        self.assertEqual(self.lib.get_string('rl_readline_name'), 'a')
+        pointer.value = None
+        self.assertIsNone(self.lib.get_string('rl_readline_name'))
+        self.lib.set(c_char_p, 'rl_readline_name', 'other')
+        self.assertEqual(self.lib.get_string('rl_readline_name'), 'other')
+
+
+class TestVariable(unittest.TestCase):
+    class Owner(object):  # pylint: disable=too-few-public-methods
+        name = pygnurl.bindings.Variable(c_char_p, 'rl_readline_name')
+        prompt = pygnurl.bindings.Variable(c_char_p, 'rl_prompt',
+                                           'The prompt.', readonly=True)
+
+        def __init__(self, lib):
+            self.lib = lib
+
+    def setUp(self):
+        dll = cdll.LoadLibrary(LIB_PATH)
+        self.owner = self.Owner(pygnurl.bindings.Bindings(dll))
+
+    def test_get_set(self):
+        self.owner.name = 'test'
+        self.assertEqual(self.owner.name, 'test')
+
+    def test_readonly(self):
+        _ = self.owner.prompt
+        with self.assertRaises(AttributeError):
+            self.owner.prompt = 'test'
+
+    def test_doc(self):
+        self.assertEqual(self.Owner.prompt.__doc__, 'The prompt.')
@@ -0,0 +1,89 @@
+"""Tests for pygnurl.discovery"""
+import ctypes
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pygnurl.discovery
+
+# pylint: disable=missing-docstring,protected-access
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'),
+                     'discovery is only tested on Linux')
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(
+            os.environ, {'PYGNURL_CACHE_DIR': self.cache_dir})
+        self.environ.start()
+        self.cache_name = os.path.join(self.cache_dir, 'library.json')
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.cache_dir)
+
+    def _read_cache(self):
+        with open(self.cache_name) as cache_file:
+            return json.load(cache_file)
+
+    def test_cache_path(self):
+        self.assertEqual(pygnurl.discovery.cache_path('test'),
+                         os.path.join(self.cache_dir, 'test'))
+        os.environ['PYGNURL_CACHE_DIR'] = ''
+        self.assertIsNone(pygnurl.discovery.cache_path('test'))
+
+    def test_find_library(self):
+        dll = pygnurl.discovery.find_library()
+        self.assertTrue(pygnurl.discovery._is_gnu_readline(dll))
+
+        cache = self._read_cache()
+        path, mtime = cache[pygnurl.discovery._interpreter_key()]
+        self.assertEqual(os.stat(path).st_mtime, mtime)
+
+    def test_cached_library(self):
+        pygnurl.discovery.find_library()
+        with mock.patch('pygnurl.discovery._probe_candidates') as probe, \
+                mock.patch('pygnurl.discovery._find_loaded_library') as find:
+            dll = pygnurl.discovery.find_library()
+        self.assertFalse(probe.called)
+        self.assertFalse(find.called)
+        self.assertTrue(pygnurl.discovery._is_gnu_readline(dll))
+
+    def test_stale_cache(self):
+        pygnurl.discovery.find_library()
+        cache = self._read_cache()
+        key = pygnurl.discovery._interpreter_key()
+        cache[key][1] -= 1
+        pygnurl.discovery.write_cache(self.cache_name, cache)
+        dll = pygnurl.discovery.find_library()
+        self.assertTrue(pygnurl.discovery._is_gnu_readline(dll))
+        path, mtime = self._read_cache()[key]
+        self.assertEqual(os.stat(path).st_mtime, mtime)
+
+    def test_corrupt_cache(self):
+        with open(self.cache_name, 'w') as cache_file:
+            cache_file.write('not json')
+        dll = pygnurl.discovery.find_library()
+        self.assertTrue(pygnurl.discovery._is_gnu_readline(dll))
+
+    def test_probe_candidates(self):
+        dll = pygnurl.discovery._probe_candidates()
+        self.assertTrue(pygnurl.discovery._is_gnu_readline(dll))
+
+    def test_library_path(self):
+        dll = pygnurl.discovery._probe_candidates()
+        path = pygnurl.discovery.library_path(dll)
+        self.assertTrue(os.path.basename(path).startswith('libreadline'))
+
+    def test_not_readline(self):
+        self.assertFalse(pygnurl.discovery._is_gnu_readline(
+            ctypes.pythonapi))
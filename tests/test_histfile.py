@@ -0,0 +1,55 @@
+"""Tests for pygnurl.histfile"""
+import os
+import tempfile
+import unittest
+
+from pygnurl import histfile
+
+# pylint: disable=missing-docstring
+
+
+class TestReadEntries(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _read(self, data, comment_char=b'#', multiline=False):
+        with open(self.path, 'wb') as history_file:
+            history_file.write(data)
+        results = []
+        # A tiny chunk size splits lines across chunks.
+        for chunk_size in (3, histfile.CHUNK_SIZE):
+            results.append(list(histfile.read_entries(
+                self.path, comment_char, multiline, chunk_size)))
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_lines(self):
+        self.assertEqual(self._read(b'one\n\ntwo three\nfour'),
+                         [(b'four', None), (b'two three', None),
+                          (b'one', None)])
+        self.assertEqual(self._read(b''), [])
+
+    def test_timestamps(self):
+        self.assertEqual(
+            self._read(b'zero\n#100\none\n#x\n#200\ntwo\nthree\n#300\n'),
+            [(b'three', None), (b'two', b'#200'), (b'#x', None),
+             (b'one', b'#100'), (b'zero', None)])
+        # Timestamps aren't recognised without a comment character.
+        self.assertEqual(self._read(b'#100\none\n', b'\0'),
+                         [(b'one', None), (b'#100', None)])
+
+    def test_multiline(self):
+        data = b'#100\none\ntwo\n#200\nthree\n'
+        self.assertEqual(self._read(data, multiline=True),
+                         [(b'three', b'#200'), (b'one\ntwo', b'#100')])
+        self.assertEqual(self._read(b'one\n' + data, multiline=True),
+                         [(b'three', b'#200'), (b'two', None),
+                          (b'one', b'#100'), (b'one', None)])
+
+    def test_timestamp_seconds(self):
+        self.assertEqual(histfile.timestamp_seconds(b'#1234'), 1234)
+        self.assertEqual(histfile.timestamp_seconds(b'#12x'), 12)
@@ -0,0 +1,111 @@
+"""Tests for pygnurl.inputrc"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pygnurl.inputrc
+
+# pylint: disable=missing-docstring,protected-access
+
+CONFIG = r'''
+# comment
+set bell-style none
+"\C-x\C-r": re-read-init-file
+Control-a: beginning-of-line
+set bell-style visible
+$if mode=emacs
+Control-a: end-of-line
+Control-a: end-of-line
+$endif
+set keymap vi-insert
+Control-a: beginning-of-line
+set keymap emacs
+"\C-x\C-r": undo
+'''
+
+
+class TestCompile(unittest.TestCase):
+    def test_compile_config(self):
+        compiled = pygnurl.inputrc.compile_config(CONFIG)
+        # The initial keymap isn't known, so the last line doesn't
+        # override the first binding.
+        self.assertEqual(compiled, [
+            (('bind', None, r'"\C-x\C-r"'), r'"\C-x\C-r": re-read-init-file'),
+            (('bind', None, 'Control-a'), 'Control-a: beginning-of-line'),
+            (('set', 'bell-style'), 'set bell-style visible'),
+            (None, '$if mode=emacs'),
+            (None, 'Control-a: end-of-line'),
+            (None, 'Control-a: end-of-line'),
+            (None, '$endif'),
+            (None, 'set keymap vi-insert'),
+            (('bind', 'vi-insert', 'Control-a'),
+             'Control-a: beginning-of-line'),
+            (None, 'set keymap emacs'),
+            (('bind', 'emacs-standard', r'"\C-x\C-r"'),
+             r'"\C-x\C-r": undo'),
+        ])
+
+    def test_compile_lines(self):
+        compiled = pygnurl.inputrc.compile_config(['tab: complete',
+                                                   'tab: menu-complete'])
+        self.assertEqual(compiled, [(('bind', None, 'tab'),
+                                     'tab: menu-complete')])
+
+    def test_setting_key(self):
+        key = pygnurl.inputrc.setting_key
+        self.assertEqual(key(r'"\"a": "b"', 'vi-insert'),
+                         (('bind', 'vi-insert', r'"\"a"'), 'vi-insert'))
+        self.assertEqual(key('set editing-mode vi', None),
+                         (None, 'vi-insert'))
+        self.assertEqual(key('set keymap vi', None), (None, 'vi-command'))
+        self.assertEqual(key('nonsense', None), (None, None))
+
+
+class TestCompileCached(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(
+            os.environ, {'PYGNURL_CACHE_DIR': self.cache_dir})
+        self.environ.start()
+        pygnurl.inputrc._compiled.clear()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.cache_dir)
+        pygnurl.inputrc._compiled.clear()
+
+    def test_compile_cached(self):
+        compiled = pygnurl.inputrc.compile_cached(CONFIG, 0x0800)
+        self.assertEqual(compiled, pygnurl.inputrc.compile_config(CONFIG))
+        with open(os.path.join(self.cache_dir, 'inputrc.json')) as cache:
+            self.assertEqual(len(json.load(cache)), 1)
+
+        with mock.patch('pygnurl.inputrc.compile_config') as compile_config:
+            self.assertIs(pygnurl.inputrc.compile_cached(CONFIG, 0x0800),
+                          compiled)
+            # Simulate a new process.
+            pygnurl.inputrc._compiled.clear()
+            self.assertEqual(pygnurl.inputrc.compile_cached(CONFIG, 0x0800),
+                             compiled)
+        self.assertFalse(compile_config.called)
+
+    def test_version(self):
+        pygnurl.inputrc.compile_cached(CONFIG, 0x0800)
+        with mock.patch('pygnurl.inputrc.compile_config') as compile_config:
+            compile_config.return_value = []
+            pygnurl.inputrc.compile_cached(CONFIG, 0x0801)
+        self.assertTrue(compile_config.called)
+
+    def test_cache_size(self):
+        for i in range(pygnurl.inputrc.CACHE_SIZE + 4):
+            pygnurl.inputrc.compile_cached('set bell-style {}'.format(i), 1)
+        with open(os.path.join(self.cache_dir, 'inputrc.json')) as cache:
+            self.assertEqual(len(json.load(cache)),
+                             pygnurl.inputrc.CACHE_SIZE)
@@ -1,10 +1,16 @@
 """Simple tests for pygnurl.readline"""
 from __future__ import print_function
 
+import contextlib
 from ctypes import *  # pylint: disable=wildcard-import,unused-wildcard-import
+import locale
 import os
+import shutil
+import signal
 import sys
 import tempfile
+import threading
+import time
 import unittest
 
 try:
@@ -33,9 +39,13 @@ class TestReadline(unittest.TestCase):
         # FUTURE: add way to reset buffer, point, etc.
         self.readline.line_buffer = ''
         self.readline.point = 0
+        self.streams = self.readline.instream, self.readline.outstream
 
     def tearDown(self):
         os.remove(self.init_file_name)
+        # Tests replace the streams with bogus or closed ones. Readline
+        # copies them when it's initialized, which the next setUp does.
+        self.readline.instream, self.readline.outstream = self.streams
 
     def test_name(self):
         self.assertEqual(self.readline.name, 'python')
@@ -44,6 +54,14 @@ class TestReadline(unittest.TestCase):
         self.readline.instream = 123
         self.assertEqual(self.readline.instream, 123)
 
+    def test_instream_resets_waiter(self):
+        self.readline._fileno = 0
+        self.readline._select(0)
+        self.assertIsNotNone(self.readline._waiter)
+        self.readline.instream = self.readline.instream
+        self.assertIsNone(self.readline._waiter)
+        self.assertIsNone(self.readline._fileno)
+
     def test_outstream(self):
         self.readline.outstream = 456
         self.assertEqual(self.readline.outstream, 456)
@@ -66,11 +84,222 @@ class TestReadline(unittest.TestCase):
     def test_parse_and_bind(self):
         self.readline.parse_and_bind('tab: complete')
 
+    def test_parse_and_bind_all(self):
+        config = 'set bell-style none\n"\\C-xq": undo\n"\\C-xq": undo\n'
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with mock.patch.dict(os.environ,
+                                 {'PYGNURL_CACHE_DIR': cache_dir}):
+                self.assertEqual(self.readline.parse_and_bind_all(config), 2)
+                self.assertEqual(self.readline.parse_and_bind_all(config), 0)
+                self.readline.parse_and_bind('"\\C-xq": redraw-current-line')
+                self.assertEqual(self.readline.parse_and_bind_all(config), 1)
+                self.readline.read_init_file(self.init_file_name)
+                self.assertEqual(self.readline.parse_and_bind_all(config), 2)
+        finally:
+            shutil.rmtree(cache_dir)
+
     def test_line_buffer(self):
         self.assertEqual(self.readline.line_buffer, '')
         self.readline.line_buffer = 'test'
         self.assertEqual(self.readline.line_buffer, 'test')
 
+    @contextlib.contextmanager
+    def _pipe_input(self):
+        """Read input from a pipe, yielding its write end."""
+        libc = CDLL(None)
+        libc.fdopen.argtypes = [c_int, c_char_p]
+        libc.fdopen.restype = c_void_p
+        libc.fclose.argtypes = [c_void_p]
+        read_fd, write_fd = os.pipe()
+        null_fd = os.open(os.devnull, os.O_WRONLY)
+        instream = libc.fdopen(read_fd, b'r')
+        outstream = libc.fdopen(null_fd, b'w')
+        self.readline.instream = instream
+        self.readline.outstream = outstream
+        self.readline._fileno = read_fd
+        try:
+            with mock.patch.object(self.readline, '_select',
+                                   return_value=True):
+                yield write_fd
+        finally:
+            os.close(write_fd)
+            libc.fclose(instream)
+            libc.fclose(outstream)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+    def test_drain_pending_input(self):
+        with self._pipe_input() as write_fd:
+            os.write(write_fd, b'abc\x1b[Dx\nnext\n')
+            with mock.patch('os.read', wraps=os.read) as read:
+                line = self.readline._readline_until_enter_or_signal(b'')
+            self.assertEqual(line, b'abxc')
+            self.assertEqual(self.readline._select.call_count, 1)
+            self.assertEqual(read.call_count, 1)
+            # The rest of the input is left for the next line.
+            self.assertEqual(self.readline._pending(), len('next\n'))
+            line = self.readline._readline_until_enter_or_signal(b'')
+            self.assertEqual(line, b'next')
+            self.assertEqual(self.readline._select.call_count, 1)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+    def test_bracketed_paste(self):
+        self.readline.bracketed_paste = True
+        self.addCleanup(setattr, self.readline, 'bracketed_paste', False)
+        with self._pipe_input() as write_fd:
+            os.write(write_fd, b'ab' + pygnurl.interface.PASTE_START +
+                     b'one\r\ntwo\nthr' + pygnurl.interface.PASTE_END +
+                     b'ee\n')
+            lines = [self.readline._readline_until_enter_or_signal(b'')
+                     for _ in range(3)]
+            self.assertEqual(lines, [b'abone', b'two', b'three'])
+            self.assertFalse(self.readline._typeahead)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+    def test_sigint_during_completion(self):
+        finished = []
+
+        def completer(text, start, end):
+            os.kill(os.getpid(), signal.SIGINT)
+            finished.append(text)
+            return [text + 'c']
+
+        self.readline.completion.completer = completer
+        self.readline.parse_and_bind('tab: complete')
+        try:
+            with self._pipe_input() as write_fd:
+                os.write(write_fd, b'ab\t')
+                with self.assertRaises(KeyboardInterrupt):
+                    self.readline._readline_until_enter_or_signal(b'')
+        finally:
+            self.readline.parse_and_bind('tab: self-insert')
+            self.readline.completion.completer = None
+            # Readline leaves this set after completing.
+            self.readline.lib.set(c_char, 'rl_completion_type', '\0')
+        # The completer ran to completion before the interrupt.
+        self.assertEqual(finished, ['ab'])
+        self.assertIs(signal.getsignal(signal.SIGINT),
+                      signal.default_int_handler)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no pipe select on Windows')
+    def test_input_hook_fd(self):
+        input_read, input_write = os.pipe()
+        hook_read, hook_write = os.pipe()
+        calls = []
+
+        def callback():
+            calls.append(os.read(hook_read, 1))
+            os.write(input_write, b'x')
+
+        self.readline._fileno = input_read
+        hook = self.readline.add_input_hook(hook_read, callback=callback)
+        try:
+            os.write(hook_write, b'h')
+            self.readline._wait_for_input()
+            self.assertEqual(calls, [b'h'])
+            # Nothing more is due until hook_read is readable again.
+            self.assertIsNone(self.readline._run_input_hooks())
+        finally:
+            self.readline.remove_input_hook(hook)
+            for fileno in input_read, input_write, hook_read, hook_write:
+                os.close(fileno)
+        self.assertEqual(self.readline._input_hooks, [])
+
+    @unittest.skipIf(sys.platform == 'win32', 'no pipe select on Windows')
+    def test_input_hook_interval(self):
+        input_read, input_write = os.pipe()
+        calls = []
+
+        def callback():
+            calls.append(None)
+            if len(calls) == 3:
+                os.write(input_write, b'x')
+            # Ask to be called again straight away.
+            return 0
+
+        self.readline._fileno = input_read
+        hook = self.readline.add_input_hook(interval=60, callback=callback)
+        hook.due = 0
+        try:
+            self.readline._wait_for_input()
+            self.assertEqual(len(calls), 3)
+        finally:
+            self.readline.remove_input_hook(hook)
+            os.close(input_read)
+            os.close(input_write)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no pipe select on Windows')
+    def test_os_input_hook_with_input_hooks(self):
+        input_read, input_write = os.pipe()
+        calls = []
+
+        def os_input_hook():
+            calls.append(None)
+            if len(calls) == 3:
+                os.write(input_write, b'x')
+
+        self.readline._fileno = input_read
+        hook = self.readline.add_input_hook(interval=60,
+                                            callback=lambda: None)
+        try:
+            with mock.patch.object(pygnurl.interface,
+                                   'OS_INPUT_HOOK_INTERVAL', 0), \
+                    mock.patch.object(self.readline, '_os_input_hook',
+                                      c_void_p(1)), \
+                    mock.patch.object(self.readline, '_call_os_input_hook',
+                                      side_effect=os_input_hook):
+                self.readline._wait_for_input()
+            self.assertEqual(len(calls), 3)
+        finally:
+            self.readline.remove_input_hook(hook)
+            os.close(input_read)
+            os.close(input_write)
+
+    def test_input_hook_requires_fd_or_interval(self):
+        with self.assertRaises(ValueError):
+            self.readline.add_input_hook(callback=lambda: None)
+
+    def test_bracketed_paste_disabled(self):
+        self.assertFalse(self.readline.bracketed_paste)
+        if self.readline.version < 0x0700:
+            return
+        variable = self.readline.lib.rl_variable_value
+        self.readline.parse_and_bind('set enable-bracketed-paste on')
+        self.readline.bracketed_paste = True
+        try:
+            self.assertEqual(variable(b'enable-bracketed-paste'), b'off')
+        finally:
+            self.readline.bracketed_paste = False
+        self.assertEqual(variable(b'enable-bracketed-paste'), b'on')
+
+    def test_snapshot(self):
+        self.readline.line_buffer = 'test'
+        self.readline.point = 2
+        self.readline.mark = 1
+        state = self.readline.snapshot()
+        self.assertEqual(state.line_buffer, 'test')
+        self.assertEqual((state.point, state.end, state.mark), (2, 4, 1))
+        self.assertFalse(state.done)
+        self.assertEqual(state.completion_type, '')
+        with self.assertRaises(AttributeError):
+            state.point = 0
+
+    def test_apply(self):
+        self.readline.line_buffer = 'test'
+        state = self.readline.snapshot()._replace(
+            line_buffer='applied', point=3, mark=7, prompt='>>> ')
+        self.readline.apply(state)
+        self.assertEqual(self.readline.line_buffer, 'applied')
+        self.assertEqual(self.readline.end, len('applied'))
+        self.assertEqual(self.readline.point, 3)
+        self.assertEqual(self.readline.mark, 7)
+        self.assertEqual(self.readline.prompt, '>>> ')
+        self.assertEqual(self.readline.snapshot(), state._replace(end=7))
+
+        with self.assertRaises(ValueError):
+            self.readline.apply(state._replace(line_buffer='a'))
+        self.assertEqual(self.readline.line_buffer, 'applied')
+
     def test_insert_text(self):
         self.assertEqual(self.readline.line_buffer, '')
         self.assertEqual(self.readline.point, 0)
@@ -127,6 +356,39 @@ class TestReadline(unittest.TestCase):
         self.readline.startup_hook = mock.Mock(side_effect=Exception)
         self.assertEqual(self.readline._on_startup_hook(), -1)
 
+    def test_hooks_installed_when_set(self):
+        def installed(name):
+            return bool(c_void_p.in_dll(self.readline.lib.dll, name).value)
+
+        for name, attr in (('rl_startup_hook', 'startup_hook'),
+                           ('rl_pre_input_hook', 'pre_input_hook')):
+            self.assertFalse(installed(name))
+            setattr(self.readline, attr, mock.Mock())
+            self.assertTrue(installed(name))
+            setattr(self.readline, attr, None)
+            self.assertFalse(installed(name))
+
+    def test_add_history(self):
+        self.readline.history.clear()
+        for line in (b'a', b'a', b'', b'b', b'a'):
+            self.readline._add_history(line)
+        self.assertEqual(list(self.readline.history), ['a', 'b', 'a'])
+        self.readline.history.clear()
+
+    @unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+    def test_call_readline(self):
+        with self._pipe_input() as write_fd:
+            os.write(write_fd, '\u00e9\n'.encode('utf-8'))
+            address = self.readline._call_readline(
+                self.readline.instream, self.readline.outstream, b'')
+        try:
+            self.assertEqual(string_at(address),
+                             '\u00e9\n'.encode('utf-8'))
+        finally:
+            free = getattr(pythonapi, 'PyMem_RawFree', pythonapi.PyMem_Free)
+            free.argtypes = [c_void_p]
+            free(address)
+
     def test_pre_input_hook(self):
         self.readline.pre_input_hook = mock.Mock(return_value=234)
         self.assertEqual(self.readline._on_pre_input_hook(), 234)
@@ -152,6 +414,330 @@ class TestReadline(unittest.TestCase):
         self.assertEqual(ret, -1)
 
 
+@unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+class TestHeadless(unittest.TestCase):
+    def setUp(self):
+        dll = cdll.LoadLibrary(LIB_PATH)
+        self.readline = pygnurl.interface.Readline(dll)
+        self.readline.history.clear()
+        self.read_fd, self.write_fd = os.pipe()
+
+    def tearDown(self):
+        os.close(self.read_fd)
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+        self.readline.history.clear()
+
+    def _replay(self, keys, output_fd=None):
+        os.write(self.write_fd, keys)
+        os.close(self.write_fd)
+        self.write_fd = None
+        lines = []
+        with self.readline.headless(self.read_fd, output_fd):
+            while True:
+                try:
+                    lines.append(self.readline.read_line('> '))
+                except EOFError:
+                    return lines
+
+    def test_editing(self):
+        lines = self._replay(b'abd\x02c\x06e\nxyz\x01\x0b\n\x10\n')
+        self.assertEqual(lines, ['abcde', '', 'abcde'])
+        # The recalled line repeats the last one, so isn't added again.
+        self.assertEqual(list(self.readline.history), ['abcde'])
+
+    def test_history_edited(self):
+        history = self.readline.history
+        history.append('one')
+        history.append('two')
+        self.assertEqual(history.to_list(), ['one', 'two'])
+        # Recall and edit 'one', leave it for the next line, then
+        # accept a new line.
+        self._replay(b'\x10\x10x\x0e\x0e\x0bthree\n')
+        entries = [history.lib.history_get(history.base + index)
+                   for index in range(len(history))]
+        self.assertEqual(history.to_list(),
+                         [entry[0].line.decode() for entry in entries])
+        self.assertEqual(history[-1], 'three')
+
+    def test_erase_duplicates(self):
+        self.readline.history.erase_duplicates = True
+        lines = self._replay(b'one\ntwo\none\n\x10\x10\n')
+        self.assertEqual(lines, ['one', 'two', 'one', 'two'])
+        self.assertEqual(self.readline.history.to_list(), ['one', 'two'])
+
+    def test_completion(self):
+        completion = self.readline.completion
+        # Other tests may have changed these.
+        saved = (completion.word_break_characters,
+                 completion.append_character)
+        completion.word_break_characters = ' \t\n'
+        completion.append_character = ' '
+        completion.completer = lambda text, start, end: ['hello']
+        self.readline.parse_and_bind('tab: complete')
+        try:
+            lines = self._replay(b'he\tx\n')
+        finally:
+            self.readline.parse_and_bind('tab: self-insert')
+            completion.completer = None
+            (completion.word_break_characters,
+             completion.append_character) = saved
+            # Readline leaves this set after completing.
+            self.readline.lib.set(c_char, 'rl_completion_type', '\0')
+        self.assertEqual(lines, ['hello x'])
+
+    def test_no_display(self):
+        read_fd, write_fd = os.pipe()
+        try:
+            self._replay(b'abc\n', write_fd)
+            os.write(write_fd, b'end')
+            self.assertEqual(os.read(read_fd, 100), b'end')
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def test_restore(self):
+        streams = self.readline.instream, self.readline.outstream
+        redisplay = self.readline.lib.get(c_void_p, 'rl_redisplay_function')
+        with self.readline.headless(self.read_fd):
+            self.assertNotEqual(self.readline.instream, streams[0])
+            # input() passes Python's streams, which must be ignored.
+            self.readline._prep_terminal(*streams)
+            self.assertNotEqual(self.readline.instream, streams[0])
+            self.assertEqual(
+                self.readline.lib.get(c_void_p, '_rl_out_stream'),
+                self.readline.outstream)
+        self.assertEqual((self.readline.instream, self.readline.outstream),
+                         streams)
+        self.assertEqual(
+            self.readline.lib.get(c_void_p, 'rl_redisplay_function'),
+            redisplay)
+        # Readline's own copies mustn't be left with the closed streams.
+        self.assertEqual(self.readline.lib.get(c_void_p, '_rl_out_stream'),
+                         streams[1])
+
+    def test_open_failed(self):
+        lib = self.readline.lib
+        streams = self.readline.instream, self.readline.outstream
+        fdopen = lib.fdopen
+        open_fds = sorted(os.listdir('/proc/self/fd'))
+        for failing_mode in (b'r', b'w'):
+            def fake_fdopen(fd, mode, failing_mode=failing_mode):
+                return None if mode == failing_mode else fdopen(fd, mode)
+
+            with mock.patch.object(lib, 'fdopen', fake_fdopen), \
+                    mock.patch.object(lib, 'fclose',
+                                      wraps=lib.fclose) as fclose:
+                with self.assertRaises(OSError):
+                    with self.readline.headless(self.read_fd):
+                        self.fail('entered headless mode')
+            self.assertEqual(fclose.call_count, int(failing_mode == b'w'))
+            # The copied descriptors are closed, and no others.
+            self.assertEqual(sorted(os.listdir('/proc/self/fd')), open_fds)
+            self.assertEqual(
+                (self.readline.instream, self.readline.outstream), streams)
+
+
+class TestStoreLocale(unittest.TestCase):
+    def setUp(self):
+        self.saved = locale.setlocale(locale.LC_CTYPE)
+
+    def tearDown(self):
+        locale.setlocale(locale.LC_CTYPE, self.saved)
+
+    def test_environment_locale(self):
+        with pygnurl.interface.store_locale():
+            environment = locale.setlocale(locale.LC_CTYPE)
+        locale.setlocale(locale.LC_CTYPE, 'C')
+        with pygnurl.interface.store_locale():
+            self.assertEqual(locale.setlocale(locale.LC_CTYPE), environment)
+        self.assertEqual(locale.setlocale(locale.LC_CTYPE), 'C')
+
+    def test_unchanged(self):
+        with pygnurl.interface.store_locale():
+            environment = locale.setlocale(locale.LC_CTYPE)
+        locale.setlocale(locale.LC_CTYPE, environment)
+        with mock.patch('locale.setlocale',
+                        side_effect=locale.setlocale) as setlocale:
+            with pygnurl.interface.store_locale():
+                pass
+        setlocale.assert_called_once_with(locale.LC_CTYPE)
+
+
+class TestDeferredInterrupt(unittest.TestCase):
+    def _interrupt(self):
+        os.kill(os.getpid(), signal.SIGINT)
+        # Give Python a chance to run the handler.
+        for _ in range(10):
+            pass
+
+    def test_not_deferred(self):
+        with pygnurl.interface.DeferredInterrupt():
+            with self.assertRaises(KeyboardInterrupt):
+                self._interrupt()
+        self.assertIs(signal.getsignal(signal.SIGINT),
+                      signal.default_int_handler)
+
+    def test_deferred(self):
+        with pygnurl.interface.DeferredInterrupt() as interrupt:
+            interrupt.defer()
+            self._interrupt()
+            with self.assertRaises(KeyboardInterrupt):
+                interrupt.resume()
+            # Nothing left over.
+            interrupt.resume()
+
+    def test_previous_handler(self):
+        handler = mock.Mock()
+        old_handler = signal.signal(signal.SIGINT, handler)
+        try:
+            with pygnurl.interface.DeferredInterrupt() as interrupt:
+                interrupt.defer()
+                self._interrupt()
+                self.assertFalse(handler.called)
+                interrupt.resume()
+                self.assertTrue(handler.called)
+        finally:
+            signal.signal(signal.SIGINT, old_handler)
+
+    def test_ignored(self):
+        old_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            with pygnurl.interface.DeferredInterrupt():
+                self.assertEqual(signal.getsignal(signal.SIGINT),
+                                 signal.SIG_IGN)
+                self._interrupt()
+        finally:
+            signal.signal(signal.SIGINT, old_handler)
+
+
+class TestTypeahead(unittest.TestCase):
+    def test_typeahead(self):
+        typeahead = pygnurl.interface.Typeahead()
+        self.assertFalse(typeahead)
+        typeahead.extend(b'abc')
+        self.assertEqual(len(typeahead), 3)
+        self.assertEqual(typeahead.pop(), ord('a'))
+        self.assertEqual(len(typeahead), 2)
+        typeahead.extend(b'de')
+        self.assertEqual(typeahead._offset, 0)
+        self.assertEqual([typeahead.pop() for _ in range(3)],
+                         [ord('b'), ord('c'), ord('d')])
+        self.assertEqual(typeahead.take(), bytearray(b'e'))
+        self.assertFalse(typeahead)
+        typeahead.extend(b'f')
+        self.assertEqual(typeahead.pop(), ord('f'))
+        self.assertFalse(typeahead)
+        self.assertEqual(len(typeahead._data), 0)
+
+
+@unittest.skipIf(sys.platform == 'win32', 'no pipe select on Windows')
+class TestInputWaiter(unittest.TestCase):
+    def setUp(self):
+        self.read_fd, self.write_fd = os.pipe()
+
+    def tearDown(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def test_wait(self):
+        waiter = pygnurl.interface.InputWaiter(self.read_fd)
+        self.assertFalse(waiter.wait(0))
+        os.write(self.write_fd, b'x')
+        self.assertTrue(waiter.wait(0))
+        self.assertTrue(waiter.wait(None))
+        waiter.close()
+
+    def test_wake(self):
+        waiter = pygnurl.interface.InputWaiter(self.read_fd)
+        timer = threading.Timer(0.05, waiter.wake)
+        timer.start()
+        self.assertEqual(waiter.wait(5), [])
+        timer.join()
+        waiter.wake()
+        waiter.wake()
+        self.assertEqual(waiter.wait(5), [])
+        self.assertEqual(waiter.wait(0), [])
+        waiter.close()
+        waiter.wake()
+
+    def test_large_fileno(self):
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        fileno = 4096
+        if hard != resource.RLIM_INFINITY and hard <= fileno:
+            self.skipTest('descriptor limit too low')
+        resource.setrlimit(resource.RLIMIT_NOFILE, (fileno + 1, hard))
+        try:
+            os.dup2(self.read_fd, fileno)
+            try:
+                waiter = pygnurl.interface.InputWaiter(fileno)
+                os.write(self.write_fd, b'x')
+                self.assertTrue(waiter.wait(0))
+                waiter.close()
+            finally:
+                os.close(fileno)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+    def test_regular_file(self):
+        with tempfile.TemporaryFile() as temp:
+            waiter = pygnurl.interface.InputWaiter(temp.fileno())
+            self.assertTrue(waiter.wait(0))
+            waiter.close()
+
+
+class TestLazyReadline(unittest.TestCase):
+    def setUp(self):
+        self.dll = cdll.LoadLibrary(LIB_PATH)
+        self.readline = pygnurl.interface.LazyReadline(
+            self.dll, pygnurl.interface.Readline)
+
+    def test_version(self):
+        self.assertEqual(self.readline.version,
+                         c_int.in_dll(self.dll, 'rl_readline_version').value)
+        self.assertFalse(self.readline.initialized)
+
+    def test_getattr(self):
+        self.assertEqual(self.readline.name, 'python')
+        self.assertTrue(self.readline.initialized)
+        self.assertIsInstance(self.readline.resolve(),
+                              pygnurl.interface.Readline)
+
+    def test_setattr(self):
+        hook = mock.Mock()
+        self.readline.startup_hook = hook
+        self.assertTrue(self.readline.initialized)
+        self.assertIs(self.readline.resolve().startup_hook, hook)
+
+    def test_init_callbacks(self):
+        callback = mock.Mock()
+        self.readline.add_init_callback(callback)
+        self.assertFalse(callback.called)
+        instance = self.readline.resolve()
+        callback.assert_called_once_with(instance)
+        self.readline.resolve()
+        self.assertEqual(callback.call_count, 1)
+
+        callback = mock.Mock()
+        self.readline.add_init_callback(callback)
+        callback.assert_called_once_with(instance)
+
+    def test_call_readline(self):
+        instance = mock.Mock()
+        instance._call_readline.return_value = 123
+        factory = mock.Mock(return_value=instance)
+        readline = pygnurl.interface.LazyReadline(self.dll, factory)
+        self.assertFalse(factory.called)
+        self.assertEqual(readline._call_readline(1, 2, b'>>> '), 123)
+        factory.assert_called_once_with(self.dll)
+        instance._call_readline.assert_called_once_with(1, 2, b'>>> ')
+
+        readline = pygnurl.interface.LazyReadline(
+            self.dll, mock.Mock(side_effect=Exception))
+        self.assertIsNone(readline._call_readline(1, 2, b'>>> '))
+
+
 class TestHistory(unittest.TestCase):
     def setUp(self):
         dll = cdll.LoadLibrary(LIB_PATH)
@@ -217,6 +803,164 @@ class TestHistory(unittest.TestCase):
             lines.append(line)
         self.assertEqual(lines, ['test1', 'test2'])
 
+    def test_slice(self):
+        for line in ('test1', 'test2', 'test3'):
+            self.history.append(line)
+        self.assertEqual(self.history[1:], ['test2', 'test3'])
+        self.assertEqual(self.history[::-2], ['test3', 'test1'])
+        self.assertEqual(list(reversed(self.history)),
+                         ['test3', 'test2', 'test1'])
+        self.assertEqual(self.history.to_list(), ['test1', 'test2', 'test3'])
+
+    def test_cache(self):
+        self.history.append('test1')
+        self.assertEqual(self.history.to_list(), ['test1'])
+        # Changes through lib are seen, whether they add lines
+        self.readline.lib.add_history(b'test2')
+        self.assertEqual(self.history.to_list(), ['test1', 'test2'])
+        # or are made to entries after invalidate is called.
+        self.readline.lib.replace_history_entry(0, b'test3', None)
+        self.history.invalidate()
+        self.assertEqual(self.history[0], 'test3')
+        self.history[1] = 'test4'
+        self.assertEqual(self.history.to_list(), ['test3', 'test4'])
+        del self.history[0]
+        self.assertEqual(self.history.to_list(), ['test4'])
+
+    def test_search(self):
+        for line in ('import os', 'os.getcwd()', 'import sys', 'import os'):
+            self.history.append(line)
+        self.assertEqual(self.history.search('import'),
+                         [(3, 'import os'), (2, 'import sys')])
+        self.assertEqual(self.history.search('os', limit=1),
+                         [(3, 'import os')])
+        self.assertEqual(self.history.search('os', prefix=True),
+                         [(1, 'os.getcwd()')])
+        # The index follows changes to the history.
+        self.readline.lib.add_history(b'import json')
+        self.history[1] = 'import re'
+        del self.history[0]
+        self.assertEqual(self.history.search('import'),
+                         [(3, 'import json'), (2, 'import os'),
+                          (1, 'import sys'), (0, 'import re')])
+
+    def test_search_index_kept(self):
+        # Once built, the index is updated rather than rebuilt as lines
+        # are added, removed and loaded.
+        self.history.append('import os')
+        self.assertFalse(self.history.indexed)
+        self.history.indexed = True
+        index = self.history._index
+        self.assertIsNotNone(index)
+        with mock.patch('pygnurl.search.HistoryIndex') as history_index:
+            self.history.append('import sys')
+            self.readline.lib.add_history(b'import re')
+            self.assertEqual(self.history.search('import', limit=1),
+                             [(2, 'import re')])
+            self.history.write_file(self.history_file_name)
+            self.history.read_file(self.history_file_name)
+            self.history.load_file(self.history_file_name)
+            self.assertEqual(len(index), 9)
+            self.history.erase_duplicates = True
+            self.assertEqual(len(index), 3)
+            del self.history[0]
+            self.assertEqual(self.history.search('import'),
+                             [(1, 'import re'), (0, 'import sys')])
+        self.assertIs(self.history._index, index)
+        self.assertFalse(history_index.called)
+        self.history.clear()
+        self.assertEqual(self.history.search('import'), [])
+        self.history.append('import json')
+        self.assertEqual(self.history.search('import'), [(0, 'import json')])
+        self.history.indexed = False
+        self.assertIsNone(self.history._index)
+
+    def test_erase_duplicates(self):
+        for line in ('a', 'b', 'a', 'c', 'b'):
+            self.history.append(line)
+        self.assertFalse(self.history.erase_duplicates)
+        self.history.erase_duplicates = True
+        self.assertEqual(self.history.to_list(), ['a', 'c', 'b'])
+        self.assertEqual(self.history.search('a'), [(0, 'a')])
+        self.history.append('a')
+        self.readline.lib.add_history(b'd')
+        self.history.append('c')
+        self.assertEqual(self.history.to_list(), ['b', 'a', 'd', 'c'])
+        self.assertEqual(self.history.search('a'), [(1, 'a')])
+        # Changes to the history are followed.
+        self.history[1] = 'e'
+        del self.history[0]
+        self.history.append('e')
+        self.history.append('a')
+        self.assertEqual(self.history.to_list(), ['d', 'c', 'e', 'a'])
+        self.history.erase_duplicates = False
+        self.history.append('a')
+        self.assertEqual(self.history.to_list(), ['d', 'c', 'e', 'a', 'a'])
+
+    def test_erase_duplicates_read_file(self):
+        for line in ('a', 'b', 'a'):
+            self.history.append(line)
+        self.history.write_file(self.history_file_name)
+        self.history.erase_duplicates = True
+        self.history.read_file(self.history_file_name)
+        self.assertEqual(self.history.to_list(), ['b', 'a'])
+        self.history.append('b')
+        self.assertEqual(self.history.to_list(), ['a', 'b'])
+
+    def test_erase_duplicates_pos(self):
+        for line in ('a', 'b', 'a', 'c', 'b', 'd'):
+            self.history.append(line)
+        self.history.pos = 3
+        self.history.erase_duplicates = True
+        self.assertEqual(self.history.to_list(), ['a', 'c', 'b', 'd'])
+        self.assertEqual(self.history.pos, 1)
+        self.assertEqual(self.history[self.history.pos], 'c')
+        # A removed line leaves it on the next kept one.
+        self.history.erase_duplicates = False
+        self.history.append('c')
+        self.history.pos = 1
+        self.history.erase_duplicates = True
+        self.assertEqual(self.history.to_list(), ['a', 'b', 'd', 'c'])
+        self.assertEqual(self.history.pos, 1)
+        self.assertEqual(self.history[self.history.pos], 'b')
+        # Past the newest line stays there.
+        self.history.erase_duplicates = False
+        for line in ('a', 'b'):
+            self.history.append(line)
+        self.history.pos = len(self.history)
+        self.history.erase_duplicates = True
+        self.assertEqual(self.history.to_list(), ['d', 'c', 'a', 'b'])
+        self.assertEqual(self.history.pos, len(self.history))
+
+    def test_erase_duplicates_stifled(self):
+        self.readline.lib.dll.stifle_history(4)
+        try:
+            for line in ('a', 'b', 'a', 'b'):
+                self.history.append(line)
+            self.history.erase_duplicates = True
+            self.assertEqual(self.history.to_list(), ['a', 'b'])
+            self.assertEqual(self.history.base, 1)
+            for line in ('c', 'd', 'e'):
+                self.history.append(line)
+            self.assertEqual(self.history.to_list(), ['b', 'c', 'd', 'e'])
+            self.assertEqual(self.history.base, 2)
+            self.assertEqual(self.readline.lib.history_get(2)[0].line, b'b')
+            self.assertTrue(self.readline.lib.history_is_stifled())
+        finally:
+            self.readline.lib.dll.unstifle_history()
+
+    def test_cache_stifled(self):
+        self.readline.lib.dll.stifle_history(2)
+        try:
+            for line in ('test1', 'test2'):
+                self.history.append(line)
+            self.assertEqual(self.history.to_list(), ['test1', 'test2'])
+            self.readline.lib.add_history(b'test3')
+            self.assertEqual(self.history.to_list(), ['test2', 'test3'])
+            self.assertEqual(self.history[0], 'test2')
+        finally:
+            self.readline.lib.dll.unstifle_history()
+
     def test_pos(self):
         self.assertEqual(self.history.pos, 0)
         with self.assertRaises(IndexError):
@@ -252,6 +996,196 @@ class TestHistory(unittest.TestCase):
         with self.assertRaises(IOError):
             self.readline.history.truncate_file(1, '/dev/null/nothing')
 
+    def _file_lines(self):
+        with open(self.history_file_name) as history_file:
+            return history_file.read().splitlines()
+
+    def test_load_file(self):
+        for line in ('ls', 'a', 'b', 'ls -l', 'a', 'c'):
+            self.history.append(line)
+        self.history.write_file(self.history_file_name)
+        self.history.clear()
+        self.assertEqual(self.history.load_file(self.history_file_name), 6)
+        self.assertEqual(self.history.to_list(),
+                         ['ls', 'a', 'b', 'ls -l', 'a', 'c'])
+        self.history.clear()
+        self.assertEqual(self.history.load_file(
+            self.history_file_name, ignore=['ls', 'ls *'], max_lines=2,
+            erase_duplicates=True), 2)
+        self.assertEqual(self.history.to_list(), ['a', 'c'])
+        # Lines already in the history are kept, but not their copies.
+        self.history.erase_duplicates = True
+        self.history.load_file(self.history_file_name)
+        self.assertEqual(self.history.to_list(),
+                         ['ls', 'b', 'ls -l', 'a', 'c'])
+
+        with self.assertRaises(IOError):
+            self.history.load_file('/dev/null/nothing')
+
+    def test_load_file_max_age(self):
+        now = int(time.time())
+        with open(self.history_file_name, 'w') as history_file:
+            history_file.write('#{}\nold\n#{}\nnew\nuntimed\n'.format(
+                now - 1000, now - 10))
+        self.readline.lib.set(c_char, 'history_comment_char', '#')
+        try:
+            self.history.load_file(self.history_file_name, max_age=100)
+        finally:
+            self.readline.lib.set(c_char, 'history_comment_char', '\0')
+        self.assertEqual(self.history.to_list(), ['new', 'untimed'])
+        entry = self.readline.lib.history_get(self.history.base)
+        self.assertEqual(entry[0].timestamp,
+                         '#{}'.format(now - 10).encode())
+
+    def test_times(self):
+        start = int(time.time())
+        self.history.append('test1')
+        self.assertGreaterEqual(self.history.get_time(0), start)
+        self.assertLessEqual(self.history.get_time(-1), time.time())
+        self.history.set_time(0, 100)
+        self.assertEqual(self.history.get_time(0), 100)
+        self.history.set_time(0, None)
+        self.assertIsNone(self.history.get_time(0))
+        with self.assertRaises(IndexError):
+            self.history.get_time(1)
+
+    def test_between(self):
+        for index, line in enumerate(('test1', 'test2', 'test3', 'test4')):
+            self.history.append(line)
+            self.history.set_time(index, (index + 1) * 100)
+        self.history.set_time(3, None)
+        self.assertEqual(self.history.between(150, 300), [(1, 'test2')])
+        self.assertEqual(self.history.between(100),
+                         [(0, 'test1'), (1, 'test2'), (2, 'test3')])
+        self.assertEqual(self.history.recent(60), [])
+        # The index follows changes to the history.
+        self.history.append('test5')
+        self.history.set_time(1, 50)
+        del self.history[0]
+        self.assertEqual(self.history.between(0, 250),
+                         [(0, 'test2')])
+        self.assertEqual(self.history.recent(60), [(3, 'test5')])
+
+    def test_write_timestamps(self):
+        lib = self.readline.lib
+        self.assertFalse(self.history.write_timestamps)
+        self.history.append('test1')
+        self.history.set_time(0, 100)
+        with self.assertRaises(ValueError):
+            self.history.write_timestamps = True
+        self.assertFalse(self.history.write_timestamps)
+        lib.set(c_char, 'history_comment_char', '#')
+        try:
+            self.history.write_timestamps = True
+            self.history.write_file(self.history_file_name)
+            self.history.append('test2')
+            self.history.set_time(1, 200)
+            self.history.write_file(self.history_file_name)
+            self.history.clear()
+            self.history.read_file(self.history_file_name)
+        finally:
+            self.history.write_timestamps = False
+            lib.set(c_char, 'history_comment_char', '\0')
+        self.assertEqual(self._file_lines(),
+                         ['#100', 'test1', '#200', 'test2'])
+        self.assertEqual(self.history.to_list(), ['test1', 'test2'])
+        self.assertEqual(self.history.get_time(1), 200)
+
+    def test_append_file(self):
+        self.history.append('test1')
+        self.history.write_file(self.history_file_name)
+        for line in ('test2', 'test3', 'test4'):
+            self.history.append(line)
+        self.assertEqual(self.history.unsaved_count, 3)
+        self.history.append_file(2, self.history_file_name)
+        self.assertEqual(self._file_lines(), ['test1', 'test3', 'test4'])
+        self.assertEqual(self.history.unsaved_count, 1)
+        self.history.append_file(0, self.history_file_name)
+        self.assertEqual(self.history.unsaved_count, 1)
+
+        with self.assertRaises(IOError):
+            self.history.append_file(1, '/dev/null/nothing')
+
+    def test_unsaved_count(self):
+        self.history.append('test1')
+        self.assertEqual(self.history.unsaved_count, 1)
+        self.history.write_file(self.history_file_name)
+        self.assertEqual(self.history.unsaved_count, 0)
+        self.history.append('test2')
+        self.history.append('test3')
+        del self.history[0]
+        self.assertEqual(self.history.unsaved_count, 2)
+        del self.history[0]
+        self.assertEqual(self.history.unsaved_count, 1)
+        self.history.read_file(self.history_file_name)
+        self.assertEqual(self.history.unsaved_count, 0)
+
+    def test_write_file_rewrites(self):
+        for line in ('test1', 'test2'):
+            self.history.append(line)
+        self.history.write_file(self.history_file_name)
+        self.history.clear()
+        self.history.read_file(self.history_file_name)
+        del self.history[0]
+        self.history.append('test3')
+        # The whole file is written even though it holds the old lines.
+        with mock.patch.object(self.history.lib, 'append_history',
+                               side_effect=AssertionError):
+            self.history.write_file(self.history_file_name)
+        self.assertEqual(self._file_lines(), ['test2', 'test3'])
+
+    def test_append_file_then_truncate(self):
+        for line in ('test1', 'test2'):
+            self.history.append(line)
+        self.history.write_file(self.history_file_name)
+        self.history.append('test3')
+        self.history.append_file(self.history.unsaved_count,
+                                 self.history_file_name)
+        # The file is known to hold 3 entries, so isn't read.
+        with mock.patch.object(self.history.lib, 'history_truncate_file',
+                               side_effect=AssertionError):
+            self.history.truncate_file(3, self.history_file_name)
+        self.assertEqual(self._file_lines(), ['test1', 'test2', 'test3'])
+        # It is read once it changes.
+        with open(self.history_file_name, 'a') as history_file:
+            history_file.write('other\n')
+        self.history.truncate_file(3, self.history_file_name)
+        self.assertEqual(self._file_lines(), ['test2', 'test3', 'other'])
+
+    def test_write_file_entry_replaced(self):
+        for index in range(5):
+            self.history.append('line{}'.format(index))
+        self.history.write_file(self.history_file_name)
+        # Edit line2 twice as Readline does when it's recalled. The
+        # second entry may reuse the memory of the first.
+        for line in (b'new', b'edit2'):
+            entry = self.history.lib.replace_history_entry(2, line, None)
+            self.history.lib.free_history_entry(entry)
+        self.history.invalidate()
+        self.history.write_file(self.history_file_name)
+        self.assertEqual(self._file_lines(),
+                         ['line0', 'line1', 'edit2', 'line3', 'line4'])
+
+    def test_write_file_recalled_line_edited(self):
+        for index in range(5):
+            self.history.append('line{}'.format(index))
+        self.history.write_file(self.history_file_name)
+        # Recall line2 and replace it, then move back down without
+        # accepting it, twice.
+        for text in (b'new', b'edit2'):
+            read_fd, write_fd = os.pipe()
+            os.write(write_fd, b'\x1b[A' * 3 + b'\x15' + text +
+                     b'\x1b[B' * 3 + b'\n')
+            os.close(write_fd)
+            try:
+                with self.readline.headless(read_fd):
+                    self.assertEqual(self.readline.read_line(), '')
+            finally:
+                os.close(read_fd)
+        self.assertEqual(self.history[2], 'edit2')
+        self.history.write_file(self.history_file_name)
+        self.assertEqual(self._file_lines(), list(self.history))
+
 
 class TestCompletion(unittest.TestCase):
     def setUp(self):
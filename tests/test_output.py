@@ -0,0 +1,147 @@
+"""Tests for pygnurl.output"""
+from ctypes import *  # pylint: disable=wildcard-import,unused-wildcard-import
+import io
+import os
+import sys
+import threading
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pygnurl.interface
+import pygnurl.output
+
+LIB_PATH = os.environ['PYGNURL_LIB']
+
+# pylint: disable=missing-docstring,protected-access
+
+
+class TestPromptWriter(unittest.TestCase):
+    def setUp(self):
+        self.readline = mock.Mock(reading=False)
+        self.stream = io.StringIO()
+        self.writer = pygnurl.output.PromptWriter(self.readline,
+                                                  self.stream)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_not_reading(self):
+        self.writer.write(u'abc\n')
+        self.assertEqual(self.stream.getvalue(), u'abc\n')
+        self.assertFalse(self.readline.forced_update_display.called)
+
+    def test_batch(self):
+        self.readline.reading = True
+        for index in range(100):
+            self.writer.write(u'{}\n'.format(index))
+        self.assertEqual(self.stream.getvalue(), u'')
+        self.assertIsNone(self.writer._on_hook())
+        self.assertEqual(self.stream.getvalue(),
+                         u''.join(u'{}\n'.format(i) for i in range(100)))
+        self.assertEqual(self.readline.clear_visible_line.call_count, 1)
+        self.assertEqual(self.readline.forced_update_display.call_count, 1)
+
+    @unittest.skipIf(sys.platform == 'win32', 'no wakeup pipe on Windows')
+    def test_wakeup(self):
+        hook_fd = self.readline.add_input_hook.call_args[1]['fd']
+        self.readline.reading = True
+        self.writer.write(u'a')
+        self.writer.write(u'b')
+        self.assertEqual(os.read(hook_fd, 10), b'\0')
+        self.writer._on_hook()
+        self.assertEqual(self.stream.getvalue(), u'ab\n')
+
+    def test_frame_rate(self):
+        self.readline.reading = True
+        self.writer.write(u'first\n')
+        self.writer._on_hook()
+        self.writer.write(u'second\n')
+        delay = self.writer._on_hook()
+        self.assertGreater(delay, 0)
+        self.assertLessEqual(delay, 1.0 / self.writer.frame_rate)
+        self.assertEqual(self.stream.getvalue(), u'first\n')
+        self.writer._last_frame -= 1
+        self.assertIsNone(self.writer._on_hook())
+        self.assertEqual(self.stream.getvalue(), u'first\nsecond\n')
+
+    def test_threads(self):
+        self.readline.reading = True
+
+        def write():
+            for _ in range(100):
+                self.writer.write(u'x')
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.writer.flush()
+        self.assertEqual(self.stream.getvalue(), u'x' * 400 + u'\n')
+
+    def test_pending_written_after_line(self):
+        self.readline.reading = True
+        self.writer.write(u'during\n')
+        self.readline.reading = False
+        self.writer.write(u'after\n')
+        self.assertEqual(self.stream.getvalue(), u'during\nafter\n')
+
+    def test_close(self):
+        self.writer.close()
+        self.readline.remove_input_hook.assert_called_once_with(
+            self.readline.add_input_hook.return_value)
+
+
+@unittest.skipIf(sys.platform == 'win32', 'no fdopen on Windows')
+class TestPromptWriterReadline(unittest.TestCase):
+    def setUp(self):
+        dll = cdll.LoadLibrary(LIB_PATH)
+        self.readline = pygnurl.interface.Readline(dll)
+        self.streams = self.readline.instream, self.readline.outstream
+        self.libc = CDLL(None)
+        self.libc.fdopen.argtypes = [c_int, c_char_p]
+        self.libc.fdopen.restype = c_void_p
+        self.libc.fclose.argtypes = [c_void_p]
+        read_fd, self.write_fd = os.pipe()
+        null_fd = os.open(os.devnull, os.O_WRONLY)
+        self.readline.instream = self.libc.fdopen(read_fd, b'r')
+        self.readline.outstream = self.libc.fdopen(null_fd, b'w')
+
+    def tearDown(self):
+        instream, outstream = self.readline.instream, self.readline.outstream
+        self.readline.instream, self.readline.outstream = self.streams
+        os.close(self.write_fd)
+        self.libc.fclose(instream)
+        self.libc.fclose(outstream)
+
+    def test_write_while_reading(self):
+        stream = io.StringIO()
+        writer = pygnurl.output.PromptWriter(self.readline, stream)
+
+        def log():
+            for index in range(1000):
+                writer.write(u'{}\n'.format(index))
+            os.write(self.write_fd, b'abc\n')
+
+        thread = threading.Thread(target=log)
+
+        def start():
+            # Only start writing once the line has been started.
+            if not thread.ident:
+                thread.start()
+            return 60
+
+        self.readline.add_input_hook(interval=0, callback=start)
+        try:
+            line = self.readline._readline_until_enter_or_signal(b'> ')
+        finally:
+            thread.join()
+            writer.close()
+        self.assertEqual(line, b'abc')
+        self.assertEqual(stream.getvalue(),
+                         u''.join(u'{}\n'.format(i) for i in range(1000)))
+        self.assertFalse(self.readline.reading)
@@ -1,9 +1,18 @@
 """Tests for the pygnurl module itself."""
 
+import io
 import logging
 import os
+import sys
+import threading
+import time
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import pygnurl
 
 # pylint: disable=missing-docstring,protected-access
@@ -11,24 +20,88 @@ import pygnurl
 
 class TestConsoleHandler(unittest.TestCase):
     def setUp(self):
-        self.handler = pygnurl.ConsoleHandler()
+        self.stream = io.StringIO()
+        self.handler = pygnurl.ConsoleHandler(self.stream)
         self.record = logging.LogRecord('', 100, '', 1, 'test', [], None)
 
-    def test_format(self):
-        pygnurl.readline.done = True
-        msg = self.handler.format(self.record)
-        self.assertEqual(msg, 'test')
-
-        pygnurl.readline.done = False
-        msg = self.handler.format(self.record)
-        self.assertEqual(msg, '\ntest')
+    def tearDown(self):
+        if self.handler.writer is not None:
+            self.handler.writer.close()
+        pygnurl.readline._reading = False
 
     def test_emit(self):
-        pygnurl.readline.done = True
         self.handler.emit(self.record)
+        self.assertEqual(self.stream.getvalue(), 'test\n')
+        self.assertIsNone(self.handler.writer)
+
+    def test_emit_while_reading(self):
+        pygnurl.readline._reading = True
+        with mock.patch.object(pygnurl.readline,
+                               'forced_update_display') as update:
+            for _ in range(10):
+                self.handler.emit(self.record)
+            self.assertEqual(self.stream.getvalue(), '')
+            self.handler.writer.flush()
+        self.assertEqual(self.stream.getvalue(), 'test\n' * 10)
+        update.assert_called_once_with()
+
+    def test_writer_kept_after_reading(self):
+        pygnurl.readline._reading = True
+        self.handler.emit(self.record)
+        writer = self.handler.writer
+        hooks = list(pygnurl.readline._input_hooks)
+        pygnurl.readline._reading = False
+        self.handler.emit(self.record)
+        self.assertIs(self.handler.writer, writer)
+        self.assertEqual(pygnurl.readline._input_hooks, hooks)
+        self.assertEqual(self.stream.getvalue(), 'test\n' * 2)
 
-        pygnurl.readline.done = False
+    def test_close(self):
+        pygnurl.readline._reading = True
         self.handler.emit(self.record)
+        hooks = list(pygnurl.readline._input_hooks)
+        pygnurl.readline._reading = False
+        self.handler.close()
+        self.assertIsNone(self.handler.writer)
+        self.assertEqual(len(pygnurl.readline._input_hooks), len(hooks) - 1)
+        self.assertEqual(self.stream.getvalue(), 'test\n')
+
+    @unittest.skipIf(sys.platform == 'win32', 'no headless mode on Windows')
+    def test_emit_from_thread_while_waiting(self):
+        # The reader is already waiting for input when the first record
+        # arrives, and no keys are pressed until it has been written.
+        read_fd, write_fd = os.pipe()
+        shown = []
+
+        def log():
+            while not pygnurl.readline.reading:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            self.handler.emit(self.record)
+            deadline = time.time() + 5
+            while time.time() < deadline and not self.stream.getvalue():
+                time.sleep(0.01)
+            shown.append(self.stream.getvalue())
+            os.write(write_fd, b'line\n')
+
+        thread = threading.Thread(target=log)
+        try:
+            with pygnurl.readline.headless(read_fd):
+                thread.start()
+                line = pygnurl.readline.read_line()
+        finally:
+            thread.join()
+            os.close(read_fd)
+            os.close(write_fd)
+        self.assertEqual(line, 'line')
+        self.assertEqual(shown, ['test\n'])
+
+
+class TestInitCallback(unittest.TestCase):
+    def test_add_init_callback(self):
+        callback = mock.Mock()
+        pygnurl.add_init_callback(callback)
+        callback.assert_called_once_with(pygnurl.readline)
 
 
 class TestPygnurl(unittest.TestCase):
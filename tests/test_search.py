@@ -0,0 +1,167 @@
+"""Tests for pygnurl.search"""
+from ctypes import *  # pylint: disable=wildcard-import,unused-wildcard-import
+import itertools
+import os
+import unittest
+
+import pygnurl.interface
+import pygnurl.search
+import pygnurl.strings
+
+LIB_PATH = os.environ['PYGNURL_LIB']
+
+# pylint: disable=missing-docstring,protected-access
+
+
+def _scan(lines, query, prefix=False):
+    """Search lines the slow way."""
+    found = []
+    for position in reversed(range(len(lines))):
+        line = lines[position]
+        matches = line.startswith(query) if prefix else query in line
+        if matches and line not in [match for _, match in found]:
+            found.append((position, line))
+    return found
+
+
+class TestHistoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.lines = ['print({})'.format(i) for i in range(300)]
+        self.lines += ['import os', 'os.getcwd()', 'import sys', 'print(1)']
+        self.index = pygnurl.search.HistoryIndex(self.lines)
+
+    def _check(self, query, prefix=False):
+        self.assertEqual(list(self.index.search(query, prefix)),
+                         _scan(self.lines, query, prefix))
+
+    def test_search(self):
+        for query in ('import', 'os', 'print(2', '(1)', 'missing', 'p', ''):
+            self._check(query)
+
+    def test_prefix(self):
+        for query in ('import', 'os', 'print(2', '(1)', 'i', ''):
+            self._check(query, prefix=True)
+
+    def test_newest_first(self):
+        matches = self.index.search('print')
+        self.assertEqual(list(itertools.islice(matches, 2)),
+                         [(303, 'print(1)'), (299, 'print(299)')])
+
+    def test_extend(self):
+        lines = ['import json', 'json.dumps({})']
+        self.index.extend(lines)
+        self.lines += lines
+        self._check('json')
+        self._check('import')
+
+    def test_replace(self):
+        self.index.replace(0, 'import re')
+        self.index.replace(302, 'print(302)')
+        self.lines[0] = 'import re'
+        self.lines[302] = 'print(302)'
+        self._check('import')
+        self._check('print(30')
+        self._check('sys')
+
+    def test_remove(self):
+        self.index.remove(300)
+        del self.lines[300]
+        self._check('import')
+        self._check('os')
+
+    def test_drop(self):
+        self.index.drop(250)
+        del self.lines[:250]
+        self.assertEqual(len(self.index), len(self.lines))
+        self._check('print(2')
+        self._check('import')
+
+    def test_compact(self):
+        self.index.drop(290)
+        del self.lines[:290]
+        for position in range(5):
+            self.index.remove(position)
+            del self.lines[position]
+        self.index.extend(['print(2)'] * 2000)
+        self.lines += ['print(2)'] * 2000
+        self.index.drop(2000)
+        del self.lines[:2000]
+        self.assertEqual(self.index._removed, 0)
+        self._check('print(2')
+        self._check('import')
+
+
+class TestSubstringSearch(unittest.TestCase):
+    def setUp(self):
+        dll = cdll.LoadLibrary(LIB_PATH)
+        self.readline = pygnurl.interface.Readline(dll)
+        self.readline.history.clear()
+        for line in ('import os', 'os.getcwd()', 'import sys', 'x = 1'):
+            self.readline.history.append(line)
+        self.search = pygnurl.search.add_functions(self.readline)
+        self.readline.line_buffer = ''
+
+    def tearDown(self):
+        self.readline.line_buffer = ''
+        self.readline.history.clear()
+
+    def test_index_built(self):
+        self.assertTrue(self.readline.history.indexed)
+        self.assertEqual(len(self.readline.history._index), 4)
+
+    def test_backward(self):
+        self.readline.insert_text('import')
+        self.search.backward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'import sys')
+        self.assertEqual(self.readline.point, len('import sys'))
+        self.search.backward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'import os')
+
+    def test_forward(self):
+        self.readline.insert_text('os')
+        self.search.backward(2, 0)
+        self.assertEqual(self.readline.line_buffer, 'import os')
+        self.search.forward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'os.getcwd()')
+        self.search.forward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'os')
+        self.assertEqual(self.readline.point, 2)
+
+    def test_non_ascii(self):
+        # Python 2 strings are bytes, which aren't decoded.
+        line = pygnurl.strings.decode(u'caf\xe9 = 1'.encode('utf-8'))
+        self.readline.history.append(line)
+        self.readline.insert_text('caf')
+        self.search.backward(1, 0)
+        self.assertEqual(self.readline.line_buffer, line)
+        self.assertEqual(self.readline.point,
+                         len(pygnurl.strings.encode(line)))
+        self.search.forward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'caf')
+
+    def test_no_more(self):
+        self.readline.insert_text('sys')
+        self.search.backward(1, 0)
+        self.search.backward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'import sys')
+
+    def test_bound(self):
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b'imp\x12\x12\n')
+        os.close(write_fd)
+        self.readline.parse_and_bind(
+            r'"\C-r": history-substring-search-backward')
+        try:
+            with self.readline.headless(read_fd):
+                line = self.readline.read_line()
+        finally:
+            self.readline.parse_and_bind(r'"\C-r": reverse-search-history')
+            os.close(read_fd)
+        self.assertEqual(line, 'import os')
+
+    def test_new_search(self):
+        self.readline.insert_text('import')
+        self.search.backward(1, 0)
+        self.readline.line_buffer = 'os.'
+        self.search.backward(1, 0)
+        self.assertEqual(self.readline.line_buffer, 'os.getcwd()')
@@ -0,0 +1,183 @@
+"""Tests for pygnurl.server"""
+from __future__ import print_function
+
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pygnurl
+import pygnurl.server
+
+# pylint: disable=missing-docstring,protected-access
+
+
+def _ask():
+    print('hello', input('name? '))
+
+
+@unittest.skipIf(sys.platform == 'win32', 'Unix only')
+@unittest.skipUnless(hasattr(socket.socket, 'sendmsg'),
+                     'needs socket.sendmsg')
+class TestConsoleServer(unittest.TestCase):
+    def setUp(self):
+        # Other tests construct Readline instances, each of which takes
+        # over input(); the workers must use pygnurl's.
+        pygnurl.readline._initreadline()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'console')
+        self.server = None
+        self.thread = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+            self.thread.join()
+            for pid in list(self.server._busy):
+                pygnurl.server._wait(pid)
+        shutil.rmtree(self.directory)
+
+    def _serve(self, target=pygnurl.server.interact, workers=1):
+        self.server = pygnurl.server.ConsoleServer(self.path, target,
+                                                   workers)
+        self.server.start()
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.05,))
+        self.thread.start()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(10)
+        sock.connect(self.path)
+        return sock
+
+    @staticmethod
+    def _read_until(sock, marker):
+        output = b''
+        while marker not in output:
+            data = sock.recv(4096)
+            if not data:
+                raise AssertionError('EOF before {!r} in {!r}'
+                                     .format(marker, output))
+            output += data
+        return output
+
+    @staticmethod
+    def _read_to_end(sock):
+        output = b''
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                return output
+            output += data
+
+    def test_interpreter(self):
+        self._serve()
+        sock = self._connect()
+        try:
+            self._read_until(sock, b'>>> ')
+            sock.sendall(b'6 * 7\r')
+            self.assertIn(b'42', self._read_until(sock, b'>>> '))
+            sock.sendall(b'\x04')
+            self._read_to_end(sock)
+        finally:
+            sock.close()
+
+    def test_target(self):
+        self._serve(_ask)
+        sock = self._connect()
+        try:
+            self._read_until(sock, b'name? ')
+            sock.sendall(b'world\r')
+            self.assertIn(b'hello world', self._read_to_end(sock))
+        finally:
+            sock.close()
+
+    def test_concurrent_sessions(self):
+        self._serve(_ask)
+        first, second = self._connect(), self._connect()
+        try:
+            self._read_until(first, b'name? ')
+            self._read_until(second, b'name? ')
+            first.sendall(b'fir')
+            second.sendall(b'second\r')
+            first.sendall(b'st\r')
+            self.assertIn(b'hello first', self._read_to_end(first))
+            self.assertIn(b'hello second', self._read_to_end(second))
+        finally:
+            first.close()
+            second.close()
+
+    def test_workers_recycled(self):
+        self._serve(lambda: print(os.getpid()), workers=2)
+        pids = set()
+        for _ in range(3):
+            sock = self._connect()
+            try:
+                pids.add(int(self._read_to_end(sock)))
+            finally:
+                sock.close()
+        # Each session ran in a fresh worker.
+        self.assertEqual(len(pids), 3)
+        self.assertFalse(pids & set(worker.pid
+                                    for worker in self.server._idle))
+
+    def test_close(self):
+        self._serve(workers=2)
+        pids = [worker.pid for worker in self.server._idle]
+        self.server.close()
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.path))
+        for pid in pids:
+            with self.assertRaises(OSError):
+                os.kill(pid, 0)
+
+    def test_socket_mode(self):
+        umask = os.umask(0)
+        try:
+            self._serve()
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    @unittest.skipUnless(hasattr(socket, 'SO_PEERCRED'),
+                         'needs SO_PEERCRED')
+    def test_peer_uid(self):
+        first, second = socket.socketpair()
+        try:
+            self.assertEqual(pygnurl.server._peer_uid(first), os.geteuid())
+        finally:
+            first.close()
+            second.close()
+
+    def test_other_user_refused(self):
+        self._serve()
+        with mock.patch.object(pygnurl.server, '_peer_uid',
+                               return_value=os.geteuid() + 1):
+            sock = self._connect()
+            try:
+                self.assertEqual(self._read_to_end(sock), b'')
+            finally:
+                sock.close()
+        self.assertFalse(self.server._busy)
+        self.assertEqual(len(self.server._idle), 1)
+
+    def test_connect_latency(self):
+        self._serve()
+        start = time.time()
+        sock = self._connect()
+        try:
+            self._read_until(sock, b'>>> ')
+            # Generous, but far less than starting an interpreter.
+            self.assertLess(time.time() - start, 1.0)
+        finally:
+            sock.close()